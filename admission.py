@@ -0,0 +1,105 @@
+"""
+Admission control for write-heavy routes.
+
+SQLite accepts one writer at a time, so letting every checkout and stock
+update queue on the database lock only ties up request threads until they
+time out. An AdmissionController admits at most `limit` requests at once and
+lets a short queue wait behind them. A request is turned away immediately
+when the queue is full or when the predicted wait (from a moving average of
+service times) would overrun its queue deadline. Otherwise it is turned away
+once that deadline passes. Rejected requests get 503 with a Retry-After
+estimate, and read-only routes never pass through the controller.
+"""
+import math
+import threading
+import time
+
+# Weight of the newest sample in the service-time moving average
+EWMA_ALPHA = 0.2
+
+
+class Rejected(Exception):
+    """Request not admitted; retry_after is a suggested delay in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name, limit, queue_size, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_time = 0.05  # seconds, moving average
+        self._counters = {'admitted': 0, 'queued': 0, 'rejected_queue_full': 0,
+                          'rejected_deadline': 0, 'rejected_timeout': 0}
+        self._max_waiting = 0
+
+    def _predicted_wait(self, position):
+        """Seconds until a request at this queue position would be admitted"""
+        return self._service_time * math.ceil(position / self.limit)
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._predicted_wait(self._waiting + 1)))
+
+    def acquire(self):
+        """Admit the calling request or raise Rejected"""
+        with self._cond:
+            if self._in_flight < self.limit and not self._waiting:
+                self._in_flight += 1
+                self._counters['admitted'] += 1
+                return time.monotonic()
+
+            if self._waiting >= self.queue_size:
+                self._counters['rejected_queue_full'] += 1
+                raise Rejected('queue full', self._retry_after())
+            if self._predicted_wait(self._waiting + 1) > self.queue_timeout:
+                self._counters['rejected_deadline'] += 1
+                raise Rejected('predicted wait exceeds deadline', self._retry_after())
+
+            deadline = time.monotonic() + self.queue_timeout
+            self._waiting += 1
+            self._counters['queued'] += 1
+            self._max_waiting = max(self._max_waiting, self._waiting)
+            try:
+                while self._in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['rejected_timeout'] += 1
+                        raise Rejected('queue timeout', self._retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+            self._counters['admitted'] += 1
+            return time.monotonic()
+
+    def release(self, started_at):
+        with self._cond:
+            self._in_flight -= 1
+            elapsed = time.monotonic() - started_at
+            self._service_time += EWMA_ALPHA * (elapsed - self._service_time)
+            self._cond.notify()
+
+    def busy(self):
+        """True while any request is admitted or queued"""
+        with self._cond:
+            return bool(self._in_flight or self._waiting)
+
+    def metrics(self):
+        with self._cond:
+            return dict(self._counters,
+                        name=self.name,
+                        limit=self.limit,
+                        queue_size=self.queue_size,
+                        queue_timeout=self.queue_timeout,
+                        in_flight=self._in_flight,
+                        waiting=self._waiting,
+                        max_waiting=self._max_waiting,
+                        service_time_ms=round(self._service_time * 1000, 2))
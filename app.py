@@ -1,38 +1,213 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, abort, g, has_request_context, send_file
 from flask_socketio import SocketIO, emit
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup, escape
 import sqlite3
 import os
-import hashlib
 import datetime
 import json
 import time
 import threading
+import secrets
+import uuid
+import functools
+import math
+import mimetypes
 from contextlib import contextmanager
+import inventory_ledger
+import inventory_import
+import flash_sale
+import stock_reservations
+import product_reviews
+import product_search
+import catalog
+import session_store
+import shopping_cart
+import db_offload
+import admission
+import db_retry
+import image_variants
+import static_assets
+import fast_json
+import passwords
+import rate_limit
+import write_behind
+import outbox
+import notification_sinks
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
-socketio = SocketIO(app)
 app.secret_key = 'supersecretkey'
+# jsonify() through orjson when installed; sqlite3.Row results serialize directly
+app.json = fast_json.FastJSONProvider(app)
+
+# Server mode: unset picks Flask-SocketIO's default; serve.py runs 'gevent' or 'eventlet',
+# where SQLite calls are offloaded to a pool of DB_THREADPOOL_SIZE native threads
+app.config['ASYNC_MODE'] = os.environ.get('ASYNC_MODE') or None
+app.config['DB_THREADPOOL_SIZE'] = int(os.environ.get('DB_THREADPOOL_SIZE', '8'))
+
+# Set by launcher.py: the parent process migrates and warms up, forked workers serve.
+# Workers pin Socket.IO clients to WebSocket so each connection stays on one worker,
+# and SOCKETIO_MESSAGE_QUEUE (e.g. redis://) relays emits between workers.
+app.config['PREFORK'] = os.environ.get('PREFORK') == '1'
+app.config['WORKERS'] = int(os.environ.get('WORKERS', '1')) if app.config['PREFORK'] else 1
+app.config['SOCKETIO_WEBSOCKET_ONLY'] = app.config['PREFORK']
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+socketio = SocketIO(app, async_mode=app.config['ASYNC_MODE'], message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+db_offload.configure(app.config['ASYNC_MODE'], app.config['DB_THREADPOOL_SIZE'])
+
+# Templates: compiled bytecode is cached on disk so new workers skip Jinja compilation,
+# and TEMPLATES_AUTO_RELOAD=0 turns off per-render file modification checks in production
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', '.jinja_cache')
+if os.environ.get('TEMPLATES_AUTO_RELOAD') is not None:
+    app.config['TEMPLATES_AUTO_RELOAD'] = os.environ['TEMPLATES_AUTO_RELOAD'] == '1'
+os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR']))
+
+# Resized WebP/PNG copies of static images, rendered on first request or by `python image_variants.py`
+app.config['IMAGE_CACHE_DIR'] = os.environ.get('IMAGE_CACHE_DIR', '.image_cache')
+image_store = image_variants.ImageVariants(app.static_folder, app.config['IMAGE_CACHE_DIR'])
+
+# Fingerprinted, precompressed CSS/JS built by `python static_assets.py`, served from /assets/
+app.config['ASSET_BUILD_DIR'] = os.environ.get('ASSET_BUILD_DIR', '.asset_build')
+asset_manifest = {}
+asset_names = set()
+
+# Flash-sale mode: comma-separated product codes whose stock is held in memory
+app.config['FLASH_SALE_SKUS'] = os.environ.get('FLASH_SALE_SKUS', '')
+app.config['FLASH_SALE_FLUSH_INTERVAL'] = float(os.environ.get('FLASH_SALE_FLUSH_INTERVAL', '2'))
+
+# Unpaid orders hold their stock for this many seconds before it is released
+app.config['RESERVATION_TTL'] = int(os.environ.get('RESERVATION_TTL', str(48 * 3600)))
+app.config['RESERVATION_SWEEP_INTERVAL'] = float(os.environ.get('RESERVATION_SWEEP_INTERVAL', '30'))
+
+# Write routes (checkout, order updates, stock edits) admit this many requests at once,
+# with a short queue behind them; the rest get 503 + Retry-After instead of waiting on SQLite
+app.config['WRITE_ADMISSION_LIMIT'] = int(os.environ.get('WRITE_ADMISSION_LIMIT', '4'))
+app.config['WRITE_ADMISSION_QUEUE'] = int(os.environ.get('WRITE_ADMISSION_QUEUE', '16'))
+app.config['WRITE_ADMISSION_TIMEOUT'] = float(os.environ.get('WRITE_ADMISSION_TIMEOUT', '3'))
+
+# Passwords are salted scrypt hashes at cost N/R/P, computed in PASSWORD_HASH_WORKERS processes
+# per server process (0 computes them on the request thread). Logins and registrations are
+# admitted LOGIN_ADMISSION_LIMIT at a time (default: one per hash worker) with a queue behind them
+app.config['PASSWORD_SCRYPT_N'] = int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14)))
+app.config['PASSWORD_SCRYPT_R'] = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+app.config['PASSWORD_SCRYPT_P'] = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+app.config['LOGIN_ADMISSION_LIMIT'] = int(os.environ.get('LOGIN_ADMISSION_LIMIT',
+                                                         str(max(1, app.config['PASSWORD_HASH_WORKERS']))))
+app.config['LOGIN_ADMISSION_QUEUE'] = int(os.environ.get('LOGIN_ADMISSION_QUEUE', '32'))
+app.config['LOGIN_ADMISSION_TIMEOUT'] = float(os.environ.get('LOGIN_ADMISSION_TIMEOUT', '5'))
+
+# Per-client budgets as token buckets, "requests/seconds" (empty turns a rule off); over budget gets
+# 429 + Retry-After. Login's per-user budget is per email tried. RATE_LIMIT_BACKEND=memory keeps
+# buckets per process; sqlite (the default with several prefork workers) shares them between
+# workers through the RATE_LIMIT_DB file
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND',
+                                                  'sqlite' if app.config['WORKERS'] > 1 else 'memory')
+app.config['RATE_LIMIT_DB'] = os.environ.get('RATE_LIMIT_DB', 'rate_limits.db')
+app.config['RATE_LIMIT_LOGIN_PER_IP'] = os.environ.get('RATE_LIMIT_LOGIN_PER_IP', '20/60')
+app.config['RATE_LIMIT_LOGIN_PER_USER'] = os.environ.get('RATE_LIMIT_LOGIN_PER_USER', '10/300')
+app.config['RATE_LIMIT_REGISTER_PER_IP'] = os.environ.get('RATE_LIMIT_REGISTER_PER_IP', '5/600')
+app.config['RATE_LIMIT_FEEDBACK_PER_IP'] = os.environ.get('RATE_LIMIT_FEEDBACK_PER_IP', '5/300')
+app.config['RATE_LIMIT_FEEDBACK_PER_USER'] = os.environ.get('RATE_LIMIT_FEEDBACK_PER_USER', '5/300')
+app.config['RATE_LIMIT_CHECKOUT_PER_IP'] = os.environ.get('RATE_LIMIT_CHECKOUT_PER_IP', '30/600')
+app.config['RATE_LIMIT_CHECKOUT_PER_USER'] = os.environ.get('RATE_LIMIT_CHECKOUT_PER_USER', '10/600')
+
+# /api/inventory?since_version=N holds the request up to this many seconds, checking every interval
+app.config['INVENTORY_LONG_POLL_TIMEOUT'] = float(os.environ.get('INVENTORY_LONG_POLL_TIMEOUT', '25'))
+app.config['INVENTORY_LONG_POLL_INTERVAL'] = float(os.environ.get('INVENTORY_LONG_POLL_INTERVAL', '0.5'))
+
+# JSON bodies at least this many bytes are sent gzip/brotli-compressed when the client accepts it
+app.config['JSON_COMPRESS_MIN_SIZE'] = int(os.environ.get('JSON_COMPRESS_MIN_SIZE', '1024'))
+
+# Feedback and reviews are acknowledged once journaled under WRITE_BEHIND_DIR (fsynced unless
+# WRITE_BEHIND_FSYNC=0); a background task writes them to SQLite every WRITE_BEHIND_INTERVAL seconds,
+# holding off while checkout and stock writes are in flight for up to WRITE_BEHIND_MAX_DELAY seconds
+app.config['WRITE_BEHIND_DIR'] = os.environ.get('WRITE_BEHIND_DIR', '.write_behind')
+app.config['WRITE_BEHIND_FSYNC'] = os.environ.get('WRITE_BEHIND_FSYNC', '1') == '1'
+app.config['WRITE_BEHIND_INTERVAL'] = float(os.environ.get('WRITE_BEHIND_INTERVAL', '1'))
+app.config['WRITE_BEHIND_MAX_DELAY'] = float(os.environ.get('WRITE_BEHIND_MAX_DELAY', '10'))
+
+# Order notifications go through the outbox table. A background dispatcher delivers them right after
+# the commit that queued them (or every OUTBOX_INTERVAL seconds), retrying failures with backoff up to
+# OUTBOX_MAX_ATTEMPTS times. Email goes to SMTP_HOST when it is set, otherwise into .eml files under
+# MAIL_SPOOL_DIR; OUTBOX_WEBHOOK_URL adds a webhook that receives every order event
+app.config['OUTBOX_INTERVAL'] = float(os.environ.get('OUTBOX_INTERVAL', '1'))
+app.config['OUTBOX_BATCH_SIZE'] = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+app.config['OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+app.config['OUTBOX_RETRY_BASE_DELAY'] = float(os.environ.get('OUTBOX_RETRY_BASE_DELAY', '5'))
+app.config['OUTBOX_RETRY_MAX_DELAY'] = float(os.environ.get('OUTBOX_RETRY_MAX_DELAY', '900'))
+app.config['SMTP_HOST'] = os.environ.get('SMTP_HOST', '')
+app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', '587'))
+app.config['SMTP_USERNAME'] = os.environ.get('SMTP_USERNAME') or None
+app.config['SMTP_PASSWORD'] = os.environ.get('SMTP_PASSWORD') or None
+app.config['SMTP_STARTTLS'] = os.environ.get('SMTP_STARTTLS', '1') == '1'
+app.config['MAIL_SENDER'] = os.environ.get('MAIL_SENDER', 'Aureliana Jewelry <no-reply@aureliana.com>')
+app.config['MAIL_SPOOL_DIR'] = os.environ.get('MAIL_SPOOL_DIR', '.mail_spool')
+app.config['LOW_STOCK_ALERT_EMAIL'] = os.environ.get('LOW_STOCK_ALERT_EMAIL', 'admin@aureliana.com')
+app.config['OUTBOX_WEBHOOK_URL'] = os.environ.get('OUTBOX_WEBHOOK_URL', '')
+app.config['OUTBOX_WEBHOOK_SECRET'] = os.environ.get('OUTBOX_WEBHOOK_SECRET') or None
+
+# Bulk inventory imports (/api/inventory/import) are limited to this many rows per file
+app.config['INVENTORY_IMPORT_MAX_ROWS'] = int(os.environ.get('INVENTORY_IMPORT_MAX_ROWS', '5000'))
+
+# Sessions are stored server-side; each process caches them for this many seconds. The cache is off
+# with several prefork workers, where a logout or session rotation on one would not reach the others
+app.config['SESSION_CACHE_TTL'] = float(os.environ.get('SESSION_CACHE_TTL', '5')) if app.config['WORKERS'] == 1 else 0
+
+# SQLite lock contention: connections wait at most DB_BUSY_TIMEOUT_MS inside SQLite, then
+# write transactions retry BEGIN IMMEDIATE with jittered backoff until DB_RETRY_ATTEMPTS
+# or the request's REQUEST_DB_DEADLINE (seconds) runs out
+app.config['DB_BUSY_TIMEOUT_MS'] = int(os.environ.get('DB_BUSY_TIMEOUT_MS', '250'))
+app.config['DB_RETRY_ATTEMPTS'] = int(os.environ.get('DB_RETRY_ATTEMPTS', '8'))
+app.config['DB_RETRY_BASE_DELAY'] = float(os.environ.get('DB_RETRY_BASE_DELAY', '0.01'))
+app.config['DB_RETRY_MAX_DELAY'] = float(os.environ.get('DB_RETRY_MAX_DELAY', '0.5'))
+app.config['REQUEST_DB_DEADLINE'] = float(os.environ.get('REQUEST_DB_DEADLINE', '5'))
 
 # Global database lock to prevent concurrent access
 db_lock = threading.Lock()
+db_retry_policy = db_retry.RetryPolicy(app.config['DB_RETRY_ATTEMPTS'], app.config['DB_RETRY_BASE_DELAY'],
+                                       app.config['DB_RETRY_MAX_DELAY'])
+db_retry_counters = db_retry.RetryCounters()
 
 def get_db_connection():
     """Get a database connection with proper settings"""
-    conn = sqlite3.connect('aureliana.db', timeout=60, check_same_thread=False)
+    busy_timeout_ms = app.config['DB_BUSY_TIMEOUT_MS']
+    conn = db_offload.wrap(db_offload.run(sqlite3.connect, 'aureliana.db', timeout=busy_timeout_ms / 1000,
+                                          check_same_thread=False))
     conn.execute('PRAGMA journal_mode=WAL')
     conn.execute('PRAGMA synchronous=NORMAL')
     conn.execute('PRAGMA cache_size=10000')
     conn.execute('PRAGMA temp_store=MEMORY')
-    conn.execute('PRAGMA busy_timeout=30000')
+    conn.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
     return conn
 
+def sleep_without_db_lock(delay):
+    """Backoff sleep for begin_immediate: other requests in this process may use the database meanwhile"""
+    db_lock.release()
+    try:
+        time.sleep(delay)
+    finally:
+        db_lock.acquire()
+
 @contextmanager
-def db_transaction():
-    """Context manager for database transactions with proper error handling"""
+def db_transaction(write=False):
+    """
+    Context manager for database transactions with proper error handling.
+    write=True takes SQLite's write lock up front (BEGIN IMMEDIATE), retrying
+    with backoff while another process holds it; raises db_retry.DatabaseBusy
+    if the lock is not free before the request's deadline. Any block that can
+    write must pass write=True: upgrading a read transaction to a write one
+    fails with SQLITE_BUSY, with no retry, when another connection writes.
+    """
     conn = None
     try:
         with db_lock:
             conn = get_db_connection()
+            if write:
+                deadline = g.get('db_deadline') if has_request_context() else None
+                db_retry.begin_immediate(conn, db_retry_policy, db_retry_counters, deadline,
+                                         sleep=sleep_without_db_lock)
             yield conn
             conn.commit()
     except Exception as e:
@@ -50,12 +225,149 @@ def db_transaction():
             except:
                 pass
 
+def json_rows(c, query, params=()):
+    """JSON response listing a query's rows as objects, rendered by SQLite"""
+    return app.response_class(fast_json.query_json(c, query, params) + b'\n', mimetype='application/json')
+
+@app.after_request
+def compress_json(response):
+    """Compress large JSON responses per Accept-Encoding"""
+    if (response.mimetype != 'application/json' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.status_code in (204, 304)):
+        return response
+    body = response.get_data()
+    if len(body) < app.config['JSON_COMPRESS_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = fast_json.compress(body, request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.before_request
+def set_db_deadline():
+    """Write transactions in this request stop retrying a locked database after the deadline"""
+    g.db_deadline = time.monotonic() + app.config['REQUEST_DB_DEADLINE']
+
+# Process state reported by /readyz; background tasks wait for start_worker() under the launcher
+app_state = {'ready': False, 'worker': None, 'deferred_tasks': []}
+
+def start_background_task(target):
+    """Start a background task now, or in the first worker once the launcher has forked"""
+    if app.config['PREFORK'] and app_state['worker'] is None:
+        app_state['deferred_tasks'].append(target)
+    else:
+        socketio.start_background_task(target)
+
+write_admission = admission.AdmissionController('writes', app.config['WRITE_ADMISSION_LIMIT'],
+                                                app.config['WRITE_ADMISSION_QUEUE'],
+                                                app.config['WRITE_ADMISSION_TIMEOUT'])
+login_admission = admission.AdmissionController('logins', app.config['LOGIN_ADMISSION_LIMIT'],
+                                                app.config['LOGIN_ADMISSION_QUEUE'],
+                                                app.config['LOGIN_ADMISSION_TIMEOUT'])
+
+def admission_controlled(controller):
+    """Route decorator: run the view only if the controller admits the request"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            try:
+                started_at = controller.acquire()
+            except admission.Rejected as e:
+                print(f"Admission rejected {request.endpoint}: {e.reason}")
+                headers = {'Retry-After': str(e.retry_after)}
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return jsonify({'success': False, 'message': 'Server is busy. Please try again shortly.',
+                                    'retry_after': e.retry_after}), 503, headers
+                return render_template('busy.html', retry_after=e.retry_after), 503, headers
+            try:
+                return view(*args, **kwargs)
+            finally:
+                controller.release(started_at)
+        return wrapper
+    return decorator
+
+rate_limiter = rate_limit.create(app.config['RATE_LIMIT_BACKEND'], app.config['RATE_LIMIT_DB'])
+
+def session_user():
+    return session.get('user_id')
+
+def login_email():
+    return request.form.get('email', '').strip().lower() or None
+
+def rate_limited(scope, user=session_user):
+    """
+    Route decorator: refuse with 429 once the client's IP, or the user (as returned
+    by user()), has used up its RATE_LIMIT_<SCOPE>_PER_IP / _PER_USER budget
+    """
+    ip_rate = rate_limit.parse(app.config.get(f'RATE_LIMIT_{scope.upper()}_PER_IP'))
+    user_rate = rate_limit.parse(app.config.get(f'RATE_LIMIT_{scope.upper()}_PER_USER'))
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            retry_after = 0
+            if ip_rate:
+                retry_after = rate_limiter.hit(f'{scope}:ip:{request.remote_addr}', ip_rate)
+            if not retry_after and user_rate:
+                user_key = user()
+                if user_key is not None:
+                    retry_after = rate_limiter.hit(f'{scope}:user:{user_key}', user_rate)
+            if not retry_after:
+                return view(*args, **kwargs)
+            retry_after = math.ceil(retry_after)
+            headers = {'Retry-After': str(retry_after)}
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({'success': False, 'message': 'Too many requests. Please try again later.',
+                                'retry_after': retry_after}), 429, headers
+            return render_template('rate_limited.html', retry_after=retry_after), 429, headers
+        return wrapper
+    return decorator
+
+server_sessions = session_store.SessionStore(db_transaction, cache_ttl=app.config['SESSION_CACHE_TTL'])
+app.session_interface = server_sessions
+
+password_hasher = passwords.Hasher(passwords.Params(app.config['PASSWORD_SCRYPT_N'], app.config['PASSWORD_SCRYPT_R'],
+                                                     app.config['PASSWORD_SCRYPT_P']),
+                                   app.config['PASSWORD_HASH_WORKERS'])
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Encoded scrypt hash for storing in clients.password; the KDF runs in the hash pool"""
+    return password_hasher.hash(password)
+
+# Order numbers: millisecond timestamp + per-process sequence + random process tag.
+# They sort by creation time and never repeat, even for orders in the same millisecond.
+# The tag is 32 random bits, drawn again in every forked worker so no two processes share one.
+order_number_lock = threading.Lock()
+order_number_state = {'ms': 0, 'seq': 0, 'node': secrets.token_hex(4).upper()}
+
+def new_order_number_node():
+    order_number_state.update(ms=0, seq=0, node=secrets.token_hex(4).upper())
+
+os.register_at_fork(after_in_child=new_order_number_node)
+
+def generate_order_number():
+    with order_number_lock:
+        ms = int(time.time() * 1000)
+        if ms <= order_number_state['ms']:
+            ms = order_number_state['ms']
+            order_number_state['seq'] += 1
+            if order_number_state['seq'] > 999:
+                # Sequence exhausted for this millisecond, borrow the next one
+                ms += 1
+                order_number_state['seq'] = 0
+        else:
+            order_number_state['seq'] = 0
+        order_number_state['ms'] = ms
+        return f"ORD{ms}{order_number_state['seq']:03d}{order_number_state['node']}"
 
 # Database Setup
 def init_db():
-    with db_transaction() as conn:
+    with db_transaction(write=True) as conn:
         c = conn.cursor()
 
         # Clients Table
@@ -152,6 +464,18 @@ def init_db():
             )
         ''')
 
+        # Migration: Add idempotency key so a retried checkout returns the original order
+        try:
+            c.execute('ALTER TABLE orders ADD COLUMN idempotency_key TEXT')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency ON orders (client_ID, idempotency_key)')
+        try:
+            c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_order_number ON orders (order_number)')
+        except sqlite3.IntegrityError:
+            print("Warning: duplicate order numbers exist, unique index on order_number not created")
+
         # Order Items Table
         c.execute('''
             CREATE TABLE IF NOT EXISTS order_items (
@@ -177,7 +501,8 @@ def init_db():
                 size TEXT,
                 initial_stock INTEGER,
                 current_stock INTEGER,
-                low_stock_threshold INTEGER
+                low_stock_threshold INTEGER,
+                description TEXT
             )
         ''')
 
@@ -222,6 +547,64 @@ def init_db():
             )
         ''')
 
+        # Migration: Key order items and reviews by inventory_ID instead of the product name
+        try:
+            c.execute('ALTER TABLE order_items ADD COLUMN inventory_ID INTEGER REFERENCES inventory(inventory_ID)')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        try:
+            c.execute('ALTER TABLE reviews ADD COLUMN inventory_ID INTEGER REFERENCES inventory(inventory_ID)')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        # Migration: Store each review's display name instead of deriving it per page view
+        try:
+            c.execute('ALTER TABLE reviews ADD COLUMN display_name TEXT')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+        # Review Aggregate Table (per-product count, rating sum and star histogram)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS review_aggregate (
+                inventory_ID INTEGER PRIMARY KEY,
+                review_count INTEGER DEFAULT 0,
+                rating_sum INTEGER DEFAULT 0,
+                rating_1 INTEGER DEFAULT 0,
+                rating_2 INTEGER DEFAULT 0,
+                rating_3 INTEGER DEFAULT 0,
+                rating_4 INTEGER DEFAULT 0,
+                rating_5 INTEGER DEFAULT 0,
+                FOREIGN KEY (inventory_ID) REFERENCES inventory(inventory_ID)
+            )
+        ''')
+        
+        # Backfill rows written before the column existed
+        c.execute('''UPDATE order_items SET inventory_ID =
+                     (SELECT inventory_ID FROM inventory WHERE inventory.name = order_items.product_name)
+                     WHERE inventory_ID IS NULL''')
+        c.execute('''UPDATE reviews SET inventory_ID =
+                     (SELECT inventory_ID FROM inventory WHERE inventory.name = reviews.product_name)
+                     WHERE inventory_ID IS NULL''')
+
+        # Inventory Snapshot Table (periodic per-SKU checkpoints of the inventory ledger)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS inventory_snapshot (
+                snapshot_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                inventory_ID INTEGER,
+                stock INTEGER,
+                last_log_ID INTEGER,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (inventory_ID) REFERENCES inventory(inventory_ID)
+            )
+        ''')
+
+        # Product page copy, previously hard-coded in one template per product
+        try:
+            c.execute('ALTER TABLE inventory ADD COLUMN description TEXT')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
         # Migrate existing inventory_log table to add missing columns
         try:
             c.execute('ALTER TABLE inventory_log ADD COLUMN order_ID INTEGER')
@@ -233,6 +616,53 @@ def init_db():
         except sqlite3.OperationalError:
             pass  # Column already exists
 
+        # Flash-sale decrements admitted in memory but not yet applied to the ledger
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS flash_sale_pending (
+                pending_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                inventory_ID INTEGER,
+                quantity INTEGER,
+                order_ID INTEGER,
+                user_ID INTEGER,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (inventory_ID) REFERENCES inventory(inventory_ID)
+            )
+        ''')
+
+        # Stock Reservations Table (stock held by unpaid orders until expires_at)
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS stock_reservations (
+                reservation_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_ID INTEGER,
+                inventory_ID INTEGER,
+                quantity INTEGER,
+                status TEXT DEFAULT 'Active',
+                expires_at DATETIME,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (order_ID) REFERENCES orders(order_ID),
+                FOREIGN KEY (inventory_ID) REFERENCES inventory(inventory_ID)
+            )
+        ''')
+
+        # Indexes for replaying the ledger per item
+        c.execute('CREATE INDEX IF NOT EXISTS idx_inventory_log_item ON inventory_log (inventory_ID, log_ID)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_inventory_snapshot_item ON inventory_snapshot (inventory_ID, snapshot_ID)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_flash_sale_pending_item ON flash_sale_pending (inventory_ID)')
+
+        # Integer-key lookups for checkout, order history, reviews and product pages
+        c.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_ID)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_order_items_inventory ON order_items (inventory_ID)')
+        c.execute('DROP INDEX IF EXISTS idx_reviews_inventory')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_reviews_page ON reviews (inventory_ID, review_id)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews (user_id, inventory_ID)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_inventory_product_code ON inventory (product_code)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_orders_client ON orders (client_ID, created_at)')
+
+        # Only active reservations are ever swept, so index just those by expiry
+        c.execute("CREATE INDEX IF NOT EXISTS idx_stock_reservations_expiry "
+                  "ON stock_reservations (expires_at) WHERE status = 'Active'")
+        c.execute('CREATE INDEX IF NOT EXISTS idx_stock_reservations_order ON stock_reservations (order_ID)')
+
         # Populate Inventory (if empty)
         c.execute('SELECT COUNT(*) FROM inventory')
         if c.fetchone()[0] == 0:
@@ -270,7 +700,7 @@ def init_db():
         # Create a default admin user (if none exists)
         c.execute("SELECT * FROM clients WHERE email = 'admin@aureliana.com'")
         if c.fetchone() is None:
-            hashed_password = hash_password('admin')
+            hashed_password = passwords.hash_password('admin', password_hasher.params)
             c.execute('''
                 INSERT INTO clients (full_name, email, phone, password, role) 
                 VALUES (?, ?, ?, ?, ?)
@@ -279,7 +709,7 @@ def init_db():
         # Create a test client user (if none exists)
         c.execute("SELECT * FROM clients WHERE email = 'client@aureliana.com'")
         if c.fetchone() is None:
-            hashed_password = hash_password('client123')
+            hashed_password = passwords.hash_password('client123', password_hasher.params)
             c.execute('''
                 INSERT INTO clients (full_name, email, phone, password, role) 
                 VALUES (?, ?, ?, ?, ?)
@@ -306,42 +736,218 @@ def init_db():
                     (inventory_ID, action, quantity, previous_stock, new_stock, order_ID, user_ID) 
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', sample_logs)
+
+        # Catalog version counter bumped by triggers on every inventory write
+        catalog.ensure_schema(c)
+        catalog.backfill_descriptions(c)
+
+        # Full-text search index over products and reviews (kept in sync by triggers)
+        product_search.ensure_schema(c)
+
+        # Server-side session store; expired sessions are dropped at startup
+        session_store.ensure_schema(c)
+        session_store.purge_expired(c)
+
+        # Server-side carts, one row per client and product
+        shopping_cart.ensure_schema(c)
+
+        # Last journal record written to the database, per write-behind journal
+        write_behind.ensure_schema(c)
+
+        # Notifications waiting for the outbox dispatcher; old delivered ones are dropped at startup
+        outbox.ensure_schema(c)
+        outbox.purge_delivered(c)
+
+        # Review display names and aggregates for reviews written before they existed
+        product_reviews.backfill_display_names(c)
+        c.execute('SELECT COUNT(*) FROM review_aggregate')
+        if c.fetchone()[0] == 0:
+            product_reviews.rebuild_aggregates(c)
+
+        # Baseline ledger snapshot: items without one start from their current stock
+        c.execute('SELECT COALESCE(MAX(log_ID), 0) FROM inventory_log')
+        last_log_id = c.fetchone()[0]
+        c.execute('''
+            INSERT INTO inventory_snapshot (inventory_ID, stock, last_log_ID)
+            SELECT inventory_ID, COALESCE(current_stock, 0), ? FROM inventory
+            WHERE inventory_ID NOT IN (SELECT inventory_ID FROM inventory_snapshot)
+        ''', (last_log_id,))
         
         conn.commit()
 
 # Initialize Database
 init_db()
 
+def insert_feedback(c, messages):
+    c.executemany('INSERT INTO feedback (name, email, message, created_at) VALUES (?, ?, ?, ?)',
+                  [(m['name'], m['email'], m['message'], m['created_at']) for m in messages])
+
+write_behind_queue = write_behind.WriteBehindQueue(app.config['WRITE_BEHIND_DIR'], db_transaction,
+                                                   {'feedback': insert_feedback, 'review': product_reviews.add_reviews},
+                                                   fsync=app.config['WRITE_BEHIND_FSYNC'])
+# Records journaled before a crash or restart; under the launcher this runs once, before forking
+write_behind_queue.replay_all()
+
+def utc_timestamp():
+    """Now in the format of SQLite's CURRENT_TIMESTAMP"""
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def write_behind_drainer():
+    """Background task that writes journaled feedback and reviews, giving way to checkout and stock writes"""
+    while True:
+        socketio.sleep(app.config['WRITE_BEHIND_INTERVAL'])
+        if write_admission.busy() and write_behind_queue.oldest_age() < app.config['WRITE_BEHIND_MAX_DELAY']:
+            continue
+        try:
+            write_behind_queue.drain()
+        except Exception as e:
+            print(f"Error draining write-behind journal: {e}")
+
+def start_write_behind(name):
+    """Open this process's journal and start draining it"""
+    write_behind_queue.open(name)
+    socketio.start_background_task(write_behind_drainer)
+
+if not app.config['PREFORK']:
+    start_write_behind('main')
+
+# Outbox topics and the sinks each one is delivered to
+OUTBOX_ROUTES = {
+    'new_order': ('socketio',),
+    'inventory_update': ('socketio',),
+    'inventory_bulk_updated': ('socketio',),
+    'order_placed': ('email', 'webhook'),
+    'order_status_changed': ('webhook',),
+    'low_stock': ('email', 'webhook'),
+}
+
+def notification_sinks_from_config():
+    sinks = {'socketio': notification_sinks.SocketIOSink(socketio)}
+    if app.config['SMTP_HOST']:
+        sinks['email'] = notification_sinks.SMTPSink(
+            app.config['SMTP_HOST'], app.config['SMTP_PORT'], app.config['MAIL_SENDER'],
+            app.config['LOW_STOCK_ALERT_EMAIL'], app.config['SMTP_USERNAME'], app.config['SMTP_PASSWORD'],
+            app.config['SMTP_STARTTLS'])
+    else:
+        sinks['email'] = notification_sinks.MailSpoolSink(app.config['MAIL_SPOOL_DIR'], app.config['MAIL_SENDER'],
+                                                          app.config['LOW_STOCK_ALERT_EMAIL'])
+    if app.config['OUTBOX_WEBHOOK_URL']:
+        sinks['webhook'] = notification_sinks.WebhookSink(app.config['OUTBOX_WEBHOOK_URL'],
+                                                          app.config['OUTBOX_WEBHOOK_SECRET'])
+    return sinks
+
+outbox_dispatcher = outbox.Dispatcher(db_transaction, notification_sinks_from_config(),
+                                      app.config['OUTBOX_BATCH_SIZE'], app.config['OUTBOX_MAX_ATTEMPTS'],
+                                      app.config['OUTBOX_RETRY_BASE_DELAY'], app.config['OUTBOX_RETRY_MAX_DELAY'])
+
+def publish_event(c, topic, payload):
+    """Queue a notification in the caller's transaction, for each configured sink its topic routes to"""
+    outbox.publish(c, topic, payload, [sink for sink in OUTBOX_ROUTES[topic] if sink in outbox_dispatcher.sinks])
+
+def outbox_dispatcher_task():
+    """Background task that delivers queued notifications"""
+    while True:
+        outbox_dispatcher.wait(app.config['OUTBOX_INTERVAL'])
+        try:
+            while outbox_dispatcher.dispatch():
+                pass
+        except Exception as e:
+            print(f"Error dispatching outbox events: {e}")
+
+start_background_task(outbox_dispatcher_task)
+
+# Profile projection cached in the server-side session
+PROFILE_COLUMNS = ('full_name', 'email', 'phone', 'address', 'address_details',
+                   'region', 'province', 'city', 'barangay')
+
+def load_profile(c, user_id):
+    c.execute('SELECT %s FROM clients WHERE client_ID = ?' % ', '.join(PROFILE_COLUMNS), (user_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+    profile = dict(zip(PROFILE_COLUMNS, row))
+    profile['readable_address'] = get_readable_address(profile['region'], profile['province'],
+                                                       profile['city'], profile['barangay'])
+    return profile
+
+def get_profile():
+    """Logged-in user's profile, read from the database only when the session has none cached"""
+    if 'user_id' not in session:
+        return None
+    if session.profile is None:
+        # Stored with the session row when the response is sent
+        with db_transaction() as conn:
+            profile = load_profile(conn.cursor(), session['user_id'])
+        if profile:
+            server_sessions.set_profile(session, profile)
+    return session.profile
+
+def invalidate_profile(c, user_id):
+    """Call after any write to a client's profile columns"""
+    server_sessions.invalidate_profile(c, user_id)
+    if session.get('user_id') == user_id:
+        session.profile = None
+
 # Authentication Routes
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limited('login', user=login_email)
+@admission_controlled(login_admission)
 def login():
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
-        hashed_password = hash_password(password)
         
         with db_transaction() as conn:
             c = conn.cursor()
-            c.execute('SELECT * FROM clients WHERE email = ? AND password = ?', (email, hashed_password))
-            user = c.fetchone()
-            
-            if user:
-                session['user_id'] = user[0]
+            c.execute('SELECT client_ID, password FROM clients WHERE email = ?', (email,))
+            account = c.fetchone()
+        
+        # The KDF runs in the hash pool with no database connection held
+        try:
+            if account:
+                valid, new_hash = password_hasher.check(password, account[1])
+            else:
+                valid, new_hash = password_hasher.check_unknown_user(password)
+        except Exception as e:
+            print(f"Password check error: {e}")
+            flash('Login failed. Please try again.', 'error')
+            return render_template('login.html')
+        
+        if not valid:
+            flash('Invalid email or password', 'error')
+            return render_template('login.html')
+        
+        try:
+            with db_transaction(write=True) as conn:
+                c = conn.cursor()
+                server_sessions.regenerate(session)
+                session['user_id'] = account[0]
                 session['role'] = 'admin' if email == 'admin@aureliana.com' else 'user'
                 
-                # Update last login
-                c.execute('UPDATE clients SET last_login = ? WHERE client_ID = ?', (datetime.datetime.now(), user[0]))
-                
-                if session['role'] == 'admin':
-                    return redirect(url_for('admin_dashboard'))
-                else:
-                    return redirect(url_for('home'))
-            else:
-                flash('Invalid email or password', 'error')
+                # Update last login, and upgrade a legacy or lower-cost hash now that we have the
+                # password; matching the old hash keeps a concurrent password change intact
+                c.execute('UPDATE clients SET last_login = ? WHERE client_ID = ?', (datetime.datetime.now(), account[0]))
+                if new_hash:
+                    c.execute('UPDATE clients SET password = ? WHERE client_ID = ? AND password = ?',
+                              (new_hash, account[0], account[1]))
+                server_sessions.set_profile(session, load_profile(c, account[0]))
+                # The next page merges the browser's localStorage cart into the server cart
+                session['cart_merge_pending'] = True
+        except db_retry.DatabaseBusy as e:
+            session.clear()
+            flash('Database is temporarily busy. Please try again in a moment.', 'error')
+            print(f"Database busy in login: {e}")
+            return render_template('login.html')
+        
+        if session['role'] == 'admin':
+            return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('home'))
     
     return render_template('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limited('register')
+@admission_controlled(login_admission)
 def register():
     if request.method == 'POST':
         full_name = request.form['full_name']
@@ -352,7 +958,7 @@ def register():
         hashed_password = hash_password(password)
         
         try:
-            with db_transaction() as conn:
+            with db_transaction(write=True) as conn:
                 c = conn.cursor()
                 c.execute("INSERT INTO clients (full_name, email, password, phone) VALUES (?, ?, ?, ?)",
                          (full_name, email, hashed_password, phone))
@@ -399,7 +1005,7 @@ def account():
         
         # Get order items for each order
         for order in orders:
-            c.execute('''SELECT oi.product_name, oi.quantity, oi.unit_price
+            c.execute('''SELECT oi.inventory_ID, oi.product_name, oi.quantity, oi.unit_price
                         FROM order_items oi
                         WHERE oi.order_ID = ?
                         ORDER BY oi.item_ID''', (order['order_ID'],))
@@ -437,12 +1043,13 @@ def update_address():
     # Save address components separately and also as a combined string for backward compatibility
     combined_address = ', '.join([address_details, barangay, city, province, region])
     
-    with db_transaction() as conn:
+    with db_transaction(write=True) as conn:
         c = conn.cursor()
         c.execute('''UPDATE clients 
                      SET address = ?, address_details = ?, region = ?, province = ?, city = ?, barangay = ? 
                      WHERE client_ID = ?''', 
                   (combined_address, address_details, region, province, city, barangay, session['user_id']))
+        invalidate_profile(c, session['user_id'])
     
     flash('Address updated successfully!', 'success')
     return redirect(url_for('account'))
@@ -465,17 +1072,8 @@ def home():
     if 'user_id' in session and session.get('role') == 'admin':
         return redirect(url_for('admin_dashboard'))
     
-    user_data = None
-    if 'user_id' in session:
-        with db_transaction() as conn:
-            c = conn.cursor()
-            c.execute('SELECT full_name, email FROM clients WHERE client_ID = ?', (session['user_id'],))
-            user = c.fetchone()
-            if user:
-                user_data = {
-                    'full_name': user[0],
-                    'email': user[1]
-                }
+    profile = get_profile()
+    user_data = {'full_name': profile['full_name'], 'email': profile['email']} if profile else None
     
     return render_template('index.html', user_data=user_data)
 
@@ -510,46 +1108,21 @@ def admin_dashboard():
     )
 
 # Centralized inventory management functions
-def log_inventory_change(inventory_id, action, quantity, previous_stock, new_stock, order_id=None, user_id=None):
-    """
-    Centralized function to log inventory changes and update stock.
-    This ensures all inventory changes are properly tracked and consistent.
-    """
-    try:
-        with db_transaction() as conn:
-            c = conn.cursor()
-            
-            # First, log the inventory change
-            c.execute('''INSERT INTO inventory_log 
-                        (inventory_ID, action, quantity, previous_stock, new_stock, timestamp, order_ID, user_ID) 
-                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)''',
-                     (inventory_id, action, quantity, previous_stock, new_stock, order_id, user_id))
-            
-            # Then update the inventory table
-            c.execute('UPDATE inventory SET current_stock = ? WHERE inventory_ID = ?', (new_stock, inventory_id))
-            
-            # Get inventory item details for real-time updates
-            c.execute('SELECT name, category, product_code FROM inventory WHERE inventory_ID = ?', (inventory_id,))
-            item = c.fetchone()
-            
-            # Emit real-time update to all connected clients
-            if item:
-                socketio.emit('inventory_updated', {
-                    'inventory_ID': inventory_id,
-                    'name': item[0],
-                    'category': item[1],
-                    'product_code': item[2],
-                    'current_stock': new_stock,
-                    'previous_stock': previous_stock,
-                    'action': action,
-                    'quantity': quantity
-                })
-            
-            return True
-            
-    except Exception as e:
-        print(f"Database error in log_inventory_change: {e}")
-        return False
+def emit_inventory_update(c, inventory_id, previous_stock, new_stock, action):
+    """Emit a real-time inventory update to all connected clients"""
+    c.execute('SELECT name, category, product_code FROM inventory WHERE inventory_ID = ?', (inventory_id,))
+    item = c.fetchone()
+    if item:
+        socketio.emit('inventory_updated', {
+            'inventory_ID': inventory_id,
+            'name': item[0],
+            'category': item[1],
+            'product_code': item[2],
+            'current_stock': new_stock,
+            'previous_stock': previous_stock,
+            'action': action,
+            'quantity': abs(new_stock - previous_stock)
+        })
 
 def get_inventory_stock(inventory_id):
     """Get current stock for an inventory item"""
@@ -565,27 +1138,89 @@ def get_inventory_stock(inventory_id):
 
 def update_inventory_stock(inventory_id, quantity_change, action, order_id=None, user_id=None):
     """
-    Update inventory stock through the logging system.
+    Update inventory stock through the inventory ledger.
     quantity_change: positive for additions, negative for reductions
     """
     try:
-        current_stock = get_inventory_stock(inventory_id)
-        new_stock = max(0, current_stock + quantity_change)
-        
-        return log_inventory_change(
-            inventory_id=inventory_id,
-            action=action,
-            quantity=abs(quantity_change),
-            previous_stock=current_stock,
-            new_stock=new_stock,
-            order_id=order_id,
-            user_id=user_id
-        )
+        with db_transaction(write=True) as conn:
+            c = conn.cursor()
+            result = inventory_ledger.record_change(c, inventory_id, quantity_change, action, order_id, user_id)
+            if not result:
+                return False
+            emit_inventory_update(c, inventory_id, result[0], result[1], action)
+            return True
     except Exception as e:
         print(f"Error in update_inventory_stock: {e}")
         return False
 
+# Flash-sale stock counters
+flash_counters = flash_sale.FlashSaleCounters()
+flash_flusher_started = False
+
+def flash_sale_flusher():
+    """Background task that drains admitted flash-sale decrements into the inventory ledger"""
+    while True:
+        socketio.sleep(app.config['FLASH_SALE_FLUSH_INTERVAL'])
+        try:
+            with db_transaction(write=True) as conn:
+                c = conn.cursor()
+                changes = flash_sale.flush_pending(c)
+                for inventory_id, (previous_stock, new_stock) in changes.items():
+                    emit_inventory_update(c, inventory_id, previous_stock, new_stock, 'Order Placed')
+        except Exception as e:
+            print(f"Error flushing flash-sale stock: {e}")
+
+def enable_flash_sale(product_codes):
+    """Put product codes into flash-sale mode, loading counters from the database"""
+    global flash_flusher_started
+    with db_transaction() as conn:
+        loaded = flash_counters.load(conn.cursor(), product_codes)
+    if loaded and not flash_flusher_started:
+        flash_flusher_started = True
+        start_background_task(flash_sale_flusher)
+    return loaded
+
+def disable_flash_sale(product_codes):
+    """Take product codes out of flash-sale mode after applying their pending decrements"""
+    flash_counters.disable(product_codes)
+    with db_transaction(write=True) as conn:
+        flash_sale.recover(conn.cursor())
+
+def init_flash_sale():
+    # Apply decrements left pending by a previous process before counting stock
+    with db_transaction(write=True) as conn:
+        flash_sale.recover(conn.cursor())
+    product_codes = [code.strip() for code in app.config['FLASH_SALE_SKUS'].split(',') if code.strip()]
+    if product_codes:
+        enable_flash_sale(product_codes)
+
+init_flash_sale()
+
+# Stock reservation sweeper
+def reservation_sweeper():
+    """Background task that releases the stock of unpaid orders whose reservation expired"""
+    while True:
+        socketio.sleep(app.config['RESERVATION_SWEEP_INTERVAL'])
+        try:
+            while True:
+                with db_transaction(write=True) as conn:
+                    c = conn.cursor()
+                    changes, order_ids = stock_reservations.release_expired(c)
+                    for inventory_id, (previous_stock, new_stock) in changes.items():
+                        emit_inventory_update(c, inventory_id, previous_stock, new_stock, 'Reservation Expired')
+                        flash_counters.refresh(c, inventory_id)
+                for order_id in order_ids:
+                    socketio.emit('order_expired', {'order_id': order_id})
+                # Keep going batch by batch, releasing the lock in between
+                if not order_ids:
+                    break
+        except Exception as e:
+            print(f"Error releasing expired reservations: {e}")
+
+start_background_task(reservation_sweeper)
+
 @app.route('/update_stock', methods=['POST', 'HEAD'])
+@admission_controlled(write_admission)
 def update_stock():
     if 'user_id' not in session or session.get('role') != 'admin':
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -600,39 +1235,40 @@ def update_stock():
     inventory_ID = request.form['inventory_ID']
     new_stock = int(request.form['new_stock'])
 
-    with db_transaction() as conn:
-        c = conn.cursor()
-        c.execute('SELECT current_stock, name, category FROM inventory WHERE inventory_ID = ?', (inventory_ID,))
-        result = c.fetchone()
-        if not result:
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return jsonify({'success': False, 'message': 'Inventory item not found.'}), 404
-            flash('Inventory item not found.', 'error')
-            return redirect(url_for('admin_dashboard'))
-        
-        previous_stock, name, category = result
-        quantity_change = new_stock - previous_stock
-
-        # Use centralized inventory management
-        success = update_inventory_stock(
-            inventory_id=inventory_ID,
-            quantity_change=quantity_change,
-            action='Manual Stock Adjustment',
-            user_id=session['user_id']
-        )
-
-        if success:
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return jsonify({'success': True, 'message': 'Stock updated and logged successfully!'})
-            flash('Stock updated and logged successfully!', 'success')
-        else:
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return jsonify({'success': False, 'message': 'Error updating stock.'}), 500
-            flash('Error updating stock.', 'error')
+    try:
+        with db_transaction(write=True) as conn:
+            c = conn.cursor()
+            result = inventory_ledger.set_stock(c, inventory_ID, new_stock, 'Manual Stock Adjustment',
+                                                user_id=session['user_id'])
+            if result:
+                emit_inventory_update(c, inventory_ID, result[0], result[1], 'Manual Stock Adjustment')
+                flash_counters.refresh(c, inventory_ID)
+    except db_retry.DatabaseBusy as e:
+        print(f"Database busy in update_stock: {e}")
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'success': False, 'message': 'Database is busy. Please try again.'}), 503, {'Retry-After': '1'}
+        flash('Database is temporarily busy. Please try again in a moment.', 'error')
+        return redirect(url_for('admin_dashboard'))
+    except Exception as e:
+        print(f"Error in update_stock: {e}")
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'success': False, 'message': 'Error updating stock.'}), 500
+        flash('Error updating stock.', 'error')
+        return redirect(url_for('admin_dashboard'))
 
+    if not result:
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'success': False, 'message': 'Inventory item not found.'}), 404
+        flash('Inventory item not found.', 'error')
+        return redirect(url_for('admin_dashboard'))
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': True, 'message': 'Stock updated and logged successfully!'})
+    flash('Stock updated and logged successfully!', 'success')
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/update_inventory', methods=['GET', 'POST', 'HEAD'])
+@admission_controlled(write_admission)
 def update_inventory():
     if 'user_id' not in session or session.get('role') != 'admin':
         print("Access denied - user not logged in or not admin")
@@ -657,7 +1293,7 @@ def update_inventory():
         print(f"Updating inventory ID: {inventory_ID}")
         print(f"New values: {product_code}, {name}, {category}, {current_stock}, {price}, {image}")
 
-        with db_transaction() as conn:
+        with db_transaction(write=True) as conn:
             c = conn.cursor()
             
             # Get previous stock for logging
@@ -672,20 +1308,18 @@ def update_inventory():
             
             previous_stock = result[0]
             
-            # Update inventory details
+            # Update inventory details (stock goes through the ledger below)
             c.execute('''
                 UPDATE inventory
-                SET product_code = ?, name = ?, category = ?, current_stock = ?, price = ?, image = ?
+                SET product_code = ?, name = ?, category = ?, price = ?, image = ?
                 WHERE inventory_ID = ?
-            ''', (product_code, name, category, current_stock, price, image, inventory_ID))
+            ''', (product_code, name, category, price, image, inventory_ID))
             
             # Log the stock change if it changed (do it directly in this transaction)
             if current_stock != previous_stock:
-                quantity_change = current_stock - previous_stock
-                c.execute('''INSERT INTO inventory_log 
-                            (inventory_ID, action, quantity, previous_stock, new_stock, timestamp, order_ID, user_ID) 
-                            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)''',
-                         (inventory_ID, 'Inventory Update', abs(quantity_change), previous_stock, current_stock, None, session['user_id']))
+                inventory_ledger.set_stock(c, inventory_ID, current_stock, 'Inventory Update',
+                                           user_id=session['user_id'])
+                flash_counters.refresh(c, inventory_ID)
                 
                 # Emit socket event for stock change
                 socketio.emit('inventory_updated', {
@@ -696,7 +1330,7 @@ def update_inventory():
                     'current_stock': current_stock,
                     'previous_stock': previous_stock,
                     'action': 'stock_update',
-                    'quantity': abs(quantity_change)
+                    'quantity': abs(current_stock - previous_stock)
                 })
             else:
                 # Emit socket event even if stock didn't change (for other inventory updates)
@@ -728,6 +1362,50 @@ def update_inventory():
         flash(f'Error updating inventory: {str(e)}', 'error')
         return redirect(url_for('admin_dashboard'))
 
+@app.route('/api/inventory/import', methods=['POST'])
+@admission_controlled(write_admission)
+def import_inventory():
+    """
+    Bulk create/update inventory from a CSV or JSON upload (form field `file`)
+    or request body, in one transaction. With ?dry_run=1 nothing is written
+    and the response is the diff.
+    """
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied.'}), 403
+
+    upload = request.files.get('file')
+    if upload:
+        data, fmt = upload.read(), inventory_import.detect_format(upload.filename, upload.mimetype)
+    else:
+        data, fmt = request.get_data(), inventory_import.detect_format(content_type=request.mimetype)
+    fmt = request.values.get('format', fmt)
+    dry_run = request.values.get('dry_run') in ('1', 'true')
+
+    try:
+        items = inventory_import.validate(inventory_import.parse(data, fmt), app.config['INVENTORY_IMPORT_MAX_ROWS'])
+        with db_transaction(write=not dry_run) as conn:
+            c = conn.cursor()
+            result = inventory_import.plan(c, items)
+            if not dry_run:
+                inventory_import.apply(c, result, user_id=session['user_id'])
+                for change in result['stock']:
+                    flash_counters.refresh(c, change['inventory_ID'])
+                if result['create'] or result['update'] or result['stock']:
+                    publish_event(c, 'inventory_bulk_updated', inventory_import.summary(result))
+    except inventory_import.InvalidImport as e:
+        return jsonify({'success': False, 'message': str(e), 'errors': e.errors}), 400
+    except db_retry.DatabaseBusy as e:
+        print(f"Database busy in import_inventory: {e}")
+        return jsonify({'success': False, 'message': 'Database is busy. Please try again.'}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        print(f"Error in import_inventory: {e}")
+        return jsonify({'success': False, 'message': 'Error importing inventory.'}), 500
+
+    if dry_run:
+        return jsonify({'success': True, 'dry_run': True, 'summary': inventory_import.summary(result), 'diff': result})
+    outbox_dispatcher.wake()
+    return jsonify({'success': True, 'dry_run': False, 'summary': inventory_import.summary(result)})
+
 @app.route('/cart')
 def cart_page():
     # Check if user is logged in
@@ -751,19 +1429,20 @@ def checkout_page():
     if session.get('role') == 'admin':
         flash('Admin users cannot access checkout.', 'error')
         return redirect(url_for('admin_dashboard'))
-    return render_template('cart/checkout.html')
+    # One key per rendered checkout form; a re-submitted form reuses it
+    return render_template('cart/checkout.html', idempotency_key=uuid.uuid4().hex)
 
 @app.route('/submit-feedback', methods=['POST'])
+@rate_limited('feedback')
 def submit_feedback():
     name = request.form.get('name')
     email = request.form.get('email')
     message = request.form.get('message')
     
     if name and email and message:
-        with db_transaction() as conn:
-            c = conn.cursor()
-            c.execute('INSERT INTO feedback (name, email, message) VALUES (?, ?, ?)', (name, email, message))
-            conn.commit()
+        # Journaled now, written to the database in the background
+        write_behind_queue.append('feedback', {'name': name, 'email': email, 'message': message,
+                                               'created_at': utc_timestamp()})
         
         # Return JSON response for AJAX handling
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -782,7 +1461,8 @@ def submit_feedback():
 @app.route('/api/check_login')
 def check_login():
     if 'user_id' in session:
-        return jsonify({'logged_in': True, 'username': session.get('full_name')})
+        profile = get_profile()
+        return jsonify({'logged_in': True, 'username': profile['full_name'] if profile else None})
     return jsonify({'logged_in': False})
 
 @app.route('/api/clear_cart')
@@ -790,44 +1470,73 @@ def clear_cart():
     # This endpoint is called when user logs out to clear cart
     return jsonify({'success': True})
 
-@app.route('/api/user_info')
-def user_info():
+@app.route('/api/cart')
+def get_cart():
+    """The logged-in user's server cart, repriced and stock-checked"""
     if 'user_id' not in session:
-        return jsonify({'logged_in': False})
+        return jsonify({'error': 'Login required'}), 401
     with db_transaction() as conn:
         c = conn.cursor()
-        c.execute('''SELECT full_name, email, phone, address, address_details, region, province, city, barangay 
-                     FROM clients WHERE client_ID = ?''', (session['user_id'],))
-        user = c.fetchone()
-        if user:
-            print(f"Debug - Raw user data: {user}")
-            # Get readable address names
-            readable_address = get_readable_address(user[5], user[6], user[7], user[8])
-            print(f"Debug - Readable address: {readable_address}")
-            
-            response_data = {
-                'logged_in': True,
-                'full_name': user[0],
-                'email': user[1],
-                'phone': user[2],
-                'address': user[3],
-                'address_details': user[4],
-                'region': user[5],
-                'province': user[6],
-                'city': user[7],
-                'barangay': user[8],
-                'readable_address': readable_address
-            }
-            print(f"Debug - API response: {response_data}")
-            return jsonify(response_data)
+        return jsonify(validate_cart(c, shopping_cart.get_lines(c, session['user_id'])))
+
+@app.route('/api/cart/items/<int:inventory_id>', methods=['PUT', 'DELETE'])
+def update_cart_item(inventory_id):
+    """Set a cart line's quantity (PUT {"quantity": n}) or remove it (DELETE)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    quantity = 0
+    if request.method == 'PUT':
+        try:
+            quantity = int((request.get_json(silent=True) or {}).get('quantity'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'quantity must be an integer'}), 400
+    with db_transaction(write=True) as conn:
+        found = shopping_cart.set_quantity(conn.cursor(), session['user_id'], inventory_id, quantity)
+    if not found:
+        return jsonify({'error': 'Product not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/cart/merge', methods=['POST'])
+def merge_cart():
+    """Merge the browser's localStorage cart into the server cart after login"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    lines = shopping_cart.parse_lines((request.get_json(silent=True) or {}).get('items'))
+    with db_transaction(write=True) as conn:
+        c = conn.cursor()
+        merged = shopping_cart.merge(c, session['user_id'], lines)
+        result = validate_cart(c, merged)
+    session.pop('cart_merge_pending', None)
+    return jsonify(result)
+
+@app.route('/api/cart/validate', methods=['POST'])
+def validate_cart_api():
+    """
+    Reprice and stock-check every line in one round trip. Validates the posted
+    items ({"items": [{"id", "quantity"}, ...]}), or the server cart if none are sent.
+    """
+    items = (request.get_json(silent=True) or {}).get('items')
+    if items is None and 'user_id' not in session:
+        return jsonify({'error': 'Login required'}), 401
+    with db_transaction() as conn:
+        c = conn.cursor()
+        lines = shopping_cart.parse_lines(items) if items is not None else shopping_cart.get_lines(c, session['user_id'])
+        return jsonify(validate_cart(c, lines))
+
+@app.route('/api/user_info')
+def user_info():
+    profile = get_profile()
+    if not profile:
         return jsonify({'logged_in': False})
+    return jsonify(dict(profile, logged_in=True))
 
-def get_readable_address(region_code, province_code, city_code, barangay_code):
-    """Get readable address names from codes"""
-    print(f"Debug - Input codes: region={region_code}, province={province_code}, city={city_code}, barangay={barangay_code}")
-    
+# Address gazetteer: the PSGC JSON files loaded once per process (before fork under the launcher)
+gazetteer = {'loaded': False, 'region': {}, 'province': {}, 'city': {}, 'barangay': {},
+             'barangays': [], 'barangays_by_city': {}}
+
+def load_gazetteer():
+    """Index the address JSON files by code"""
     try:
-        # Load JSON files
         with open('static/json/region.json', encoding='utf-8') as f:
             regions = json.load(f)
         with open('static/json/province.json', encoding='utf-8') as f:
@@ -836,89 +1545,97 @@ def get_readable_address(region_code, province_code, city_code, barangay_code):
             cities = json.load(f)
         with open('static/json/barangay.json', encoding='utf-8') as f:
             barangays = json.load(f)
-        
-        print(f"Debug - Loaded JSON files: regions={len(regions)}, provinces={len(provinces)}, cities={len(cities)}, barangays={len(barangays)}")
-        
-        # Find readable names
-        region_name = next((r['region_name'] for r in regions if r['region_code'] == region_code), region_code)
-        province_name = next((p['province_name'] for p in provinces if p['province_code'] == province_code), province_code)
-        city_name = next((c['city_name'] for c in cities if c['city_code'] == city_code), city_code)
-        barangay_name = next((b['brgy_name'] for b in barangays if b['brgy_code'] == barangay_code), barangay_code)
-        
-        print(f"Debug - Found names: region={region_name}, province={province_name}, city={city_name}, barangay={barangay_name}")
-        
-        return {
-            'region_name': region_name,
-            'province_name': province_name,
-            'city_name': city_name,
-            'barangay_name': barangay_name
-        }
     except Exception as e:
-        print(f"Error getting readable address: {e}")
-        return {
-            'region_name': region_code,
-            'province_name': province_code,
-            'city_name': city_code,
-            'barangay_name': barangay_code
-        }
+        print(f"Error loading address data: {e}")
+        return False
+    
+    barangays_by_city = {}
+    for b in barangays:
+        barangays_by_city.setdefault(b.get('city_code'), []).append(b)
+    gazetteer.update({
+        'region': {r['region_code']: r['region_name'] for r in regions},
+        'province': {p['province_code']: p['province_name'] for p in provinces},
+        'city': {c['city_code']: c['city_name'] for c in cities},
+        'barangay': {b['brgy_code']: b['brgy_name'] for b in barangays},
+        'barangays': barangays,
+        'barangays_by_city': barangays_by_city,
+        'loaded': True
+    })
+    return True
+
+def get_readable_address(region_code, province_code, city_code, barangay_code):
+    """Get readable address names from codes"""
+    if not gazetteer['loaded']:
+        load_gazetteer()
+    return {
+        'region_name': gazetteer['region'].get(region_code, region_code),
+        'province_name': gazetteer['province'].get(province_code, province_code),
+        'city_name': gazetteer['city'].get(city_code, city_code),
+        'barangay_name': gazetteer['barangay'].get(barangay_code, barangay_code)
+    }
 
 @app.route('/api/barangays')
 def api_barangays():
     city_code = request.args.get('city_code')
     if not city_code:
         return jsonify([])
-    with open('static/json/barangay.json', encoding='utf-8') as f:
-        # Stream and filter line by line for memory efficiency
-        barangays = json.load(f)
-        filtered = [b for b in barangays if b.get('city_code') == city_code]
-    return jsonify(filtered)
+    if not gazetteer['loaded']:
+        load_gazetteer()
+    return jsonify(gazetteer['barangays_by_city'].get(city_code, []))
 
 @app.route('/api/barangays-debug')
 def api_barangays_debug():
-    with open('static/json/barangay.json', encoding='utf-8') as f:
-        barangays = json.load(f)
-        return jsonify(barangays[:10])
+    if not gazetteer['loaded']:
+        load_gazetteer()
+    return jsonify(gazetteer['barangays'][:10])
 
 # API endpoint to get all inventory (for real-time updates)
+def load_inventory_snapshot():
+    with db_transaction() as conn:
+        return inventory_snapshot.load(conn.cursor())
+
 @app.route('/api/inventory')
 def api_inventory():
-    with db_transaction() as conn:
-        c = conn.cursor()
-        c.execute('SELECT inventory_ID, product_code, name, category, material, price, image, current_stock, low_stock_threshold FROM inventory')
-        inventory = []
-        for row in c.fetchall():
-            inventory.append({
-                'inventory_ID': row[0],
-                'product_code': row[1],
-                'name': row[2],
-                'category': row[3],
-                'material': row[4],
-                'price': row[5],
-                'image': row[6],
-                'current_stock': row[7],
-                'low_stock_threshold': row[8]
-            })
-        return jsonify(inventory)
+    """
+    Inventory list, served from bytes serialized once per catalog version.
+    ETag is the version, so unchanged polls get 304. With ?since_version=N the
+    request is held until the version moves past N (304 if it has not moved
+    within INVENTORY_LONG_POLL_TIMEOUT seconds).
+    """
+    version, body, _ = load_inventory_snapshot()
+    since_version = request.args.get('since_version', type=int)
+    if since_version is not None:
+        deadline = time.monotonic() + app.config['INVENTORY_LONG_POLL_TIMEOUT']
+        while version == since_version and time.monotonic() < deadline:
+            time.sleep(min(app.config['INVENTORY_LONG_POLL_INTERVAL'], max(0, deadline - time.monotonic())))
+            version, body, _ = load_inventory_snapshot()
+    headers = {'X-Inventory-Version': str(version), 'Cache-Control': 'no-cache'}
+    if version == since_version:
+        # Nothing changed before the long-poll deadline
+        response = app.response_class(status=304, headers=headers)
+        response.set_etag(f'inventory-{version}', weak=True)
+        return response
+    response = app.response_class(body, mimetype='application/json', headers=headers)
+    response.set_etag(f'inventory-{version}', weak=True)
+    response = response.make_conditional(request)
+    if response.status_code == 200 and len(body) >= app.config['JSON_COMPRESS_MIN_SIZE']:
+        response.vary.add('Accept-Encoding')
+        encoding = fast_json.preferred_encoding(request.headers.get('Accept-Encoding'))
+        if encoding:
+            response.set_data(inventory_snapshot.encoded(version, body, encoding, fast_json.encode))
+            response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/api/inventory/<int:inventory_id>')
 def api_inventory_item(inventory_id):
-    with db_transaction() as conn:
-        c = conn.cursor()
-        c.execute('SELECT inventory_ID, product_code, name, category, material, price, image, current_stock, low_stock_threshold FROM inventory WHERE inventory_ID = ?', (inventory_id,))
-        row = c.fetchone()
-        if row:
-            return jsonify({
-                'inventory_ID': row[0],
-                'product_code': row[1],
-                'name': row[2],
-                'category': row[3],
-                'material': row[4],
-                'price': row[5],
-                'image': row[6],
-                'current_stock': row[7],
-                'low_stock_threshold': row[8]
-            })
+    _, _, items = load_inventory_snapshot()
+    if inventory_id not in items:
         return jsonify({'error': 'Item not found'}), 404
+    etag, body = items[inventory_id]
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 # API endpoint to get all orders (admin only, for real-time updates)
 @app.route('/api/orders')
@@ -926,19 +1643,10 @@ def api_orders():
     if 'user_id' not in session or session.get('role') != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
     with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('''
+        return json_rows(conn.cursor(), '''
             SELECT o.*, c.full_name as username FROM orders o
             LEFT JOIN clients c ON o.client_ID = c.client_ID
         ''')
-        orders = []
-        for row in c.fetchall():
-            order = dict(row)
-            # For compatibility with existing JS, ensure username is present
-            order['username'] = row['username']
-            orders.append(order)
-        return jsonify(orders)
 
 # API endpoint to get all clients (admin only, for real-time updates)
 @app.route('/api/clients')
@@ -946,11 +1654,7 @@ def api_clients():
     if 'user_id' not in session or session.get('role') != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
     with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('SELECT * FROM clients')
-        clients = [dict(row) for row in c.fetchall()]
-    return jsonify(clients)
+        return json_rows(conn.cursor(), 'SELECT * FROM clients')
 
 # API endpoint to get inventory logs
 @app.route('/api/inventory_logs')
@@ -961,7 +1665,7 @@ def api_inventory_logs():
         
         # First, check if the new columns exist
         try:
-            c.execute('''
+            return json_rows(c, '''
                 SELECT 
                     il.log_ID,
                     il.inventory_ID,
@@ -975,9 +1679,11 @@ def api_inventory_logs():
                     il.timestamp,
                     il.order_ID,
                     il.user_ID,
-                    c.full_name,
-                    c.email,
-                    c.phone
+                    CASE WHEN NULLIF(c.full_name, '') IS NOT NULL AND NULLIF(c.email, '') IS NOT NULL
+                              AND NULLIF(c.phone, '') IS NOT NULL
+                         THEN c.full_name || ' ' || c.email || ' ' || c.phone
+                         ELSE COALESCE(NULLIF(c.full_name, ''), NULLIF(c.email, ''), NULLIF(c.phone, ''), 'System')
+                    END AS user_name
                 FROM inventory_log il
                 JOIN inventory i ON il.inventory_ID = i.inventory_ID
                 LEFT JOIN clients c ON il.user_ID = c.client_ID
@@ -986,7 +1692,7 @@ def api_inventory_logs():
             ''')
         except sqlite3.OperationalError:
             # Fallback query for older database schema
-            c.execute('''
+            return json_rows(c, '''
                 SELECT 
                     il.log_ID,
                     il.inventory_ID,
@@ -1000,34 +1706,129 @@ def api_inventory_logs():
                     il.timestamp,
                     NULL as order_ID,
                     NULL as user_ID,
-                    NULL as full_name,
-                    NULL as email,
-                    NULL as phone
+                    'System' as user_name
                 FROM inventory_log il
                 JOIN inventory i ON il.inventory_ID = i.inventory_ID
                 ORDER BY il.timestamp DESC
                 LIMIT 100
             ''')
-        
-        logs = []
-        for row in c.fetchall():
-            logs.append({
-                'log_ID': row[0],
-                'inventory_ID': row[1],
-                'name': row[2],
-                'product_code': row[3],
-                'category': row[4],
-                'action': row[5],
-                'quantity': row[6],
-                'previous_stock': row[7],
-                'new_stock': row[8],
-                'timestamp': row[9],
-                'order_ID': row[10],
-                'user_ID': row[11],
-                'user_name': f"{row[12]} {row[13]} {row[14]}" if row[12] and row[13] and row[14] else row[12] if row[12] else row[13] if row[13] else row[14] if row[14] else 'System'
-            })
-        
-        return jsonify(logs)
+
+# API endpoint to manage flash-sale mode (admin only)
+@app.route('/api/flash_sale', methods=['GET', 'POST'])
+def api_flash_sale():
+    """
+    GET returns the in-memory available stock of flash-sale items.
+    POST {"product_codes": [...], "enabled": true|false} turns the mode on or off.
+    """
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        product_codes = data.get('product_codes') or []
+        if data.get('enabled', True):
+            if app.config['WORKERS'] > 1:
+                # Counters live in this worker's memory; the other workers would keep selling from the database
+                return jsonify({'error': 'Flash-sale mode needs WORKERS=1'}), 409
+            enable_flash_sale(product_codes)
+        else:
+            disable_flash_sale(product_codes)
+    return jsonify({'available': flash_counters.status()})
+
+@app.route('/api/admission')
+def admission_metrics():
+    """Admission controller counters for the write routes"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(write_admission.metrics())
+
+@app.route('/api/rate_limits')
+def rate_limit_metrics():
+    """Rate limiter counters and the budgets in effect"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    rules = {key[len('RATE_LIMIT_'):].lower(): repr(rate_limit.parse(value)) if value else None
+             for key, value in app.config.items() if key.startswith('RATE_LIMIT_') and key.endswith(('_PER_IP', '_PER_USER'))}
+    return jsonify(dict(rate_limiter.metrics(), rules=rules))
+
+@app.route('/api/write_behind')
+def write_behind_metrics():
+    """Depth and counters of this process's feedback/review journal"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(write_behind_queue.metrics())
+
+@app.route('/api/outbox')
+def outbox_metrics():
+    """Outbox dispatcher counters and undelivered notifications per sink"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(outbox_dispatcher.metrics())
+
+@app.route('/api/db_stats')
+def db_stats():
+    """Write-lock retry counters and the retry policy in effect"""
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(dict(db_retry_counters.snapshot(),
+                        busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+                        max_attempts=db_retry_policy.max_attempts,
+                        base_delay=db_retry_policy.base_delay,
+                        max_delay=db_retry_policy.max_delay,
+                        request_deadline=app.config['REQUEST_DB_DEADLINE']))
+
+# API endpoint to check the inventory ledger against current stock (admin only)
+@app.route('/api/inventory/reconcile', methods=['GET', 'POST'])
+def api_inventory_reconcile():
+    """
+    Report items whose current_stock has drifted from the inventory ledger.
+    POST resets drifting items to the ledger value and takes a fresh snapshot.
+    """
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+    with db_transaction(write=request.method == 'POST') as conn:
+        c = conn.cursor()
+        drift = inventory_ledger.reconcile(c)
+        repaired = 0
+        if request.method == 'POST' and drift:
+            repaired = inventory_ledger.repair(c, drift)
+            inventory_ledger.take_snapshot(c, [item['inventory_ID'] for item in drift])
+    return jsonify({'drift': drift, 'repaired': repaired})
+
+# Product search API
+@app.route('/api/search')
+def api_search():
+    """
+    Ranked full-text product search.
+    ?q=<text>&material=&category=&min_price=&max_price=&in_stock=1&limit=&offset=
+    """
+    filters = {
+        'material': request.args.get('material'),
+        'category': request.args.get('category'),
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'in_stock': request.args.get('in_stock') == '1'
+    }
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    try:
+        with db_transaction() as conn:
+            result = product_search.search(conn.cursor(), request.args.get('q', ''), filters, limit, offset)
+    except sqlite3.OperationalError as e:
+        print(f"Search error: {e}")
+        return jsonify({'error': 'Search is unavailable'}), 503
+    result['query'] = request.args.get('q', '')
+    return jsonify(result)
+
+@app.route('/api/search/autocomplete')
+def api_search_autocomplete():
+    """Product name suggestions for a partially typed query: ?q=<text>"""
+    try:
+        with db_transaction() as conn:
+            suggestions = product_search.autocomplete(conn.cursor(), request.args.get('q', ''))
+    except sqlite3.OperationalError as e:
+        print(f"Search error: {e}")
+        return jsonify({'error': 'Search is unavailable'}), 503
+    return jsonify(suggestions)
 
 # Static Pages
 @app.route('/about')
@@ -1036,17 +1837,8 @@ def about():
 
 @app.route('/contact')
 def contact():
-    user_data = None
-    if 'user_id' in session:
-        with db_transaction() as conn:
-            c = conn.cursor()
-            c.execute('SELECT full_name, email FROM clients WHERE client_ID = ?', (session['user_id'],))
-            user = c.fetchone()
-            if user:
-                user_data = {
-                    'full_name': user[0],
-                    'email': user[1]
-                }
+    profile = get_profile()
+    user_data = {'full_name': profile['full_name'], 'email': profile['email']} if profile else None
     return render_template('contact.html', user_data=user_data)
 
 @app.route('/terms')
@@ -1058,47 +1850,172 @@ def privacy():
     return render_template('privacy.html')
 
 # Collection Pages
-@app.route('/collections/necklaces')
-def necklacec():
-    with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM inventory WHERE category = 'Necklace'")
-        products = c.fetchall()
-    return render_template('necklacec.html', products=products)
+catalog_cache = catalog.CatalogCache()
+inventory_snapshot = catalog.InventorySnapshot(catalog_cache, lambda obj: app.json.dumps(obj).encode())
+
+def load_asset_manifest():
+    manifest = static_assets.load_manifest(app.config['ASSET_BUILD_DIR'])
+    asset_manifest.clear()
+    asset_manifest.update(manifest)
+    asset_names.clear()
+    asset_names.update(manifest.values())
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static CSS/JS file: its fingerprinted copy if built, otherwise the file itself"""
+    hashed = asset_manifest.get(filename)
+    if hashed:
+        return url_for('asset', name=hashed)
+    return url_for('static', filename=filename)
+
+@app.route('/assets/<path:name>')
+def asset(name):
+    """Serve a fingerprinted asset, precompressed when the client accepts it"""
+    if name not in asset_names:
+        abort(404)
+    path, encoding = static_assets.select(app.config['ASSET_BUILD_DIR'], name, request.headers.get('Accept-Encoding'))
+    response = send_file(os.path.abspath(path), mimetype=mimetypes.guess_type(name)[0])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.template_global()
+def image_url(filename, width):
+    """URL of the smallest WebP derivative at least `width` px wide, or of the original image"""
+    variants = image_store.variants(filename, 'webp')
+    for name, variant_width in variants:
+        if variant_width >= width:
+            return url_for('image_variant', name=name)
+    if variants:
+        return url_for('image_variant', name=variants[-1][0])
+    return url_for('static', filename=filename)
+
+@app.template_global()
+def responsive_image(filename, alt, sizes, css_class='', loading='lazy'):
+    """<picture> offering WebP and PNG derivatives via srcset; a plain <img> if there are none"""
+    sources = []
+    for image_format in ('webp', 'png'):
+        variants = image_store.variants(filename, image_format)
+        if variants:
+            srcset = ', '.join(f"{url_for('image_variant', name=name)} {width}w" for name, width in variants)
+            sources.append(f'<source type="image/{image_format}" srcset="{srcset}" sizes="{escape(sizes)}">')
+    img = (f'<img src="{url_for("static", filename=filename)}" alt="{escape(alt)}" class="{escape(css_class)}" '
+           f'loading="{escape(loading)}" decoding="async">')
+    if not sources:
+        return Markup(img)
+    return Markup(f'<picture>{"".join(sources)}{img}</picture>')
+
+@app.route('/img/<path:name>')
+def image_variant(name):
+    """Serve an image derivative, rendering it on first request; names change with the source"""
+    path = db_offload.run(image_store.build, name)
+    if not path:
+        abort(404)
+    response = send_file(os.path.abspath(path))
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def collection_query(category):
+    """Filter, sort and paginate a collection from the request args"""
+    if category not in catalog.COLLECTIONS:
+        abort(404)
+    category_name, title, tagline, icon = catalog.COLLECTIONS[category]
+    filters = {
+        'material': request.args.get('material') or None,
+        'min_price': request.args.get('min_price', type=float),
+        'max_price': request.args.get('max_price', type=float),
+        'in_stock': request.args.get('in_stock') == '1',
+        'sort': request.args.get('sort') if request.args.get('sort') in catalog.SORTS else 'featured'
+    }
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(request.args.get('per_page', 24, type=int), 1), 100)
 
-@app.route('/collections/rings')
-def ringc():
     with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
         c = conn.cursor()
-        c.execute("SELECT * FROM inventory WHERE category = 'Ring'")
-        products = c.fetchall()
-    return render_template('ringc.html', products=products)
-
-@app.route('/collections/bracelets')
-def braceletc():
-    with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM inventory WHERE category = 'Bracelet'")
-        products = c.fetchall()
-    return render_template('braceletc.html', products=products)
-
-@app.route('/collections/earrings')
-def earringc():
-    with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM inventory WHERE category = 'Earring'")
-        products = c.fetchall()
-    return render_template('earringc.html', products=products)
+        all_products = catalog_cache.load(c)
+        ratings = product_reviews.get_summaries(c)
+    products, total, pages = catalog.query_collection(
+        all_products, category_name, filters['material'], filters['min_price'], filters['max_price'],
+        filters['in_stock'], filters['sort'], page, per_page)
+    return {
+        'collection': {'slug': category, 'category': category_name, 'title': title, 'tagline': tagline, 'icon': icon},
+        'products': products,
+        'ratings': ratings,
+        'filters': filters,
+        'materials': catalog.materials(all_products, category_name),
+        'page': min(max(page, 1), pages),
+        'pages': pages,
+        'total': total
+    }
+
+@app.route('/collections/<category>')
+def collection(category):
+    result = collection_query(category)
+    # Keep the active filters on pagination links
+    page_args = {key: value for key, value in request.args.items() if key != 'page'}
+    return render_template('collection.html', sorts=[(key, sort[0]) for key, sort in catalog.SORTS.items()],
+                           page_args=page_args, **result)
+
+@app.route('/api/collections/<category>')
+def api_collection(category):
+    """JSON variant of a collection page (same query args)"""
+    result = collection_query(category)
+    result['products'] = [dict(product, rating=result['ratings'].get(product['inventory_ID']))
+                          for product in result['products']]
+    del result['ratings']
+    return jsonify(result)
 
 @app.route('/our-values')
 def our_values():
     return render_template('our-values.html')
 
+def resolve_inventory_ids(items):
+    """
+    Set item['inventory_ID'] for every checkout line. Lines carry the cart's
+    product id; only legacy lines without one are looked up by name.
+    Lines that match no inventory row get None and fail the stock check.
+    """
+    missing = []
+    for item in items:
+        try:
+            item['inventory_ID'] = int(item.get('id'))
+        except (TypeError, ValueError):
+            item['inventory_ID'] = None
+            missing.append(item)
+    if missing:
+        names = list({item['name'] for item in missing})
+        with db_transaction() as conn:
+            c = conn.cursor()
+            c.execute('SELECT name, inventory_ID FROM inventory WHERE name IN (%s)' % ','.join('?' * len(names)), names)
+            ids_by_name = dict(c.fetchall())
+        for item in missing:
+            item['inventory_ID'] = ids_by_name.get(item['name'])
+    return items
+
+def validate_cart(c, lines):
+    """Reprice and stock-check (inventory_ID, quantity) lines against the catalog cache"""
+    catalog_cache.load(c)
+    counters = flash_counters.status()
+    available = {flash_counters.inventory_id(code): units for code, units in counters.items()}
+    result = shopping_cart.validate(catalog_cache.by_id, lines, available)
+    for item in result['items']:
+        if item.get('image'):
+            item['image'] = image_url(item['image'], 160)
+    return result
+
+def find_order_by_idempotency_key(user_id, idempotency_key):
+    """Order already created by this user for a checkout submission, if any"""
+    with db_transaction() as conn:
+        c = conn.cursor()
+        c.execute('SELECT order_ID FROM orders WHERE client_ID = ? AND idempotency_key = ?', (user_id, idempotency_key))
+        row = c.fetchone()
+        return row[0] if row else None
+
 @app.route('/place_order', methods=['POST'])
+@rate_limited('checkout')
+@admission_controlled(write_admission)
 def place_order():
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -1117,6 +2034,13 @@ def place_order():
         cc_cvc = request.form.get('cc_cvc')
         gcash_phone = request.form.get('gcash_phone')
         gcash_pin = request.form.get('gcash_pin')
+        idempotency_key = request.form.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        
+        # A retried submission of the same checkout returns the order it already created
+        if idempotency_key:
+            existing_order_id = find_order_by_idempotency_key(session['user_id'], idempotency_key)
+            if existing_order_id:
+                return redirect(url_for('receipt', order_id=existing_order_id))
         
         # Compose shipping address
         address_fields = [address_details or '', barangay or '', city or '', province or '', region or '']
@@ -1144,72 +2068,147 @@ def place_order():
                 flash('Please provide GCash phone number and PIN.', 'error')
                 return redirect(url_for('checkout_page'))
         
-        # Check stock for each item and decrement stock immediately (reserve stock)
+        # Key every line by inventory_ID (carts saved before IDs were sent only carry the name)
+        resolve_inventory_ids(items)
+        
+        # Reprice and stock-check the whole cart in one pass; client-sent prices are never used
         with db_transaction() as conn:
-            c = conn.cursor()
-            
-            # Check stock availability first
-            for item in items:
-                c.execute('SELECT current_stock FROM inventory WHERE name = ?', (item['name'],))
-                row = c.fetchone()
-                if not row or item['quantity'] > row[0]:
-                    flash(f"Not enough stock for {item['name']}. Only {row[0] if row else 0} left.", 'error')
-                    return redirect(url_for('checkout_page'))
-            
-            # Decrement stock for each item
-            for item in items:
-                c.execute('SELECT inventory_ID, current_stock FROM inventory WHERE name = ?', (item['name'],))
-                row = c.fetchone()
-                if row:
-                    inventory_id, current_stock = row
-                    new_stock = max(0, current_stock - item['quantity'])
-                    c.execute('UPDATE inventory SET current_stock = ? WHERE name = ?', (new_stock, item['name']))
-                    
-                    # Log inventory change
-                    c.execute('''INSERT INTO inventory_log 
-                                (inventory_ID, action, quantity, previous_stock, new_stock, timestamp) 
-                                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
-                             (inventory_id, 'Order Placed', item['quantity'], current_stock, new_stock))
+            checked = validate_cart(conn.cursor(), [(item['inventory_ID'], int(item['quantity'])) for item in items])
+        if not checked['ok']:
+            flash(' '.join(checked['errors']), 'error')
+            return redirect(url_for('checkout_page'))
+        items = [{'inventory_ID': line['id'], 'name': line['name'], 'price': line['price'], 'quantity': line['quantity']}
+                 for line in checked['items']]
+        
+        # Flash-sale items are admitted against in-memory counters without touching the inventory row
+        hot_lines = []
+        hot_codes = {}
+        for item in items:
+            code = flash_counters.hot_code(item['inventory_ID'])
+            if code:
+                hot_lines.append((code, item['quantity']))
+                hot_codes[item['inventory_ID']] = code
+        if hot_lines:
+            admitted, code, available = flash_counters.try_reserve(hot_lines)
+            if not admitted:
+                name = next(item['name'] for item in items if hot_codes.get(item['inventory_ID']) == code)
+                flash(f"Not enough stock for {name}. Only {available} left.", 'error')
+                return redirect(url_for('checkout_page'))
+        
+        profile = get_profile() or {}
+        
+        # Check stock for each item and decrement stock immediately (reserve stock)
+        try:
+            with db_transaction(write=True) as conn:
+                c = conn.cursor()
+                
+                # Re-check under the lock so a concurrent duplicate submission does no work
+                if idempotency_key:
+                    c.execute('SELECT order_ID FROM orders WHERE client_ID = ? AND idempotency_key = ?',
+                              (session['user_id'], idempotency_key))
+                    row = c.fetchone()
+                    if row:
+                        flash_counters.release(hot_lines)
+                        return redirect(url_for('receipt', order_id=row[0]))
+                
+                # Re-check stock under the lock in one query (flash-sale items were admitted above)
+                cold_items = [item for item in items if item['inventory_ID'] not in hot_codes]
+                if cold_items:
+                    c.execute('SELECT inventory_ID, current_stock, low_stock_threshold, product_code FROM inventory '
+                              'WHERE inventory_ID IN (%s)' % ','.join('?' * len(cold_items)),
+                              [item['inventory_ID'] for item in cold_items])
+                    rows = c.fetchall()
+                    stock = {row[0]: row[1] for row in rows}
+                    low_stock = {row[0]: (row[2], row[3]) for row in rows}
+                    shortages = [f"Not enough stock for {item['name']}. Only {stock.get(item['inventory_ID']) or 0} left."
+                                 for item in cold_items if item['quantity'] > (stock.get(item['inventory_ID']) or 0)]
+                    if shortages:
+                        flash_counters.release(hot_lines)
+                        flash(' '.join(shortages), 'error')
+                        return redirect(url_for('checkout_page'))
+                
+                # Calculate total
+                subtotal = sum(item['price'] * item['quantity'] for item in items)
+                shipping_cost = 50.0
+                total = subtotal + shipping_cost
+                
+                # Save order
+                status = 'Pending Payment' if payment_method == 'Cash on Delivery' else 'Paid'
+                order_number = generate_order_number()
+                c.execute('INSERT INTO orders (client_ID, order_number, status, total_amount, shipping_address, payment_method, idempotency_key) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                          (session['user_id'], order_number, status, total, shipping_address, payment_method, idempotency_key))
+                order_id = c.lastrowid
+                
+                c.executemany('INSERT INTO order_items (order_ID, inventory_ID, product_name, quantity, unit_price) VALUES (?, ?, ?, ?, ?)',
+                              [(order_id, item['inventory_ID'], item['name'], item['quantity'], item['price']) for item in items])
+                
+                # Decrement stock for each item through the inventory ledger
+                for item in items:
+                    inventory_id = item['inventory_ID']
+                    if inventory_id in hot_codes:
+                        # Applied to the ledger by the flash-sale flusher
+                        flash_sale.queue_decrement(c, inventory_id, item['quantity'],
+                                                   order_id=order_id, user_id=session['user_id'])
+                        continue
+                    previous_stock, new_stock = inventory_ledger.record_change(
+                        c, inventory_id, -item['quantity'], 'Order Placed',
+                        order_id=order_id, user_id=session['user_id'])
                     
-                    # Emit real-time inventory update
-                    socketio.emit('inventory_update', {
+                    # Real-time inventory update, plus an alert when this order takes the item below its threshold
+                    publish_event(c, 'inventory_update', {
                         'inventory_id': inventory_id,
                         'product_name': item['name'],
                         'new_stock': new_stock,
                         'action': 'Order Placed'
                     })
-            
-            # Calculate total
-            subtotal = sum(item['price'] * item['quantity'] for item in items)
-            shipping_cost = 50.0
-            total = subtotal + shipping_cost
-            
-            # Save order
-            status = 'Pending Payment' if payment_method == 'Cash on Delivery' else 'Paid'
-            c.execute('INSERT INTO orders (client_ID, order_number, status, total_amount, shipping_address, payment_method) VALUES (?, ?, ?, ?, ?, ?)',
-                      (session['user_id'], f"ORD{int(datetime.datetime.now().timestamp())}", status, total, shipping_address, payment_method))
-            order_id = c.lastrowid
-            
-            for item in items:
-                c.execute('INSERT INTO order_items (order_ID, product_name, quantity, unit_price) VALUES (?, ?, ?, ?)',
-                          (order_id, item['name'], item['quantity'], item['price']))
-            
-            conn.commit()
+                    threshold, product_code = low_stock[inventory_id]
+                    if threshold is not None and new_stock <= threshold < previous_stock:
+                        publish_event(c, 'low_stock', {'inventory_ID': inventory_id, 'name': item['name'],
+                                                       'product_code': product_code, 'current_stock': new_stock,
+                                                       'low_stock_threshold': threshold, 'order_id': order_id})
+                
+                # Unpaid orders only hold their stock until the reservation expires
+                if status == 'Pending Payment':
+                    stock_reservations.reserve(c, order_id, [(item['inventory_ID'], item['quantity']) for item in items],
+                                               app.config['RESERVATION_TTL'])
+                
+                # Ordered lines leave the server cart with the order
+                shopping_cart.remove(c, session['user_id'], [item['inventory_ID'] for item in items])
+                
+                # Notifications commit with the order and are sent by the outbox dispatcher
+                publish_event(c, 'new_order', {'order_id': order_id})
+                publish_event(c, 'order_placed', {
+                    'order_id': order_id, 'order_number': order_number, 'status': status,
+                    'email': profile.get('email'), 'full_name': profile.get('full_name'),
+                    'items': items, 'shipping': shipping_cost, 'total': total, 'payment_method': payment_method
+                })
+                
+                conn.commit()
+        except Exception:
+            flash_counters.release(hot_lines)
+            raise
         
         # Remove items from cart (simulate by clearing session key)
         session.pop('itemsToCheckout', None)
-        
-        # Emit real-time event to all connected clients (admin dashboard)
-        socketio.emit('new_order', {'order_id': order_id})
+        outbox_dispatcher.wake()
         
         # Redirect to receipt
         return redirect(url_for('receipt', order_id=order_id))
     
+    except sqlite3.IntegrityError as e:
+        # Another worker committed the same idempotency key first
+        existing_order_id = find_order_by_idempotency_key(session['user_id'], idempotency_key) if idempotency_key else None
+        if existing_order_id:
+            return redirect(url_for('receipt', order_id=existing_order_id))
+        flash('An error occurred while processing your order.', 'error')
+        print(f"Integrity error in place_order: {e}")
+        return redirect(url_for('checkout_page'))
+    except db_retry.DatabaseBusy as e:
+        flash('Database is temporarily busy. Please try again in a moment.', 'error')
+        print(f"Database busy in place_order: {e}")
+        return redirect(url_for('checkout_page'))
     except sqlite3.OperationalError as e:
-        if "database is locked" in str(e):
-            flash('Database is temporarily busy. Please try again in a moment.', 'error')
-        else:
-            flash('An error occurred while processing your order.', 'error')
+        flash('An error occurred while processing your order.', 'error')
         print(f"Database error in place_order: {e}")
         return redirect(url_for('checkout_page'))
     except Exception as e:
@@ -1221,7 +2220,6 @@ def place_order():
 def receipt(order_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    import json
     with db_transaction() as conn:
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
@@ -1229,32 +2227,21 @@ def receipt(order_id):
         order = c.fetchone()
         c.execute('SELECT * FROM order_items WHERE order_ID = ?', (order_id,))
         items = c.fetchall()
-        # Parse address codes
-        address = order['shipping_address']
-        address_parts = [p.strip() for p in address.split(',')]
-        details, barangay_code, city_code, province_code, region_code = (address_parts + ['']*5)[:5]
-        # Load JSONs
-        with open('static/json/region.json', encoding='utf-8') as f:
-            regions = json.load(f)
-        with open('static/json/province.json', encoding='utf-8') as f:
-            provinces = json.load(f)
-        with open('static/json/city.json', encoding='utf-8') as f:
-            cities = json.load(f)
-        with open('static/json/barangay.json', encoding='utf-8') as f:
-            barangays = json.load(f)
-        region_name = next((r['region_name'] for r in regions if r['region_code'] == region_code), region_code)
-        province_name = next((p['province_name'] for p in provinces if p['province_code'] == province_code), province_code)
-        city_name = next((c['city_name'] for c in cities if c['city_code'] == city_code), city_code)
-        barangay_name = next((b['brgy_name'] for b in barangays if b['brgy_code'] == barangay_code), barangay_code)
-    return render_template('cart/receipt.html', order=order, items=items, address_details=details, barangay_name=barangay_name, city_name=city_name, province_name=province_name, region_name=region_name)
+    # Parse address codes
+    address = order['shipping_address']
+    address_parts = [p.strip() for p in address.split(',')]
+    details, barangay_code, city_code, province_code, region_code = (address_parts + ['']*5)[:5]
+    names = get_readable_address(region_code, province_code, city_code, barangay_code)
+    return render_template('cart/receipt.html', order=order, items=items, address_details=details, **names)
 
 @app.route('/order_received/<int:order_id>', methods=['POST'])
+@admission_controlled(write_admission)
 def order_received(order_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
     try:
-        with db_transaction() as conn:
+        with db_transaction(write=True) as conn:
             c = conn.cursor()
             # Ensure the order belongs to the user and fetch payment_method
             c.execute('SELECT status, client_ID, payment_method FROM orders WHERE order_ID = ?', (order_id,))
@@ -1265,75 +2252,33 @@ def order_received(order_id):
             
             status, client_id, payment_method = row
             
-            if payment_method == 'Cash on Delivery':
-                if status == 'Pending Payment':
-                    c.execute('UPDATE orders SET status = ? WHERE order_ID = ?', ('Paid', order_id))
-                    conn.commit()
-                    flash('Order marked as paid. Thank you! Please confirm delivery once received.', 'success')
-                elif status == 'Paid':
-                    c.execute('UPDATE orders SET status = ? WHERE order_ID = ?', ('Completed', order_id))
-                    # Decrement inventory for each item in the order
-                    c.execute('SELECT product_name, quantity FROM order_items WHERE order_ID = ?', (order_id,))
-                    items = c.fetchall()
-                    
-                    for product_name, qty in items:
-                        c.execute('SELECT inventory_ID, current_stock FROM inventory WHERE name = ?', (product_name,))
-                        row = c.fetchone()
-                        if row:
-                            inventory_id, current_stock = row
-                            new_stock = max(0, current_stock - qty)
-                            
-                            # Log the inventory change
-                            c.execute('''INSERT INTO inventory_log 
-                                        (inventory_ID, action, quantity, previous_stock, new_stock, timestamp, order_ID, user_ID) 
-                                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)''',
-                                     (inventory_id, 'Order Completed', qty, current_stock, new_stock, order_id, session['user_id']))
-                            
-                            # Update inventory
-                            c.execute('UPDATE inventory SET current_stock = ? WHERE inventory_ID = ?', (new_stock, inventory_id))
-                    
-                    conn.commit()
-                    flash('Order marked as completed. Thank you for confirming delivery!', 'success')
-                else:
-                    flash('Order cannot be updated.', 'error')
+            # Stock was already taken out of the inventory ledger when the order
+            # was placed, so completing an order only changes its status.
+            if payment_method == 'Cash on Delivery' and status == 'Pending Payment':
+                c.execute('UPDATE orders SET status = ? WHERE order_ID = ?', ('Paid', order_id))
+                stock_reservations.confirm(c, order_id)
+                publish_event(c, 'order_status_changed', {'order_id': order_id, 'previous_status': status, 'status': 'Paid'})
+                conn.commit()
+                flash('Order marked as paid. Thank you! Please confirm delivery once received.', 'success')
+            elif status == 'Paid':
+                c.execute('UPDATE orders SET status = ? WHERE order_ID = ?', ('Completed', order_id))
+                publish_event(c, 'order_status_changed', {'order_id': order_id, 'previous_status': status, 'status': 'Completed'})
+                conn.commit()
+                flash('Order marked as completed. Thank you for confirming delivery!', 'success')
             else:
-                if status == 'Paid':
-                    c.execute('UPDATE orders SET status = ? WHERE order_ID = ?', ('Completed', order_id))
-                    # Decrement inventory for each item in the order
-                    c.execute('SELECT product_name, quantity FROM order_items WHERE order_ID = ?', (order_id,))
-                    items = c.fetchall()
-                    
-                    for product_name, qty in items:
-                        c.execute('SELECT inventory_ID, current_stock FROM inventory WHERE name = ?', (product_name,))
-                        row = c.fetchone()
-                        if row:
-                            inventory_id, current_stock = row
-                            new_stock = max(0, current_stock - qty)
-                            
-                            # Log the inventory change
-                            c.execute('''INSERT INTO inventory_log 
-                                        (inventory_ID, action, quantity, previous_stock, new_stock, timestamp, order_ID, user_ID) 
-                                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)''',
-                                     (inventory_id, 'Order Completed', qty, current_stock, new_stock, order_id, session['user_id']))
-                            
-                            # Update inventory
-                            c.execute('UPDATE inventory SET current_stock = ? WHERE inventory_ID = ?', (new_stock, inventory_id))
-                    
-                    conn.commit()
-                    flash('Order marked as completed. Thank you for confirming delivery!', 'success')
-                else:
-                    flash('Order cannot be updated.', 'error')
+                flash('Order cannot be updated.', 'error')
     
+    except db_retry.DatabaseBusy as e:
+        flash('Database is temporarily busy. Please try again in a moment.', 'error')
+        print(f"Database busy in order_received: {e}")
     except sqlite3.OperationalError as e:
-        if "database is locked" in str(e):
-            flash('Database is temporarily busy. Please try again in a moment.', 'error')
-        else:
-            flash('An error occurred while processing your request.', 'error')
+        flash('An error occurred while processing your request.', 'error')
         print(f"Database error in order_received: {e}")
     except Exception as e:
         flash('An unexpected error occurred.', 'error')
         print(f"Unexpected error in order_received: {e}")
     
+    outbox_dispatcher.wake()
     return redirect(url_for('account'))
 
 @app.route('/submit_review', methods=['POST'])
@@ -1342,71 +2287,84 @@ def submit_review():
         return redirect(url_for('login'))
     user_id = session['user_id']
     product_name = request.form.get('product_name')
+    inventory_id = request.form.get('inventory_ID')
     rating = request.form.get('rating')
     comment = request.form.get('comment')
     order_id = request.form.get('order_id')
     anonymous = request.form.get('anonymous') == '1'
     # Validate input
-    if not (product_name and rating and comment and order_id):
+    if not ((inventory_id or product_name) and rating and comment and order_id):
         flash('All review fields are required.', 'error')
         return redirect(url_for('account'))
+    if not rating.isdigit() or not 1 <= int(rating) <= 5:
+        flash('Rating must be between 1 and 5.', 'error')
+        return redirect(url_for('account'))
     # Check if user purchased this product in a completed order
     with db_transaction() as conn:
         c = conn.cursor()
-        c.execute('''SELECT o.status FROM orders o
+        if not inventory_id:
+            # Review forms rendered before order items carried inventory_ID
+            c.execute('SELECT inventory_ID FROM order_items WHERE order_ID = ? AND product_name = ?', (order_id, product_name))
+            row = c.fetchone()
+            inventory_id = row[0] if row else None
+        c.execute('''SELECT oi.product_name FROM orders o
                      JOIN order_items oi ON o.order_ID = oi.order_ID
-                     WHERE o.order_ID = ? AND o.client_ID = ? AND oi.product_name = ? AND o.status IN ('Paid', 'Completed')''',
-                  (order_id, user_id, product_name))
-        if not c.fetchone():
+                     WHERE o.order_ID = ? AND o.client_ID = ? AND oi.inventory_ID = ? AND o.status IN ('Paid', 'Completed')''',
+                  (order_id, user_id, inventory_id))
+        row = c.fetchone()
+        if not row:
             flash('You can only review products you have purchased and received.', 'error')
             return redirect(url_for('account'))
+        product_name = row[0]
         # Check if already reviewed
-        c.execute('SELECT 1 FROM reviews WHERE user_id = ? AND product_name = ? AND comment IS NOT NULL', (user_id, product_name))
+        c.execute('SELECT 1 FROM reviews WHERE user_id = ? AND inventory_ID = ? AND comment IS NOT NULL', (user_id, inventory_id))
         if c.fetchone():
             flash('You have already reviewed this product.', 'info')
             return redirect(url_for('account'))
-        c.execute('INSERT INTO reviews (user_id, product_name, rating, comment, created_at, anonymous) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?)',
-                  (user_id, product_name, rating, comment, int(anonymous)))
-        conn.commit()
+        c.execute('SELECT full_name FROM clients WHERE client_ID = ?', (user_id,))
+        row = c.fetchone()
+        display_name = product_reviews.display_name(row[0] if row else None, user_id, anonymous)
+    # Journaled now, written in the background; a duplicate submitted meanwhile is dropped then
+    write_behind_queue.append('review', {'user_id': user_id, 'inventory_ID': int(inventory_id),
+                                         'product_name': product_name, 'rating': int(rating), 'comment': comment,
+                                         'anonymous': anonymous, 'display_name': display_name,
+                                         'created_at': utc_timestamp()})
     flash('Thank you for your review!', 'success')
     return redirect(url_for('account'))
 
 @app.route('/product/<product_code>')
 def product_detail(product_code):
     with db_transaction() as conn:
-        conn.row_factory = sqlite3.Row
         c = conn.cursor()
-        c.execute('SELECT * FROM inventory WHERE product_code = ?', (product_code,))
-        product = c.fetchone()
+        catalog_cache.load(c)
+        product = catalog_cache.by_code.get(product_code)
         if not product:
             abort(404)
-        # Fetch reviews for this product
-        c.execute('''SELECT r.rating, r.comment, r.created_at, r.anonymous, r.user_id, c.full_name
-                     FROM reviews r JOIN clients c ON r.user_id = c.client_ID
-                     WHERE r.product_name = ? ORDER BY r.created_at DESC''', (product['name'],))
-        reviews = []
-        for row in c.fetchall():
-            if row['anonymous']:
-                # Show first letter of first name and a short hash of user_id
-                first_letter = row['full_name'][0].upper() if row['full_name'] else 'A'
-                user_hash = hashlib.sha256(str(row['user_id']).encode()).hexdigest()[:6]
-                user_name = f"{first_letter}-{user_hash}"
-            else:
-                user_name = f"{row['full_name']} {row['full_name'][0]}."
-            reviews.append({
-                'rating': row['rating'],
-                'comment': row['comment'],
-                'created_at': row['created_at'],
-                'anonymous': row['anonymous'],
-                'user_name': user_name
-            })
-    return render_template(f'Product page/{product["category"]}/{product_code}.html', product=product, reviews=reviews)
+        # One page of reviews plus the precomputed rating summary
+        reviews, next_cursor = product_reviews.get_page(c, product['inventory_ID'], request.args.get('before', type=int))
+        rating_summary = product_reviews.get_summary(c, product['inventory_ID'])
+    return render_template('product.html', product=product, reviews=reviews,
+                           rating_summary=rating_summary, next_cursor=next_cursor)
+
+@app.route('/api/product/<product_code>/reviews')
+def api_product_reviews(product_code):
+    """Cursor-paginated reviews for a product: ?before=<review_id>"""
+    with db_transaction() as conn:
+        c = conn.cursor()
+        c.execute('SELECT inventory_ID FROM inventory WHERE product_code = ?', (product_code,))
+        row = c.fetchone()
+        if not row:
+            return jsonify({'error': 'Item not found'}), 404
+        reviews, next_cursor = product_reviews.get_page(c, row[0], request.args.get('before', type=int))
+        rating_summary = product_reviews.get_summary(c, row[0])
+    return jsonify({'reviews': reviews, 'next_cursor': next_cursor, 'summary': rating_summary})
 
 @app.route('/order_paid/<int:order_id>', methods=['POST'])
+@admission_controlled(write_admission)
 def order_paid(order_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    with db_transaction() as conn:
+    with db_transaction(write=True) as conn:
         c = conn.cursor()
         c.execute('SELECT status, client_ID, payment_method FROM orders WHERE order_ID = ?', (order_id,))
         row = c.fetchone()
@@ -1416,10 +2374,13 @@ def order_paid(order_id):
         status, client_id, payment_method = row
         if payment_method == 'Cash on Delivery' and status == 'Pending Payment':
             c.execute('UPDATE orders SET status = ? WHERE order_ID = ?', ('Paid', order_id))
+            stock_reservations.confirm(c, order_id)
+            publish_event(c, 'order_status_changed', {'order_id': order_id, 'previous_status': status, 'status': 'Paid'})
             conn.commit()
             flash('Order marked as paid. Thank you! Please confirm delivery once received.', 'success')
         else:
             flash('Order cannot be updated.', 'error')
+    outbox_dispatcher.wake()
     return redirect(url_for('account'))
 
 @app.route('/test_server')
@@ -1434,5 +2395,56 @@ def test_admin():
         return jsonify({'success': False, 'message': 'Access denied'}), 403
     return jsonify({'success': True, 'message': 'Admin access confirmed'})
 
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'worker': app_state['worker']})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: warm-up has finished and the database answers"""
+    if not app_state['ready']:
+        return jsonify({'ready': False, 'pid': os.getpid()}), 503
+    try:
+        with db_transaction() as conn:
+            conn.execute('SELECT 1').fetchone()
+    except Exception as e:
+        return jsonify({'ready': False, 'pid': os.getpid(), 'error': str(e)}), 503
+    return jsonify({'ready': True, 'pid': os.getpid(), 'worker': app_state['worker']})
+
+def warm_templates():
+    """Compile every template up front so no request pays for it"""
+    compiled = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except Exception as e:
+            print(f"Error compiling template {name}: {e}")
+    return compiled
+
+def warm_up():
+    """Load everything requests would otherwise load on first use"""
+    warm_templates()
+    load_asset_manifest()
+    load_gazetteer()
+    with db_transaction() as conn:
+        catalog_cache.load(conn.cursor())
+    # Under the launcher a worker is ready only once start_worker() has run in it
+    app_state['ready'] = not app.config['PREFORK']
+
+def start_worker(worker_id):
+    """Called by launcher.py in each forked worker"""
+    app_state['worker'] = worker_id
+    # Every worker journals its own feedback and reviews
+    start_write_behind(f'worker-{worker_id}')
+    if worker_id == 0:
+        # Sweepers and flushers run once, in the first worker
+        for target in app_state['deferred_tasks']:
+            socketio.start_background_task(target)
+    app_state['ready'] = True
+
+warm_up()
+
 if __name__ == '__main__':
     socketio.run(app, debug=True, host='0.0.0.0', port=5051)
\ No newline at end of file
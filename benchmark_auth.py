@@ -0,0 +1,102 @@
+"""
+Password hashing benchmark.
+
+    python benchmark_auth.py --logins 200 --concurrency 16
+
+Times password checks at the app's scrypt cost (PASSWORD_SCRYPT_N/R/P, or
+--n/--r/--p) and reports logins per second:
+
+  per core   one check at a time on this thread, the cost of a single login
+  inline     --concurrency threads checking on their own threads, as request
+             threads would without the pool (workers = 0)
+  pool       the same threads waiting on passwords.Hasher with --workers
+             processes, as the app runs
+
+For the threaded runs it also reports the longest stall seen by a thread
+that wakes every 10 ms, standing in for other requests and Socket.IO.
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+
+import passwords
+
+HEARTBEAT_INTERVAL = 0.01
+
+
+def run_logins(hasher, stored, logins, concurrency):
+    """(logins per second, longest heartbeat gap in ms) for logins spread over concurrency threads"""
+    gaps = []
+    done = threading.Event()
+
+    def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            time.sleep(HEARTBEAT_INTERVAL)
+            now = time.perf_counter()
+            gaps.append(now - last - HEARTBEAT_INTERVAL)
+            last = now
+
+    def login(count):
+        for _ in range(count):
+            valid, _ = hasher.check('correct horse', stored)
+            assert valid
+
+    counts = [logins // concurrency + (i < logins % concurrency) for i in range(concurrency)]
+    threads = [threading.Thread(target=login, args=(count,)) for count in counts]
+    beat = threading.Thread(target=heartbeat)
+    beat.start()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    beat.join()
+    return logins / elapsed, max(gaps, default=0) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--n', type=int, default=int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14))))
+    parser.add_argument('--r', type=int, default=int(os.environ.get('PASSWORD_SCRYPT_R', '8')))
+    parser.add_argument('--p', type=int, default=int(os.environ.get('PASSWORD_SCRYPT_P', '1')))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')))
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    params = passwords.Params(args.n, args.r, args.p)
+    stored = passwords.hash_password('correct horse', params)
+    print(f"scrypt n={params.n} r={params.r} p={params.p} ({params.memory() / 2 ** 20:.0f} MiB per check), "
+          f"{os.cpu_count()} CPUs, {args.logins} logins")
+
+    inline = passwords.Hasher(params, workers=0)
+    start = time.perf_counter()
+    for _ in range(min(args.logins, 20)):
+        inline.check('correct horse', stored)
+    per_check = (time.perf_counter() - start) / min(args.logins, 20)
+    print(f"{'per core':<32} {1 / per_check:>8.1f} logins/s   {per_check * 1000:.1f} ms per check")
+
+    rate, stall = run_logins(inline, stored, args.logins, args.concurrency)
+    print(f"{f'inline, {args.concurrency} threads':<32} {rate:>8.1f} logins/s   longest stall {stall:.0f} ms")
+
+    pooled = passwords.Hasher(params, workers=args.workers)
+    pooled.check('correct horse', stored)  # start the pool processes outside the timing
+    rate, stall = run_logins(pooled, stored, args.logins, args.concurrency)
+    pooled.shutdown()
+    label = f'pool of {args.workers}, {args.concurrency} threads'
+    print(f"{label:<32} {rate:>8.1f} logins/s   longest stall {stall:.0f} ms")
+
+    legacy = hashlib.sha256(b'correct horse').hexdigest()
+    start = time.perf_counter()
+    valid, upgraded = passwords.check('correct horse', legacy, params)
+    assert valid and upgraded
+    print(f"{'legacy SHA-256 login + rehash':<32} {(time.perf_counter() - start) * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Checkout and product-page benchmark.
+
+    python benchmark_checkout.py --rows 20000
+
+Starts the app in a scratch directory, so init_db() creates and seeds a fresh
+aureliana.db (the 24-SKU catalog), then adds --rows order items and as many
+reviews spread over the catalog. It times:
+
+  review query   one product's reviews keyed by product name (before) and
+                 by inventory_ID through idx_reviews_inventory (after)
+  product page   GET /product/<code> through the Flask test client
+  place_order    one-line GCash checkouts through the Flask test client
+
+The working copy's aureliana.db is never opened.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+OLD_REVIEWS_QUERY = '''
+    SELECT r.rating, r.comment, r.created_at, r.anonymous, r.user_id, c.full_name
+    FROM reviews r JOIN clients c ON r.user_id = c.client_ID
+    WHERE r.product_name = ? ORDER BY r.created_at DESC'''
+
+REVIEWS_QUERY = '''
+    SELECT r.rating, r.comment, r.created_at, r.anonymous, r.user_id, c.full_name
+    FROM reviews r JOIN clients c ON r.user_id = c.client_ID
+    WHERE r.inventory_ID = ? ORDER BY r.created_at DESC'''
+
+
+def fill(conn, rows, clients):
+    """Add clients, order items and reviews; returns the catalog as (inventory_ID, name, product_code) rows"""
+    random.seed(1)
+    catalog = conn.execute('SELECT inventory_ID, name, product_code FROM inventory').fetchall()
+    first_client = conn.execute('SELECT COALESCE(MAX(client_ID), 0) + 1 FROM clients').fetchone()[0]
+    conn.executemany('INSERT INTO clients (full_name, email, password) VALUES (?, ?, ?)',
+                     [(f'Client {i}', f'client{i}@example.com', 'x') for i in range(clients)])
+    first_order = conn.execute('SELECT COALESCE(MAX(order_ID), 0) + 1 FROM orders').fetchone()[0]
+    lines = [(first_order + i,) + random.choice(catalog)[:2] for i in range(rows)]
+    conn.executemany('INSERT INTO order_items (order_ID, inventory_ID, product_name, quantity, unit_price) '
+                     'VALUES (?, ?, ?, 1, 100)', lines)
+    conn.executemany("INSERT INTO reviews (user_id, inventory_ID, product_name, rating, comment, anonymous) "
+                     "VALUES (?, ?, ?, ?, 'Lovely piece', ?)",
+                     [(random.randrange(first_client, first_client + clients), inventory_id, name,
+                       random.randint(1, 5), random.randint(0, 1)) for _, inventory_id, name in lines])
+    # Checkouts below must never run out of stock
+    conn.execute('UPDATE inventory SET current_stock = 1000000')
+    conn.commit()
+    return catalog
+
+
+def timed(fn, repeat):
+    """Mean milliseconds per call over repeat calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help='order items and reviews to add')
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault('ASYNC_MODE', 'threading')
+    # Every checkout comes from one client; the checkout rate limits would turn most of them away
+    os.environ.setdefault('RATE_LIMIT_CHECKOUT_PER_IP', '')
+    os.environ.setdefault('RATE_LIMIT_CHECKOUT_PER_USER', '')
+    os.chdir(tempfile.mkdtemp(prefix='aureliana-bench-'))
+    import app as aureliana
+
+    conn = sqlite3.connect('aureliana.db')
+    catalog = fill(conn, args.rows, args.clients)
+    inventory_id, name, product_code = max(
+        catalog, key=lambda item: conn.execute('SELECT COUNT(*) FROM reviews WHERE inventory_ID = ?',
+                                               (item[0],)).fetchone()[0])
+    review_count = conn.execute('SELECT COUNT(*) FROM reviews WHERE inventory_ID = ?', (inventory_id,)).fetchone()[0]
+    print(f"{len(catalog)} SKUs, {args.rows} order items and reviews; {product_code} has {review_count} reviews; "
+          f"mean of {args.repeat}")
+
+    before = timed(lambda: conn.execute(OLD_REVIEWS_QUERY, (name,)).fetchall(), args.repeat)
+    after = timed(lambda: conn.execute(REVIEWS_QUERY, (inventory_id,)).fetchall(), args.repeat)
+    print(f"{'review query':<14} {before:>8.2f} ms -> {after:.2f} ms")
+
+    client = aureliana.app.test_client()
+    user_id = conn.execute("SELECT client_ID FROM clients WHERE email = 'client@aureliana.com'").fetchone()[0]
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['role'] = 'user'
+
+    def product_page():
+        assert client.get(f'/product/{product_code}').status_code == 200
+
+    checkouts = iter(range(args.repeat))
+
+    def place_order():
+        item_id, item_name, _ = catalog[next(checkouts) % len(catalog)]
+        response = client.post('/place_order', data={
+            'payment_method': 'GCash', 'gcash_phone': '09170000000', 'gcash_pin': '1234',
+            'itemsToCheckout': json.dumps([{'id': str(item_id), 'name': item_name, 'price': 1, 'quantity': 1}])})
+        assert '/receipt/' in (response.location or ''), response.location
+
+    print(f"{'product page':<14} {timed(product_page, args.repeat):>8.2f} ms")
+    print(f"{'place_order':<14} {timed(place_order, args.repeat):>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Serialization benchmark for the JSON API endpoints.
+
+    python benchmark_json.py --rows 10000
+
+Fills an in-memory copy of the inventory, orders, clients and inventory_log
+tables (schema read from aureliana.db) with synthetic rows, then times each
+endpoint's query plus serialization three ways:
+
+  before   hand-built dicts, stdlib json (the old code path)
+  Row      sqlite3.Row results through FastJSONProvider (orjson if installed)
+  SQLite   fast_json.query_json(), what the endpoints now use
+
+and prints the body size uncompressed, gzip and brotli compressed.
+/api/barangays serves gazetteer dicts, so it is timed with stdlib json
+against FastJSONProvider.
+"""
+import argparse
+import gzip
+import json
+import random
+import sqlite3
+import time
+
+from flask import Flask
+
+import fast_json
+
+QUERIES = {
+    '/api/inventory': 'SELECT inventory_ID, product_code, name, category, material, price, image, '
+                      'current_stock, low_stock_threshold FROM inventory',
+    '/api/orders': 'SELECT o.*, c.full_name as username FROM orders o LEFT JOIN clients c ON o.client_ID = c.client_ID',
+    '/api/clients': 'SELECT * FROM clients',
+    '/api/inventory_logs': '''
+        SELECT il.log_ID, il.inventory_ID, i.name, i.product_code, i.category, il.action, il.quantity,
+               il.previous_stock, il.new_stock, il.timestamp, il.order_ID, il.user_ID,
+               CASE WHEN NULLIF(c.full_name, '') IS NOT NULL AND NULLIF(c.email, '') IS NOT NULL
+                         AND NULLIF(c.phone, '') IS NOT NULL
+                    THEN c.full_name || ' ' || c.email || ' ' || c.phone
+                    ELSE COALESCE(NULLIF(c.full_name, ''), NULLIF(c.email, ''), NULLIF(c.phone, ''), 'System')
+               END AS user_name
+        FROM inventory_log il JOIN inventory i ON il.inventory_ID = i.inventory_ID
+        LEFT JOIN clients c ON il.user_ID = c.client_ID''',
+}
+
+# The old endpoints' per-row dict building, for the "before" column
+OLD_INVENTORY_LOGS_QUERY = '''
+    SELECT il.log_ID, il.inventory_ID, i.name, i.product_code, i.category, il.action, il.quantity,
+           il.previous_stock, il.new_stock, il.timestamp, il.order_ID, il.user_ID, c.full_name, c.email, c.phone
+    FROM inventory_log il JOIN inventory i ON il.inventory_ID = i.inventory_ID
+    LEFT JOIN clients c ON il.user_ID = c.client_ID'''
+
+
+def old_inventory(conn):
+    c = conn.cursor()
+    c.execute(QUERIES['/api/inventory'])
+    return [{'inventory_ID': row[0], 'product_code': row[1], 'name': row[2], 'category': row[3],
+             'material': row[4], 'price': row[5], 'image': row[6], 'current_stock': row[7],
+             'low_stock_threshold': row[8]} for row in c.fetchall()]
+
+
+def old_orders(conn):
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute(QUERIES['/api/orders'])
+    orders = []
+    for row in c.fetchall():
+        order = dict(row)
+        order['username'] = row['username']
+        orders.append(order)
+    conn.row_factory = None
+    return orders
+
+
+def old_clients(conn):
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute(QUERIES['/api/clients'])
+    clients = [dict(row) for row in c.fetchall()]
+    conn.row_factory = None
+    return clients
+
+
+def old_inventory_logs(conn):
+    c = conn.cursor()
+    c.execute(OLD_INVENTORY_LOGS_QUERY)
+    logs = []
+    for row in c.fetchall():
+        logs.append({
+            'log_ID': row[0], 'inventory_ID': row[1], 'name': row[2], 'product_code': row[3],
+            'category': row[4], 'action': row[5], 'quantity': row[6], 'previous_stock': row[7],
+            'new_stock': row[8], 'timestamp': row[9], 'order_ID': row[10], 'user_ID': row[11],
+            'user_name': f"{row[12]} {row[13]} {row[14]}" if row[12] and row[13] and row[14]
+            else row[12] if row[12] else row[13] if row[13] else row[14] if row[14] else 'System'})
+    return logs
+
+
+OLD = {'/api/inventory': old_inventory, '/api/orders': old_orders,
+       '/api/clients': old_clients, '/api/inventory_logs': old_inventory_logs}
+
+
+def synthetic_value(column_type, name, i, rows):
+    column_type = (column_type or '').upper()
+    if name.endswith('_ID') or name.endswith('_id'):
+        return random.randint(1, rows)
+    if 'INT' in column_type:
+        return random.randint(0, 100)
+    if 'REAL' in column_type:
+        return round(random.uniform(1000, 20000), 2)
+    if 'DATE' in column_type or 'TIME' in column_type:
+        return f'2025-06-{1 + i % 28:02d} 12:{i % 60:02d}:00'
+    return f'{name} value {i}'
+
+
+def build_database(rows):
+    source = sqlite3.connect('aureliana.db')
+    conn = sqlite3.connect(':memory:')
+    for table in ('inventory', 'orders', 'clients', 'inventory_log'):
+        sql = source.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+        conn.execute(sql)
+        columns = source.execute(f'PRAGMA table_info({table})').fetchall()
+        names = [column[1] for column in columns]
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            ([i + 1 if column[5] else synthetic_value(column[2], column[1], i, rows) for column in columns]
+             for i in range(rows)))
+    source.close()
+    return conn
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = build_database(args.rows)
+    provider = fast_json.FastJSONProvider(Flask(__name__))
+    barangays = [{'brgy_code': f'{i:09d}', 'brgy_name': f'Barangay {i}', 'city_code': '012801',
+                  'province_code': '0128', 'region_code': '01'} for i in range(args.rows)]
+
+    def stdlib_dumps(obj):
+        # Flask's default provider settings
+        return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode()
+
+    def row_dumps(query):
+        def run():
+            conn.row_factory = sqlite3.Row
+            body = provider.dumps(conn.execute(query).fetchall()).encode()
+            conn.row_factory = None
+            return body
+        return run
+
+    print(f"{args.rows} rows, best of {args.repeat}; orjson {'installed' if fast_json.orjson else 'NOT installed'}, "
+          f"brotli {'installed' if fast_json.brotli else 'NOT installed'}, "
+          f"SQLite JSON functions {'available' if fast_json.SQLITE_JSON else 'NOT available'}")
+    print(f"{'endpoint':<20} {'before ms':>10} {'Row ms':>10} {'SQLite ms':>10} "
+          f"{'raw KB':>8} {'gzip KB':>8} {'br KB':>8}")
+    cases = [(path, (lambda fn=OLD[path]: stdlib_dumps(fn(conn))), row_dumps(QUERIES[path]),
+              (lambda query=QUERIES[path]: fast_json.query_json(conn.cursor(), query))) for path in QUERIES]
+    cases.append(('/api/barangays', lambda: stdlib_dumps(barangays), lambda: provider.dumps(barangays).encode(), None))
+    for path, before, rows, sqlite_json in cases:
+        before_time, body = timed(before, args.repeat)
+        rows_time, _ = timed(rows, args.repeat)
+        sqlite_time = timed(sqlite_json, args.repeat)[0] if sqlite_json else float('nan')
+        gzip_size = len(gzip.compress(body, compresslevel=fast_json.GZIP_LEVEL))
+        br_size = len(fast_json.brotli.compress(body, quality=fast_json.BROTLI_QUALITY)) if fast_json.brotli else float('nan')
+        print(f"{path:<20} {before_time * 1000:>10.1f} {rows_time * 1000:>10.1f} {sqlite_time * 1000:>10.1f} "
+              f"{len(body) / 1024:>8.0f} {gzip_size / 1024:>8.0f} {br_size / 1024:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Rate limiter benchmark.
+
+    python benchmark_rate_limit.py --keys 100000 --processes 4
+
+Times rate_limit hits for each backend: one process cycling through --keys
+client keys, then --processes processes hitting the shared SQLite file at
+once (the prefork case). Reports microseconds per hit; the budget is 50.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import rate_limit
+
+RATE = rate_limit.Rate(1000000, 1)
+
+
+def timed_hits(limiter, keys):
+    start = time.perf_counter()
+    for key in keys:
+        limiter.hit(key, RATE)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def keys_for(count, prefix=''):
+    return [f'login:ip:{prefix}10.{i // 65536}.{i // 256 % 256}.{i % 256}' for i in range(count)]
+
+
+def sqlite_worker(path, count, worker):
+    return timed_hits(rate_limit.SQLiteLimiter(path, timeout=5), keys_for(count, f'{worker}-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keys', type=int, default=100000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    keys = keys_for(args.keys)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'rate_limits.db')
+        print(f"{args.keys} keys, {os.cpu_count()} CPUs")
+        print(f"{'memory':<28} {timed_hits(rate_limit.MemoryLimiter(), keys):>7.2f} us/hit")
+        print(f"{'sqlite, new keys':<28} {timed_hits(rate_limit.SQLiteLimiter(path), keys):>7.2f} us/hit")
+        print(f"{'sqlite, existing keys':<28} {timed_hits(rate_limit.SQLiteLimiter(path), keys):>7.2f} us/hit")
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.starmap(sqlite_worker, [(path, args.keys // args.processes, worker)
+                                                   for worker in range(args.processes)])
+        label = f'sqlite, {args.processes} processes'
+        print(f"{label:<28} {sum(results) / len(results):>7.2f} us/hit per process")
+
+
+if __name__ == '__main__':
+    main()
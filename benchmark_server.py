@@ -0,0 +1,104 @@
+"""
+Concurrency benchmark for a running server.
+
+    python benchmark_server.py --url http://127.0.0.1:5051 --concurrency 100,500,1000,2000
+
+For each concurrency level, that many clients request the given paths back to
+back for --duration seconds while a probe polls the Socket.IO handshake every
+100 ms. It prints throughput, latency percentiles, errors and the probe's
+worst latency, which shows whether long-lived Socket.IO traffic keeps being
+served under load. Uses only the standard library.
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(host, port, path, timeout):
+    """One HTTP/1.1 GET on a fresh connection; returns the status code"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(host, port, paths, deadline, timeout, latencies, errors):
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.monotonic()
+        try:
+            status = await fetch(host, port, path, timeout)
+            if status >= 500:
+                errors.append(status)
+            else:
+                latencies.append(time.monotonic() - start)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+            errors.append(type(e).__name__)
+            await asyncio.sleep(0.05)
+
+
+async def probe(host, port, deadline, timeout, latencies):
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            await fetch(host, port, '/socket.io/?EIO=4&transport=polling', timeout)
+            latencies.append(time.monotonic() - start)
+        except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+            latencies.append(timeout)
+        await asyncio.sleep(0.1)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_level(host, port, paths, concurrency, duration, timeout):
+    latencies, errors, probe_latencies = [], [], []
+    deadline = time.monotonic() + duration
+    tasks = [client(host, port, paths, deadline, timeout, latencies, errors) for _ in range(concurrency)]
+    tasks.append(probe(host, port, deadline, timeout, probe_latencies))
+    await asyncio.gather(*tasks)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': len(errors),
+        'probe_max_ms': max(probe_latencies or [float('nan')]) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5051')
+    parser.add_argument('--paths', default='/api/inventory,/test_server',
+                        help='comma-separated paths requested in rotation')
+    parser.add_argument('--concurrency', default='50,200,500,1000,2000')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    paths = args.paths.split(',')
+    print(f"{'clients':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'probe max ms':>13}")
+    for concurrency in (int(level) for level in args.concurrency.split(',')):
+        result = asyncio.run(run_level(url.hostname, url.port or 80, paths, concurrency,
+                                       args.duration, args.timeout))
+        print(f"{result['concurrency']:>8} {result['requests']:>9} {result['rps']:>8.0f} {result['p50_ms']:>8.1f} "
+              f"{result['p99_ms']:>8.1f} {result['errors']:>7} {result['probe_max_ms']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+In-memory catalog cache.
+
+The inventory table is small and read on every collection page, so it is kept
+in memory and reloaded only when it changes. Triggers on inventory bump the
+single-row catalog_version table on every insert, update or delete, which
+makes the version check one primary-key read and works across processes.
+"""
+import hashlib
+import threading
+
+# Collections served by /collections/<slug>: slug -> (category, title, tagline, icon)
+COLLECTIONS = {
+    'necklaces': ('Necklace', 'Necklace Collection',
+                  'Adorn your neckline with our stunning collection of necklaces.', 'fa-gem'),
+    'rings': ('Ring', 'Ring Collection',
+              'Explore our exquisite collection of handcrafted rings.', 'fa-circle'),
+    'bracelets': ('Bracelet', 'Bracelet Collection',
+                  'Elegant bracelets to complement any look.', 'fa-link'),
+    'earrings': ('Earring', 'Earring Collection',
+                 'Discover our radiant collection of finely crafted earrings.', 'fa-heart'),
+}
+
+# Sort options for collection pages: key -> (label, sort key, reverse)
+SORTS = {
+    'featured': ('Featured', lambda p: p['inventory_ID'], False),
+    'price_asc': ('Price: Low to High', lambda p: (p['price'] or 0, p['inventory_ID']), False),
+    'price_desc': ('Price: High to Low', lambda p: (p['price'] or 0, p['inventory_ID']), True),
+    'name': ('Name', lambda p: (p['name'] or '').lower(), False),
+}
+
+# Product page copy, keyed by product code; backfills inventory.description
+PRODUCT_DESCRIPTIONS = {
+    'RG001': ('The Opulent Eternity ring is a timeless symbol of everlasting love, featuring a '
+              'continuous band of sparkling stones set in lustrous gold.'),
+    'RG002': ('Butterfly Bliss is a whimsical ring featuring a delicate butterfly motif, perfect for '
+              'those who cherish transformation and beauty.'),
+    'RG003': ('Celestial Embrace is inspired by the night sky, featuring a constellation of sparkling '
+              'stones set in a graceful gold band.'),
+    'RRG001': ('Butterfly Blossoms is a charming ring adorned with petite butterflies and floral '
+               'accents, perfect for adding a touch of whimsy to any look.'),
+    'RRG002': ('Enchanted Vines is a nature-inspired ring with twisting gold vines and sparkling '
+               'accents, perfect for those who love organic elegance.'),
+    'RRG003': ('Infinity Elegance features a graceful infinity motif, symbolizing endless love and '
+               'sophistication in a sleek gold band.'),
+    'BG001': ('A luminous embrace of gold, the Auric Veil bracelet is designed for those who appreciate '
+              'subtle luxury. Its delicate form and radiant finish make it a versatile piece for any '
+              'occasion.'),
+    'BG002': ('The Aurum Embrace bracelet is a radiant symbol of unity and strength. Its bold gold '
+              'links and secure clasp make it a statement piece for any jewelry lover.'),
+    'BG003': ('Golden Harmony is a tribute to balance and beauty. Its interlocking gold bands create a '
+              'harmonious design that complements any style, from casual to formal.'),
+    'BRG001': ('Understated brilliance meets modern elegance in Blush Radiance. This rose gold bracelet '
+               'features a seamless row of radiant gemstones, offering a refined sparkle that elevates '
+               'both everyday and formal ensembles with a whisper of luxury.'),
+    'BRG002': ('Sleek, daring, and irresistibly refined, Rosé Serpent coils with grace and strength. '
+               'This rose gold bracelet mimics the smooth movement of a serpent, symbolizing power and '
+               'transformation, making it a bold statement of luxury and confidence.'),
+    'BRG003': ('A delicate intertwining of rose gold vines, Vinea Rosa is a celebration of nature\'s '
+               'elegance. This bracelet\'s organic curves and subtle shimmer make it a timeless piece '
+               'for any occasion.'),
+    'NG001': ('A dainty gold necklace featuring a charming ribbon pendant, perfect for adding a touch '
+              'of playful elegance to any outfit.'),
+    'NG002': ('This necklace features a delicate butterfly pendant in gold, symbolizing transformation '
+              'and beauty, ideal for everyday elegance.'),
+    'NG003': ('A romantic gold necklace with a vintage-inspired heart pendant, blending timeless charm '
+              'and modern luxury.'),
+    'NRG001': ('The Aurora Heart Necklace features a radiant heart-shaped pendant, capturing the beauty '
+               'of dawn in shimmering gold.'),
+    'NRG002': ('The Drop Pendant Necklace features a sleek, minimalist gold drop pendant, perfect for '
+               'layering or wearing solo for understated elegance.'),
+    'NRG003': ('The Lucky Pendant Necklace is a charming gold piece featuring a classic lucky charm '
+               'motif, perfect for everyday wear and gifting.'),
+    'EG001': ('Inspired by the grandeur of French châteaux, these gold earrings shimmer with light and '
+              'sophistication for a regal touch.'),
+    'EG002': ('The Champagne Halo Earring features a sparkling gold halo design, reminiscent of '
+              'celebratory bubbles and refined luxury.'),
+    'EG003': ('The Chrysalis Monarch Earring is a gold piece inspired by butterfly wings, symbolizing '
+              'transformation and grace in every detail.'),
+    'ERG001': ('Radiant gold earrings inspired by the summer solstice, featuring a lustrous finish and '
+               'timeless silhouette for everyday elegance.'),
+    'ERG002': ('Elegant gold earrings with a clear, sparkling centerpiece, designed to catch the light '
+               'and add sophistication to any look.'),
+    'ERG003': ('The Luxeria Dawn Earring features a radiant gold design with a soft, dawn-inspired '
+               'shimmer, perfect for brightening any ensemble.'),
+}
+
+# Fields served by /api/inventory and /api/inventory/<id>
+API_FIELDS = ('inventory_ID', 'product_code', 'name', 'category', 'material', 'price', 'image',
+              'current_stock', 'low_stock_threshold')
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS catalog_version (
+           id INTEGER PRIMARY KEY CHECK (id = 1),
+           version INTEGER NOT NULL DEFAULT 0
+       )''',
+    'INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)',
+    '''CREATE TRIGGER IF NOT EXISTS catalog_version_ai AFTER INSERT ON inventory BEGIN
+           UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS catalog_version_au AFTER UPDATE ON inventory BEGIN
+           UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS catalog_version_ad AFTER DELETE ON inventory BEGIN
+           UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+       END''',
+]
+
+
+def ensure_schema(c):
+    for statement in SCHEMA:
+        c.execute(statement)
+
+
+def backfill_descriptions(c):
+    """Fill in missing product descriptions from PRODUCT_DESCRIPTIONS"""
+    c.executemany("UPDATE inventory SET description = ? WHERE product_code = ? AND COALESCE(description, '') = ''",
+                  [(description, code) for code, description in PRODUCT_DESCRIPTIONS.items()])
+
+
+def get_version(c):
+    c.execute('SELECT version FROM catalog_version WHERE id = 1')
+    row = c.fetchone()
+    return row[0] if row else 0
+
+
+class CatalogCache:
+    """Inventory rows as dicts, reloaded when catalog_version moves"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.products = []
+        self.by_id = {}
+        self.by_code = {}
+
+    def load(self, c):
+        """Return the current product list, reloading it if the catalog changed"""
+        version = get_version(c)
+        if version == self.version:
+            return self.products
+        with self._lock:
+            if version != self.version:
+                c.execute('SELECT * FROM inventory ORDER BY inventory_ID')
+                columns = [column[0] for column in c.description]
+                products = [dict(zip(columns, row)) for row in c.fetchall()]
+                self.by_id = {p['inventory_ID']: p for p in products}
+                self.by_code = {p['product_code']: p for p in products}
+                self.products = products
+                self.version = version
+        return self.products
+
+    def load_versioned(self, c):
+        """(version, products) as one consistent pair"""
+        self.load(c)
+        with self._lock:
+            return self.version, self.products
+
+
+class InventorySnapshot:
+    """
+    /api/inventory payloads serialized once per catalog version: the list
+    body, compressed variants of it made on first request, and one body per
+    item with a content ETag.
+    """
+
+    def __init__(self, cache, dumps):
+        self.cache = cache
+        self.dumps = dumps
+        self._lock = threading.Lock()
+        self.current = (None, b'', {})  # (version, list body, {inventory_ID: (etag, body)})
+        self._encoded = {}  # (version, encoding) -> compressed list body
+
+    def load(self, c):
+        """Current (version, list body, items), rebuilt if the catalog changed"""
+        version, products = self.cache.load_versioned(c)
+        if version == self.current[0]:
+            return self.current
+        with self._lock:
+            if version != self.current[0]:
+                rows = [{field: p[field] for field in API_FIELDS} for p in products]
+                items = {}
+                for row in rows:
+                    body = self.dumps(row)
+                    items[row['inventory_ID']] = (hashlib.blake2b(body, digest_size=8).hexdigest(), body)
+                self.current = (version, self.dumps(rows), items)
+                self._encoded = {}
+            return self.current
+
+    def encoded(self, version, body, encoding, encode):
+        """The list body for `version` compressed with `encoding`, compressed once"""
+        key = (version, encoding)
+        if key not in self._encoded:
+            self._encoded[key] = encode(body, encoding)
+        return self._encoded[key]
+
+
+def query_collection(products, category=None, material=None, min_price=None, max_price=None,
+                     in_stock=False, sort='featured', page=1, per_page=24):
+    """
+    Filter, sort and paginate catalog products.
+    Returns (page of products, total matching, number of pages).
+    """
+    selected = [p for p in products
+                if (category is None or p['category'] == category)
+                and (not material or p['material'] == material)
+                and (min_price is None or (p['price'] or 0) >= min_price)
+                and (max_price is None or (p['price'] or 0) <= max_price)
+                and (not in_stock or (p['current_stock'] or 0) > 0)]
+    label, key, reverse = SORTS.get(sort, SORTS['featured'])
+    selected.sort(key=key, reverse=reverse)
+
+    total = len(selected)
+    pages = max(1, -(-total // per_page))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * per_page
+    return selected[start:start + per_page], total, pages
+
+
+def materials(products, category=None):
+    """Materials available in a category, in catalog order"""
+    seen = []
+    for p in products:
+        if (category is None or p['category'] == category) and p['material'] and p['material'] not in seen:
+            seen.append(p['material'])
+    return seen
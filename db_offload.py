@@ -0,0 +1,116 @@
+"""
+SQLite offload for green-thread servers.
+
+Under gevent or eventlet every request runs in a greenlet on one OS thread, and
+sqlite3 calls block that thread, stalling every other request and Socket.IO
+connection until they return. wrap() returns a connection whose blocking
+calls (execute, fetch, commit, ...) run on a bounded pool of native threads
+while the calling greenlet yields to the hub. In threading mode connections
+are returned unwrapped.
+"""
+import os
+import sqlite3
+
+# Methods that can block on the database file or the busy timeout
+_BLOCKING_CONNECTION_METHODS = ('commit', 'rollback', 'close', 'executescript')
+_BLOCKING_CURSOR_METHODS = ('execute', 'executemany', 'executescript', 'fetchone', 'fetchmany', 'fetchall', 'close')
+
+_runner = None
+
+
+def configure(async_mode, pool_size):
+    """
+    Set up the native thread pool for the server's async mode. Must run before
+    the first database call. Returns the pool size, or None when not offloading.
+    """
+    global _runner
+    if async_mode == 'eventlet':
+        # tpool reads its size when first used
+        os.environ['EVENTLET_THREADPOOL_SIZE'] = str(pool_size)
+        from eventlet import tpool
+        _runner = lambda fn, args: tpool.execute(fn, *args)
+    elif async_mode == 'gevent':
+        from gevent.threadpool import ThreadPool
+        _runner = ThreadPool(pool_size).apply
+
+        def rebuild():
+            # The pool's threads do not survive fork(), so a prefork worker would wait on them forever
+            global _runner
+            _runner = ThreadPool(pool_size).apply
+        os.register_at_fork(after_in_child=rebuild)
+    else:
+        _runner = None
+        return None
+    return pool_size
+
+
+def _call(fn, args, kwargs):
+    # Exceptions are handed back rather than raised in the pool thread, where
+    # gevent would log every expected one (e.g. migration ALTER TABLEs)
+    try:
+        return True, fn(*args, **kwargs)
+    except Exception as e:
+        return False, e
+
+
+def run(fn, *args, **kwargs):
+    """Call fn in the native pool when offloading, otherwise inline"""
+    if _runner is None:
+        return fn(*args, **kwargs)
+    ok, result = _runner(_call, (fn, args, kwargs))
+    if not ok:
+        raise result
+    return result
+
+
+class _Proxy:
+    _blocking = ()
+
+    def __init__(self, target):
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in self._blocking:
+            def offloaded(*args, **kwargs):
+                return self._wrap(run(attr, *args, **kwargs))
+            return offloaded
+        return attr
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def _wrap(self, result):
+        return result
+
+
+class OffloadedCursor(_Proxy):
+    _blocking = _BLOCKING_CURSOR_METHODS
+
+    def _wrap(self, result):
+        # execute() returns the cursor itself; keep callers on the proxy
+        return self if result is self._target else result
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class OffloadedConnection(_Proxy):
+    _blocking = _BLOCKING_CONNECTION_METHODS + ('execute', 'executemany')
+
+    def cursor(self, *args):
+        return OffloadedCursor(self._target.cursor(*args))
+
+    def _wrap(self, result):
+        return OffloadedCursor(result) if isinstance(result, sqlite3.Cursor) else result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return run(self._target.__exit__, exc_type, exc, tb)
+
+
+def wrap(conn):
+    """Connection proxy that offloads blocking calls, or conn itself when not offloading"""
+    return conn if _runner is None else OffloadedConnection(conn)
@@ -0,0 +1,93 @@
+"""
+Retry with backoff for SQLite lock contention.
+
+Connections use a short busy timeout, so a locked database fails fast instead
+of pinning a worker for up to a minute. Write transactions start with
+BEGIN IMMEDIATE, which takes the write lock before the body runs. That
+avoids deadlocks where two readers both try to upgrade to writers, and it
+means SQLITE_BUSY almost always surfaces at BEGIN, before any statement has
+run. Retrying the BEGIN is therefore safe for every transaction. It retries
+with jittered exponential backoff until the attempts run out or the caller's
+deadline passes, then raises DatabaseBusy.
+"""
+import random
+import sqlite3
+import threading
+import time
+
+# Primary result codes (the low byte of extended codes)
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+class DatabaseBusy(sqlite3.OperationalError):
+    """The database stayed locked past the retry budget"""
+
+
+def is_busy(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED errors"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter") with an attempt cap"""
+
+    def __init__(self, max_attempts=8, base_delay=0.01, max_delay=0.5):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class RetryCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'transactions': 0, 'retried_transactions': 0, 'retries': 0, 'give_ups': 0}
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self._counts[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def run(fn, policy, counters, deadline=None, sleep=time.sleep):
+    """
+    Call fn() until it stops failing with SQLITE_BUSY. fn must have no effect
+    when it fails that way (e.g. BEGIN IMMEDIATE or a rolled-back transaction).
+    deadline is a time.monotonic() value after which no retry is attempted.
+    """
+    attempt = 0
+    while True:
+        try:
+            result = fn()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            delay = policy.delay(attempt)
+            attempt += 1
+            out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+            if attempt >= policy.max_attempts or out_of_time:
+                counters.add(transactions=1, retries=attempt - 1, give_ups=1,
+                             retried_transactions=int(attempt > 1))
+                raise DatabaseBusy(f"database is locked (gave up after {attempt} attempts)") from e
+            sleep(delay)
+            continue
+        counters.add(transactions=1, retries=attempt, retried_transactions=int(attempt > 0))
+        return result
+
+
+def begin_immediate(conn, policy, counters, deadline=None, sleep=time.sleep):
+    """Start a write transaction, retrying while another writer holds the lock"""
+    return run(lambda: conn.execute('BEGIN IMMEDIATE'), policy, counters, deadline, sleep)
@@ -0,0 +1,130 @@
+"""
+JSON responses for the API.
+
+FastJSONProvider replaces Flask's JSON provider, so every jsonify() call
+uses orjson when it is installed. Without orjson it falls back to the
+standard library. Either way, sqlite3.Row objects serialize as objects
+keyed by column name.
+
+query_json() goes further for endpoints that list table rows: SQLite
+renders each row with json_object(), so no Python object is built per
+column. Where SQLite lacks the JSON functions it falls back to one dict per
+row, serialized with orjson or the standard library.
+
+compress() picks brotli or gzip for a response body from the client's
+Accept-Encoding. The app applies it to JSON bodies above a size threshold.
+"""
+import gzip
+import json
+import sqlite3
+
+from flask.json.provider import DefaultJSONProvider
+
+import http_encoding
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Dynamic responses are compressed on every request, so favour speed over ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, sqlite3.Row):
+            return dict(zip(o.keys(), o))
+        return DefaultJSONProvider.default(o)
+
+    def _options(self, indent=False):
+        # Dates go through default() so they render as HTTP dates, as with the stdlib provider
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options(bool(kwargs.get('indent')))).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def _has_sqlite_json():
+    try:
+        sqlite3.connect(':memory:').execute("SELECT json_object('a', 1)").fetchone()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+SQLITE_JSON = _has_sqlite_json()
+
+
+def _literal(name):
+    return "'" + name.replace("'", "''") + "'"
+
+
+def _identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def query_json(c, query, params=()):
+    """A SELECT's rows as a JSON array of objects (bytes), keys sorted like jsonify()"""
+    c.execute(f'SELECT * FROM ({query}) LIMIT 0', params)
+    columns = sorted(column[0] for column in c.description)
+    if SQLITE_JSON:
+        pairs = ', '.join(f'{_literal(name)}, {_identifier(name)}' for name in columns)
+        c.execute(f'SELECT json_object({pairs}) FROM ({query})', params)
+        return ('[' + ','.join(row[0] for row in c.fetchall()) + ']').encode()
+    c.execute(f"SELECT {', '.join(_identifier(name) for name in columns)} FROM ({query})", params)
+    rows = [dict(zip(columns, row)) for row in c.fetchall()]
+    if orjson is not None:
+        return orjson.dumps(rows)
+    return json.dumps(rows, separators=(',', ':')).encode()
+
+
+def preferred_encoding(accept_encoding):
+    """'br', 'gzip' or None, from an Accept-Encoding header"""
+    encodings = http_encoding.accepted_encodings(accept_encoding)
+    if brotli is not None and http_encoding.accepts(encodings, 'br'):
+        return 'br'
+    if http_encoding.accepts(encodings, 'gzip'):
+        return 'gzip'
+    return None
+
+
+def encode(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def compress(body, accept_encoding):
+    """(compressed body, content coding), or (body, None) if the client accepts neither"""
+    encoding = preferred_encoding(accept_encoding)
+    return encode(body, encoding), encoding
@@ -0,0 +1,142 @@
+"""
+Flash-sale stock counters.
+
+Stock for designated product codes is held in memory so place_order can admit
+or reject an order without touching the inventory row. Admitted decrements are
+written to the flash_sale_pending table in the order's own transaction and are
+later flushed to the inventory ledger in batches, so nothing is lost if the
+process dies before a flush: recover() replays the table and reloads counters
+from the database.
+"""
+import threading
+
+import inventory_ledger
+
+# Max pending decrements applied per flush transaction
+FLUSH_BATCH_SIZE = 500
+
+
+class FlashSaleCounters:
+    """Atomic per-SKU available-stock counters for flash-sale items"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._available = {}      # product_code -> units that can still be sold
+        self._inventory_ids = {}  # product_code -> inventory_ID
+        self._codes_by_id = {}    # inventory_ID -> product_code
+
+    def load(self, c, product_codes):
+        """(Re)load counters for the given codes from the database state"""
+        product_codes = list(product_codes)
+        if not product_codes:
+            return {}
+        c.execute('''SELECT i.inventory_ID, i.product_code,
+                            COALESCE(i.current_stock, 0) - COALESCE(
+                                (SELECT SUM(p.quantity) FROM flash_sale_pending p
+                                 WHERE p.inventory_ID = i.inventory_ID), 0)
+                     FROM inventory i WHERE i.product_code IN (%s)''' % ','.join('?' * len(product_codes)),
+                  product_codes)
+        loaded = {}
+        with self._lock:
+            for inventory_id, code, available in c.fetchall():
+                self._available[code] = max(0, available)
+                self._inventory_ids[code] = inventory_id
+                self._codes_by_id[inventory_id] = code
+                loaded[code] = self._available[code]
+        return loaded
+
+    def refresh(self, c, inventory_id):
+        """Reload a counter after a stock write made outside the flash-sale path"""
+        code = self.hot_code(inventory_id)
+        if code:
+            self.load(c, [code])
+
+    def disable(self, product_codes):
+        with self._lock:
+            for code in product_codes:
+                self._available.pop(code, None)
+                self._inventory_ids.pop(code, None)
+            self._codes_by_id = {inventory_id: code for inventory_id, code in self._codes_by_id.items()
+                                 if code in self._available}
+
+    def hot_code(self, inventory_id):
+        """product_code for an inventory item if it is in flash-sale mode"""
+        try:
+            return self._codes_by_id.get(int(inventory_id))
+        except (TypeError, ValueError):
+            return None
+
+    def inventory_id(self, product_code):
+        return self._inventory_ids.get(product_code)
+
+    def try_reserve(self, lines):
+        """
+        Atomically take stock for every (product_code, quantity) line, or none.
+        Returns (True, None, None) on success, or (False, code, available) for
+        the first line that cannot be satisfied.
+        """
+        with self._lock:
+            wanted = {}
+            for code, quantity in lines:
+                wanted[code] = wanted.get(code, 0) + quantity
+            for code, quantity in wanted.items():
+                available = self._available.get(code, 0)
+                if quantity > available:
+                    return False, code, available
+            for code, quantity in wanted.items():
+                self._available[code] -= quantity
+        return True, None, None
+
+    def release(self, lines):
+        """Give back stock taken by try_reserve (e.g. when the order write fails)"""
+        with self._lock:
+            for code, quantity in lines:
+                if code in self._available:
+                    self._available[code] += quantity
+
+    def status(self):
+        with self._lock:
+            return dict(self._available)
+
+    def __bool__(self):
+        return bool(self._available)
+
+
+def queue_decrement(c, inventory_id, quantity, order_id=None, user_id=None):
+    """Record an admitted flash-sale decrement in the order's transaction"""
+    c.execute('''INSERT INTO flash_sale_pending (inventory_ID, quantity, order_ID, user_ID)
+                 VALUES (?, ?, ?, ?)''', (inventory_id, quantity, order_id, user_id))
+
+
+def flush_pending(c, batch_size=FLUSH_BATCH_SIZE):
+    """
+    Apply up to batch_size pending decrements through the inventory ledger and
+    remove them from the pending table. Returns {inventory_ID: (previous, new)}
+    covering the whole batch.
+    """
+    c.execute('''SELECT pending_ID, inventory_ID, quantity, order_ID, user_ID
+                 FROM flash_sale_pending ORDER BY pending_ID LIMIT ?''', (batch_size,))
+    rows = c.fetchall()
+    if not rows:
+        return {}
+
+    changes = {}
+    for pending_id, inventory_id, quantity, order_id, user_id in rows:
+        result = inventory_ledger.record_change(c, inventory_id, -quantity, 'Order Placed', order_id, user_id)
+        if result:
+            previous_stock = changes.get(inventory_id, result)[0]
+            changes[inventory_id] = (previous_stock, result[1])
+
+    c.execute('DELETE FROM flash_sale_pending WHERE pending_ID <= ?', (rows[-1][0],))
+    return changes
+
+
+def recover(c):
+    """Apply every decrement left pending by a previous process"""
+    changes = {}
+    while True:
+        batch = flush_pending(c)
+        if not batch:
+            return changes
+        for inventory_id, (previous_stock, new_stock) in batch.items():
+            changes[inventory_id] = (changes.get(inventory_id, (previous_stock,))[0], new_stock)
@@ -0,0 +1,30 @@
+"""
+Accept-Encoding parsing, shared by the precompressed static assets
+(static_assets.py) and the compressed JSON responses (fast_json.py).
+"""
+
+
+def accepted_encodings(header):
+    """(accepted, refused) sets of content codings from an Accept-Encoding header; q=0 refuses"""
+    accepted, refused = set(), set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    refused.add(coding)
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted, refused
+
+
+def accepts(encodings, coding):
+    """True if the client takes coding: named, or covered by '*' without being refused"""
+    accepted, refused = encodings
+    return coding in accepted or ('*' in accepted and coding not in refused)
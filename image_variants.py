@@ -0,0 +1,163 @@
+"""
+Resized derivatives of the static product images.
+
+Product photos are ~350 KB PNGs that collection grids and cart thumbnails
+show at a few hundred pixels wide. Each source image gets derivatives at
+WIDTHS (never wider than the original) in WebP and PNG. A derivative's name
+carries a digest of the source file, e.g.
+
+    Bracelet/BPRG004-320w.3f9c2a1b7d04.webp
+
+so it can be cached forever and a new upload gets new URLs. Derivatives are
+written to a cache directory, lazily on the first request or up front with
+
+    python image_variants.py [--workers N]
+
+which renders every missing derivative in a process pool. Without Pillow
+the helpers fall back to the original images.
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+WIDTHS = (160, 320, 640, 1024)
+FORMATS = ('webp', 'png')
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DIGEST_LENGTH = 12
+WEBP_QUALITY = 80
+
+VARIANT_NAME = re.compile(r'^(?P<stem>.+)-(?P<width>\d+)w\.(?P<digest>[0-9a-f]{%d})\.(?P<format>%s)$'
+                          % (DIGEST_LENGTH, '|'.join(FORMATS)))
+
+
+def render(source_path, target_path, width, image_format):
+    """Write one derivative; runs in a worker process or thread"""
+    with Image.open(source_path) as image:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Write under a temporary name so concurrent renders never expose a partial file
+        temp_path = f'{target_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        if image_format == 'webp':
+            image.save(temp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+        else:
+            image.save(temp_path, 'PNG', optimize=True)
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+class ImageVariants:
+    def __init__(self, static_dir, cache_dir, widths=WIDTHS, formats=FORMATS):
+        self.static_dir = static_dir
+        self.cache_dir = cache_dir
+        self.widths = tuple(sorted(widths))
+        self.formats = formats
+        self._sources = {}  # filename -> (mtime, size, digest, width)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def _source(self, filename):
+        """(digest, width) of a static image, re-read only when the file changes"""
+        if not filename or os.path.splitext(filename)[1].lower() not in SOURCE_EXTENSIONS:
+            return None
+        path = os.path.join(self.static_dir, filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cached = self._sources.get(filename)
+        if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2:]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:DIGEST_LENGTH]
+        with Image.open(path) as image:
+            width = image.width
+        with self._lock:
+            self._sources[filename] = (stat.st_mtime, stat.st_size, digest, width)
+        return digest, width
+
+    def variants(self, filename, image_format):
+        """[(variant name, width)] for a static image, smallest first; empty if unavailable"""
+        if not self.enabled:
+            return []
+        source = self._source(filename)
+        if not source:
+            return []
+        digest, source_width = source
+        stem = os.path.splitext(filename)[0]
+        widths = [width for width in self.widths if width < source_width] + [min(source_width, self.widths[-1])]
+        return [(f'{stem}-{width}w.{digest}.{image_format}', width) for width in sorted(set(widths))]
+
+    def resolve(self, name):
+        """Render-job arguments for a variant name, or None if it does not match a current source"""
+        match = VARIANT_NAME.match(name)
+        if not match or '..' in name.split('/') or name.startswith('/'):
+            return None
+        width = int(match.group('width'))
+        for extension in SOURCE_EXTENSIONS:
+            filename = match.group('stem') + extension
+            if (name, width) in self.variants(filename, match.group('format')):
+                return (os.path.join(self.static_dir, filename), os.path.join(self.cache_dir, name),
+                        width, match.group('format'))
+        return None
+
+    def build(self, name):
+        """Path of a variant, rendering it on first use; None if the name is not a valid variant"""
+        if not self.enabled:
+            return None
+        job = self.resolve(name)
+        if not job:
+            return None
+        if not os.path.exists(job[1]):
+            render(*job)
+        return job[1]
+
+    def missing_jobs(self):
+        jobs = []
+        for directory, _, files in os.walk(self.static_dir):
+            for file in sorted(files):
+                filename = os.path.relpath(os.path.join(directory, file), self.static_dir).replace(os.sep, '/')
+                for image_format in self.formats:
+                    for name, _ in self.variants(filename, image_format):
+                        job = self.resolve(name)
+                        if job and not os.path.exists(job[1]):
+                            jobs.append(job)
+        return jobs
+
+    def build_all(self, workers=None):
+        """Render every missing variant in a process pool; returns the number rendered"""
+        jobs = self.missing_jobs()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(render, *zip(*jobs)) if jobs else ():
+                pass
+        return len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render missing image derivatives')
+    parser.add_argument('--static-dir', default='static')
+    parser.add_argument('--cache-dir', default=os.environ.get('IMAGE_CACHE_DIR', '.image_cache'))
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    if Image is None:
+        raise SystemExit('Pillow is required: pip install Pillow')
+    variants = ImageVariants(args.static_dir, args.cache_dir)
+    print(f"Rendered {variants.build_all(args.workers)} image derivatives into {args.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
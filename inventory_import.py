@@ -0,0 +1,289 @@
+"""
+Bulk inventory import.
+
+    python inventory_import.py items.csv --dry-run
+    python inventory_import.py items.json
+
+Rows are keyed by product_code. A row for a code that is not in the
+inventory creates the item (name, category and price are required); a row
+for an existing code updates only the columns it gives. Stock is set with
+current_stock (an absolute count) or moved with stock_delta, not both.
+Empty CSV cells and missing JSON keys leave a column unchanged.
+
+The whole file is validated before anything is written: parse() and
+validate() collect every error, plan() diffs the rows against the database
+and apply() writes the plan in the caller's transaction, with executemany
+for inserts, updates and the ledger rows of the stock changes
+(inventory_ledger.record_changes). A dry run stops after plan() and
+reports the diff.
+
+CSV files have a header row. JSON is a list of objects, or {"items": [...]}.
+"""
+import argparse
+import csv
+import io
+import json
+import sqlite3
+
+import inventory_ledger
+import outbox
+
+# Importable columns and their types; product_code is the key
+FIELDS = {
+    'product_code': str,
+    'name': str,
+    'category': str,
+    'material': str,
+    'price': float,
+    'image': str,
+    'size': str,
+    'low_stock_threshold': int,
+    'description': str,
+}
+STOCK_FIELDS = {'current_stock': int, 'stock_delta': int}
+REQUIRED_FOR_NEW = ('name', 'category', 'price')
+
+# Rows per import
+MAX_ROWS = 5000
+
+# Items listed per change kind in summary events
+SUMMARY_ITEMS = 20
+
+
+class InvalidImport(ValueError):
+    """The file could not be imported; errors lists {'row', 'error'} dicts"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} error(s) in import file')
+        self.errors = errors
+
+
+def detect_format(filename=None, content_type=None):
+    """'csv' or 'json' from a file name or Content-Type, defaulting to csv"""
+    if (filename or '').lower().endswith('.json') or 'json' in (content_type or ''):
+        return 'json'
+    return 'csv'
+
+
+def parse(data, fmt):
+    """Rows (dicts of strings or JSON values) from CSV or JSON text or bytes"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except ValueError as e:
+            raise InvalidImport([{'row': None, 'error': f'invalid JSON: {e}'}])
+        if isinstance(rows, dict):
+            rows = rows.get('items')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise InvalidImport([{'row': None, 'error': 'JSON must be a list of objects or {"items": [...]}'}])
+        return rows
+    reader = csv.DictReader(io.StringIO(data))
+    if not reader.fieldnames:
+        raise InvalidImport([{'row': None, 'error': 'CSV has no header row'}])
+    rows = []
+    for row in reader:
+        if None in row:
+            raise InvalidImport([{'row': len(rows) + 1, 'error': 'more cells than header columns'}])
+        rows.append({key.strip(): value for key, value in row.items()})
+    return rows
+
+
+def _convert(field, kind, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+    if value is None:
+        return None
+    if kind is str:
+        return str(value)
+    if isinstance(value, bool) or (kind is int and isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{field} must be {"an integer" if kind is int else "a number"}')
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} must be {"an integer" if kind is int else "a number"}')
+
+
+def validate(rows, max_rows=MAX_ROWS):
+    """
+    Typed items (dicts holding only the columns each row sets) from parsed
+    rows. Raises InvalidImport listing every problem; rows are numbered from 1.
+    """
+    if len(rows) > max_rows:
+        raise InvalidImport([{'row': None, 'error': f'{len(rows)} rows; the limit is {max_rows}'}])
+    types = dict(FIELDS, **STOCK_FIELDS)
+    items, errors, seen, unknown = [], [], {}, set()
+    for number, row in enumerate(rows, 1):
+        columns = set(row) - set(types)
+        if columns:
+            # Reported once, on the first row that has them
+            if columns - unknown:
+                errors.append({'row': number, 'error': f'unknown column(s): {", ".join(sorted(columns - unknown))}'})
+                unknown |= columns
+            continue
+        item = {}
+        for field, value in row.items():
+            try:
+                value = _convert(field, types[field], value)
+            except ValueError as e:
+                errors.append({'row': number, 'error': str(e)})
+                continue
+            if value is not None:
+                item[field] = value
+        code = item.get('product_code')
+        if not code:
+            errors.append({'row': number, 'error': 'product_code is required'})
+            continue
+        if code in seen:
+            errors.append({'row': number, 'error': f'{code} is already on row {seen[code]}'})
+            continue
+        seen[code] = number
+        if 'current_stock' in item and 'stock_delta' in item:
+            errors.append({'row': number, 'error': 'set current_stock or stock_delta, not both'})
+        for field in ('price', 'current_stock', 'low_stock_threshold'):
+            if item.get(field, 0) < 0:
+                errors.append({'row': number, 'error': f'{field} cannot be negative'})
+        item['row'] = number
+        items.append(item)
+    if errors:
+        raise InvalidImport(errors)
+    return items
+
+
+def plan(c, items):
+    """
+    Diff validated items against the inventory. Returns a dict with
+    'create' (new items), 'update' ({inventory_ID, product_code, changes:
+    {field: [old, new]}}) and 'stock' ({inventory_ID, product_code,
+    previous_stock, new_stock}) lists and an 'unchanged' count. Raises
+    InvalidImport for rows that only fail against the database.
+    """
+    codes = [item['product_code'] for item in items]
+    existing = {}
+    for start in range(0, len(codes), 500):
+        chunk = codes[start:start + 500]
+        c.execute('SELECT inventory_ID, current_stock, %s FROM inventory WHERE product_code IN (%s)'
+                  % (', '.join(FIELDS), ','.join('?' * len(chunk))), chunk)
+        for row in c.fetchall():
+            current = dict(zip(FIELDS, row[2:]), inventory_ID=row[0], current_stock=row[1] or 0)
+            existing.setdefault(current['product_code'], []).append(current)
+
+    result = {'create': [], 'update': [], 'stock': [], 'unchanged': 0}
+    errors = []
+    for item in items:
+        matches = existing.get(item['product_code'], [])
+        if len(matches) > 1:
+            errors.append({'row': item['row'], 'error': f"{item['product_code']} matches {len(matches)} items"})
+            continue
+        if not matches:
+            missing = [field for field in REQUIRED_FOR_NEW if field not in item]
+            stock = item.get('current_stock', item.get('stock_delta', 0))
+            if missing:
+                errors.append({'row': item['row'], 'error': f'new item needs {", ".join(missing)}'})
+            elif stock < 0:
+                errors.append({'row': item['row'], 'error': 'stock_delta cannot be negative for a new item'})
+            else:
+                result['create'].append(dict({field: item[field] for field in FIELDS if field in item},
+                                             current_stock=stock))
+            continue
+
+        current = matches[0]
+        changes = {field: [current[field], item[field]] for field in FIELDS
+                   if field in item and item[field] != current[field]}
+        if 'stock_delta' in item:
+            new_stock = current['current_stock'] + item['stock_delta']
+        else:
+            new_stock = item.get('current_stock', current['current_stock'])
+        if new_stock < 0:
+            errors.append({'row': item['row'], 'error': f"stock_delta {item['stock_delta']} would take "
+                                                        f"{item['product_code']} below zero ({current['current_stock']})"})
+            continue
+        if changes:
+            result['update'].append({'inventory_ID': current['inventory_ID'],
+                                     'product_code': item['product_code'], 'changes': changes})
+        if new_stock != current['current_stock']:
+            result['stock'].append({'inventory_ID': current['inventory_ID'], 'product_code': item['product_code'],
+                                    'previous_stock': current['current_stock'], 'new_stock': new_stock})
+        if not changes and new_stock == current['current_stock']:
+            result['unchanged'] += 1
+    if errors:
+        raise InvalidImport(errors)
+    return result
+
+
+def apply(c, result, action='Bulk Import', user_id=None):
+    """Write a plan in the caller's transaction"""
+    c.executemany('''INSERT INTO inventory (%s, initial_stock, current_stock)
+                     VALUES (%s, ?, ?)''' % (', '.join(FIELDS), ','.join('?' * len(FIELDS))),
+                  [tuple(item.get(field) for field in FIELDS) + (item['current_stock'], item['current_stock'])
+                   for item in result['create']])
+
+    # One executemany per distinct set of changed columns
+    by_columns = {}
+    for update in result['update']:
+        columns = tuple(sorted(update['changes']))
+        by_columns.setdefault(columns, []).append(
+            tuple(update['changes'][column][1] for column in columns) + (update['inventory_ID'],))
+    for columns, params in by_columns.items():
+        c.executemany('UPDATE inventory SET %s WHERE inventory_ID = ?' % ', '.join(f'{column} = ?' for column in columns),
+                      params)
+
+    inventory_ledger.record_changes(c, [(change['inventory_ID'], change['previous_stock'], change['new_stock'])
+                                        for change in result['stock']], action, user_id=user_id)
+
+
+def summary(result, limit=SUMMARY_ITEMS):
+    """Counts plus the first `limit` product codes per change kind, for events and reports"""
+    return {
+        'created': len(result['create']),
+        'updated': len(result['update']),
+        'stock_changed': len(result['stock']),
+        'unchanged': result['unchanged'],
+        'created_codes': [item['product_code'] for item in result['create'][:limit]],
+        'updated_codes': [update['product_code'] for update in result['update'][:limit]],
+        'stock_changes': [{key: change[key] for key in ('product_code', 'previous_stock', 'new_stock')}
+                          for change in result['stock'][:limit]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import inventory from a CSV or JSON file')
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=('csv', 'json'))
+    parser.add_argument('--dry-run', action='store_true', help='report the diff without writing')
+    parser.add_argument('--database', default='aureliana.db')
+    parser.add_argument('--user-id', type=int, help='recorded on the ledger rows')
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as f:
+        data = f.read()
+    conn = sqlite3.connect(args.database, timeout=30)
+    try:
+        items = validate(parse(data, args.format or detect_format(args.file)))
+        conn.execute('BEGIN' if args.dry_run else 'BEGIN IMMEDIATE')
+        c = conn.cursor()
+        result = plan(c, items)
+        if args.dry_run:
+            conn.rollback()
+            print(json.dumps(result, indent=2))
+            return
+        apply(c, result, user_id=args.user_id)
+        if result['create'] or result['update'] or result['stock']:
+            # Running servers deliver this to the admin dashboard from the outbox
+            outbox.publish(c, 'inventory_bulk_updated', summary(result), ['socketio'])
+        conn.commit()
+    except InvalidImport as e:
+        conn.rollback()
+        for error in e.errors:
+            print(f"row {error['row'] or '-'}: {error['error']}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+    print(json.dumps(summary(result), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Inventory ledger.
+
+inventory_log is the source of truth for stock. Every stock change is appended
+as a log row (previous_stock -> new_stock) and applied to inventory.current_stock
+in the same transaction. Periodic per-SKU snapshots bound the number of log rows
+that have to be replayed to derive stock for an item.
+
+All functions take an open cursor so they run inside the caller's transaction.
+"""
+
+# Take a new snapshot for an item once this many log rows have piled up after
+# its latest snapshot.
+SNAPSHOT_INTERVAL = 50
+
+# Latest snapshot per item plus the sum of every ledger delta recorded after it.
+# Used both for single-item derivation and for the whole-catalog reconcile pass.
+_LEDGER_STOCK_SQL = '''
+    SELECT i.inventory_ID,
+           i.product_code,
+           i.name,
+           i.current_stock,
+           COALESCE(s.stock, i.initial_stock, 0)
+               + COALESCE(SUM(l.new_stock - l.previous_stock), 0) AS ledger_stock,
+           COUNT(l.log_ID) AS pending_logs
+    FROM inventory i
+    LEFT JOIN inventory_snapshot s
+        ON s.snapshot_ID = (SELECT MAX(snapshot_ID) FROM inventory_snapshot
+                            WHERE inventory_ID = i.inventory_ID)
+    LEFT JOIN inventory_log l
+        ON l.inventory_ID = i.inventory_ID AND l.log_ID > COALESCE(s.last_log_ID, 0)
+'''
+
+
+def record_change(c, inventory_id, quantity_change, action, order_id=None, user_id=None):
+    """
+    Append a ledger row for a stock change and apply it to current_stock.
+    quantity_change: positive for additions, negative for reductions.
+    Returns (previous_stock, new_stock), or None if the item does not exist.
+    """
+    c.execute('SELECT current_stock FROM inventory WHERE inventory_ID = ?', (inventory_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+
+    previous_stock = row[0] or 0
+    new_stock = max(0, previous_stock + quantity_change)
+
+    c.execute('''INSERT INTO inventory_log
+                (inventory_ID, action, quantity, previous_stock, new_stock, timestamp, order_ID, user_ID)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)''',
+             (inventory_id, action, abs(quantity_change), previous_stock, new_stock, order_id, user_id))
+    c.execute('UPDATE inventory SET current_stock = ? WHERE inventory_ID = ?', (new_stock, inventory_id))
+
+    maybe_snapshot(c, inventory_id)
+    return previous_stock, new_stock
+
+
+def record_changes(c, changes, action, order_id=None, user_id=None):
+    """
+    Bulk form of record_change for stock levels the caller has already read in
+    this transaction. changes: (inventory_id, previous_stock, new_stock) tuples,
+    at most one per item. Writes every ledger row and stock update with
+    executemany, then snapshots the items that have reached the interval.
+    """
+    changes = [change for change in changes if change[1] != change[2]]
+    c.executemany('''INSERT INTO inventory_log
+                     (inventory_ID, action, quantity, previous_stock, new_stock, timestamp, order_ID, user_ID)
+                     VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?, ?)''',
+                  [(inventory_id, action, abs(new_stock - previous_stock), previous_stock, new_stock, order_id, user_id)
+                   for inventory_id, previous_stock, new_stock in changes])
+    c.executemany('UPDATE inventory SET current_stock = ? WHERE inventory_ID = ?',
+                  [(new_stock, inventory_id) for inventory_id, _, new_stock in changes])
+    if changes:
+        inventory_ids = [change[0] for change in changes]
+        c.execute('''SELECT l.inventory_ID FROM inventory_log l
+                     WHERE l.inventory_ID IN (%s) AND l.log_ID > COALESCE(
+                         (SELECT MAX(last_log_ID) FROM inventory_snapshot WHERE inventory_ID = l.inventory_ID), 0)
+                     GROUP BY l.inventory_ID HAVING COUNT(*) >= ?''' % ','.join('?' * len(inventory_ids)),
+                  inventory_ids + [SNAPSHOT_INTERVAL])
+        take_snapshot(c, [row[0] for row in c.fetchall()])
+    return len(changes)
+
+
+def set_stock(c, inventory_id, new_stock, action, order_id=None, user_id=None):
+    """Record an absolute stock level (e.g. a manual count) as a ledger delta."""
+    c.execute('SELECT current_stock FROM inventory WHERE inventory_ID = ?', (inventory_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+    if new_stock == row[0]:
+        return row[0], row[0]
+    return record_change(c, inventory_id, new_stock - (row[0] or 0), action, order_id, user_id)
+
+
+def take_snapshot(c, inventory_ids=None):
+    """
+    Snapshot the ledger-derived stock of the given items (all items by default)
+    at the current end of the log.
+    """
+    query = _LEDGER_STOCK_SQL
+    params = ()
+    if inventory_ids is not None:
+        inventory_ids = list(inventory_ids)
+        if not inventory_ids:
+            return 0
+        query += ' WHERE i.inventory_ID IN (%s)' % ','.join('?' * len(inventory_ids))
+        params = tuple(inventory_ids)
+    query += ' GROUP BY i.inventory_ID'
+
+    c.execute('SELECT COALESCE(MAX(log_ID), 0) FROM inventory_log')
+    last_log_id = c.fetchone()[0]
+
+    c.execute(query, params)
+    rows = [(row[0], row[4], last_log_id) for row in c.fetchall()]
+    c.executemany('''INSERT INTO inventory_snapshot (inventory_ID, stock, last_log_ID)
+                     VALUES (?, ?, ?)''', rows)
+    return len(rows)
+
+
+def maybe_snapshot(c, inventory_id, interval=SNAPSHOT_INTERVAL):
+    """Snapshot an item once enough log rows have accumulated since its last snapshot."""
+    c.execute('''SELECT COUNT(*) FROM inventory_log
+                 WHERE inventory_ID = ? AND log_ID > COALESCE(
+                     (SELECT MAX(last_log_ID) FROM inventory_snapshot WHERE inventory_ID = ?), 0)''',
+              (inventory_id, inventory_id))
+    if c.fetchone()[0] >= interval:
+        take_snapshot(c, [inventory_id])
+        return True
+    return False
+
+
+def derive_stock(c, inventory_id):
+    """Current stock for an item as latest snapshot plus later ledger deltas"""
+    c.execute(_LEDGER_STOCK_SQL + ' WHERE i.inventory_ID = ? GROUP BY i.inventory_ID', (inventory_id,))
+    row = c.fetchone()
+    return row[4] if row else None
+
+
+def reconcile(c):
+    """
+    Compare ledger-derived stock with inventory.current_stock for the whole
+    catalog in a single aggregate query. Returns one dict per drifting item.
+    """
+    c.execute(_LEDGER_STOCK_SQL + ' GROUP BY i.inventory_ID HAVING ledger_stock != COALESCE(i.current_stock, 0)')
+    return [{
+        'inventory_ID': row[0],
+        'product_code': row[1],
+        'name': row[2],
+        'current_stock': row[3],
+        'ledger_stock': row[4],
+        'drift': (row[3] or 0) - row[4],
+        'pending_logs': row[5]
+    } for row in c.fetchall()]
+
+
+def repair(c, drift=None):
+    """Reset current_stock to the ledger-derived value for drifting items."""
+    if drift is None:
+        drift = reconcile(c)
+    c.executemany('UPDATE inventory SET current_stock = ? WHERE inventory_ID = ?',
+                  [(item['ledger_stock'], item['inventory_ID']) for item in drift])
+    return len(drift)
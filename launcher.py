@@ -0,0 +1,129 @@
+"""
+Pre-fork production launcher.
+
+    WORKERS=4 PORT=5051 python launcher.py
+
+The parent process imports the app once. That runs the database migrations
+and warm-up (templates, address gazetteer, catalog cache) a single time.
+The parent then binds the listening socket and forks WORKERS gevent workers
+that share it. Everything loaded before the fork is shared copy-on-write.
+
+Socket.IO clients are pinned to the WebSocket transport, so each connection
+stays on the worker that accepted it (no polling requests that could land
+on another worker). Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379)
+so emits from one worker reach clients connected to the others.
+Sweeper and flusher background tasks run in worker 0 only.
+
+Workers that exit are restarted; SIGTERM or SIGINT stops them all.
+/healthz reports liveness, /readyz reports readiness after warm-up.
+"""
+import os
+
+WORKERS = int(os.environ.get('WORKERS', str(os.cpu_count() or 1)))
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', '5051'))
+
+os.environ['PREFORK'] = '1'
+os.environ['ASYNC_MODE'] = 'gevent'
+# The app refuses per-process features (e.g. enabling a flash sale) when there are several workers
+os.environ['WORKERS'] = str(WORKERS)
+
+from gevent import monkey  # noqa: E402
+monkey.patch_all()
+
+import signal  # noqa: E402
+import socket  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+from gevent import pywsgi  # noqa: E402
+
+import app as aureliana  # noqa: E402  (migrations and warm-up run here, once)
+
+# A worker that dies sooner than this after starting is not restarted in a loop
+MIN_WORKER_LIFETIME = 5
+
+
+def make_listener():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((HOST, PORT))
+    listener.listen(2048)
+    listener.setblocking(False)
+    return listener
+
+
+def run_worker(worker_id, listener):
+    """Worker process body; never returns"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    aureliana.start_worker(worker_id)
+    try:
+        from geventwebsocket.handler import WebSocketHandler
+        server = pywsgi.WSGIServer(listener, aureliana.app, handler_class=WebSocketHandler, log=None)
+    except ImportError:
+        # WebSocket support comes from simple-websocket
+        server = pywsgi.WSGIServer(listener, aureliana.app, log=None)
+    print(f"Worker {worker_id} (pid {os.getpid()}) serving on {HOST}:{PORT}")
+    server.serve_forever()
+    os._exit(0)
+
+
+def spawn(worker_id, listener):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(worker_id, listener)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def main():
+    if WORKERS > 1 and aureliana.flash_counters:
+        # Flash-sale counters are held in process memory and cannot be split across workers
+        sys.exit('Flash-sale mode (FLASH_SALE_SKUS) needs WORKERS=1')
+    if WORKERS > 1 and aureliana.app.config['RATE_LIMIT_BACKEND'] == 'memory':
+        # Every worker would grant the full budget, multiplying each limit by WORKERS
+        sys.exit('RATE_LIMIT_BACKEND=memory needs WORKERS=1; use sqlite')
+    if WORKERS > 1 and not aureliana.app.config['SOCKETIO_MESSAGE_QUEUE']:
+        print('Warning: without SOCKETIO_MESSAGE_QUEUE, real-time updates only reach clients '
+              'connected to the worker that emitted them')
+
+    listener = make_listener()
+    workers = {}  # pid -> (worker_id, started_at)
+    for worker_id in range(WORKERS):
+        workers[spawn(worker_id, listener)] = (worker_id, time.monotonic())
+    print(f"Launcher (pid {os.getpid()}) started {WORKERS} workers on {HOST}:{PORT}")
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, 0)
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        worker_id, started_at = workers.pop(pid, (None, None))
+        if worker_id is None or stopping:
+            continue
+        print(f"Worker {worker_id} (pid {pid}) exited with status {status}")
+        if time.monotonic() - started_at < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        workers[spawn(worker_id, listener)] = (worker_id, time.monotonic())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Delivery sinks for the outbox dispatcher (outbox.py).
+
+SocketIOSink   emits each event to connected clients, named by its topic
+SMTPSink       sends email over SMTP, one connection per batch
+MailSpoolSink  writes the same emails as .eml files to a directory: the
+               stand-in for SMTPSink in development and tests
+WebhookSink    POSTs each batch as one JSON document
+
+Each sink's deliver(events) returns {event_ID: error} for the events that
+failed, or raises if the whole batch failed. The dispatcher retries both.
+compose_email() turns an event into an email, or None for topics that
+don't send one.
+"""
+import hashlib
+import hmac
+import json
+import os
+import smtplib
+import time
+import urllib.request
+from email.message import EmailMessage
+
+
+def compose_email(event, sender, alert_address):
+    """EmailMessage for an outbox event, or None"""
+    topic, payload = event['topic'], event['payload']
+    message = EmailMessage()
+    message['From'] = sender
+    if topic == 'order_placed':
+        if not payload.get('email'):
+            return None
+        message['To'] = payload['email']
+        message['Subject'] = f"Your Aureliana order {payload['order_number']}"
+        lines = [f"Hi {payload.get('full_name') or 'there'},", '',
+                 f"Thank you for your order {payload['order_number']}. Status: {payload['status']}.", '']
+        lines += [f"  {item['quantity']} x {item['name']}  PHP {item['price'] * item['quantity']:,.2f}"
+                  for item in payload['items']]
+        lines += ['', f"Shipping  PHP {payload['shipping']:,.2f}", f"Total     PHP {payload['total']:,.2f}", '',
+                  f"Payment: {payload['payment_method']}", '', 'Aureliana Jewelry']
+    elif topic == 'low_stock':
+        message['To'] = alert_address
+        message['Subject'] = f"Low stock: {payload['name']} ({payload['product_code']})"
+        lines = [f"{payload['name']} ({payload['product_code']}) is down to {payload['current_stock']} "
+                 f"(threshold {payload['low_stock_threshold']}) after order {payload['order_id']}."]
+    else:
+        return None
+    message.set_content('\n'.join(lines) + '\n')
+    return message
+
+
+class SocketIOSink:
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def deliver(self, events):
+        for event in events:
+            self.socketio.emit(event['topic'], event['payload'])
+        return {}
+
+
+class _MailSink:
+    def __init__(self, sender, alert_address):
+        self.sender = sender
+        self.alert_address = alert_address
+
+    def _messages(self, events):
+        for event in events:
+            message = compose_email(event, self.sender, self.alert_address)
+            if message is not None:
+                yield event, message
+
+
+class SMTPSink(_MailSink):
+    def __init__(self, host, port, sender, alert_address, username=None, password=None, starttls=True, timeout=10):
+        super().__init__(sender, alert_address)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def deliver(self, events):
+        errors = {}
+        # Connection failures raise, failing the whole batch
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for event, message in self._messages(events):
+                try:
+                    smtp.send_message(message)
+                except smtplib.SMTPException as e:
+                    errors[event['event_ID']] = str(e)
+        return errors
+
+
+class MailSpoolSink(_MailSink):
+    """Writes <event_ID>.eml files instead of sending; point a test or mail viewer at the directory"""
+
+    def __init__(self, directory, sender, alert_address):
+        super().__init__(sender, alert_address)
+        self.directory = directory
+
+    def deliver(self, events):
+        os.makedirs(self.directory, exist_ok=True)
+        for event, message in self._messages(events):
+            path = os.path.join(self.directory, f"{event['event_ID']}.eml")
+            with open(path + '.tmp', 'wb') as f:
+                f.write(message.as_bytes())
+            os.replace(path + '.tmp', path)
+        return {}
+
+
+class WebhookSink:
+    """
+    POSTs {"events": [...]} to url. With a secret, the body's HMAC-SHA256 is
+    sent as X-Aureliana-Signature so the receiver can check it came from us.
+    Receivers should dedupe on event_ID, since retries resend whole batches.
+    """
+
+    def __init__(self, url, secret=None, timeout=10):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+
+    def deliver(self, events):
+        body = json.dumps({'sent_at': time.time(), 'events': [
+            {'event_ID': event['event_ID'], 'topic': event['topic'], 'payload': event['payload']} for event in events
+        ]}, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.secret:
+            headers['X-Aureliana-Signature'] = hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        # Non-2xx responses raise HTTPError, failing the whole batch
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+        return {}
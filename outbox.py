@@ -0,0 +1,145 @@
+"""
+Transactional outbox for notifications.
+
+Routes that change orders don't notify anyone themselves. They publish()
+events into the outbox table using the cursor of their own transaction, so
+an event exists if and only if the change it describes was committed. A
+single background Dispatcher then reads due events in batches, hands each
+sink its share (Socket.IO, email, webhook; see notification_sinks.py) with
+no database lock held, and records the outcome. Failed deliveries are
+retried with jittered exponential backoff until max_attempts, after which
+they stay in the table as dead letters with their last error.
+
+Each event is stored once per sink, so a webhook outage never re-sends
+emails. Delivery is at-least-once: a crash between sending and recording
+the outcome sends that batch again on restart.
+"""
+import json
+import random
+import threading
+import time
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS outbox (
+           event_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+           topic TEXT NOT NULL,
+           sink TEXT NOT NULL,
+           payload TEXT NOT NULL,
+           attempts INTEGER NOT NULL DEFAULT 0,
+           next_attempt_at REAL NOT NULL,
+           last_error TEXT,
+           created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+           delivered_at DATETIME
+       )''',
+    'CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (next_attempt_at) WHERE delivered_at IS NULL',
+]
+
+# Delivered events are kept this long for inspection, then purged at startup
+RETENTION_DAYS = 7
+
+
+def ensure_schema(c):
+    for statement in SCHEMA:
+        c.execute(statement)
+
+
+def publish(c, topic, payload, sinks):
+    """Queue an event for each sink, in the caller's transaction"""
+    body = json.dumps(payload, separators=(',', ':'), default=str)
+    now = time.time()
+    c.executemany('INSERT INTO outbox (topic, sink, payload, next_attempt_at) VALUES (?, ?, ?, ?)',
+                  [(topic, sink, body, now) for sink in sinks])
+
+
+def purge_delivered(c, days=RETENTION_DAYS):
+    c.execute("DELETE FROM outbox WHERE delivered_at IS NOT NULL AND delivered_at < datetime('now', ?)",
+              (f'-{days} days',))
+    return c.rowcount
+
+
+class Dispatcher:
+    """
+    Delivers outbox events to sinks. A sink has deliver(events), where each
+    event is a dict with event_ID, topic and payload; it returns
+    {event_ID: error} for the events it could not deliver and raises if the
+    whole batch failed. Run one dispatcher per database.
+    """
+
+    def __init__(self, transaction, sinks, batch_size=100, max_attempts=8, base_delay=5, max_delay=900):
+        self.transaction = transaction
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {'delivered': 0, 'failed_attempts': 0, 'dead': 0, 'batches': 0}
+
+    def wake(self):
+        """Dispatch now instead of at the next interval (e.g. after a commit that published events)"""
+        self._wake.set()
+
+    def wait(self, timeout):
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def retry_delay(self, attempts):
+        """Seconds before the next try after `attempts` failures: exponential, with jitter in its upper half"""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1)
+
+    def _due(self, now):
+        with self.transaction() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT event_ID, topic, sink, payload, attempts FROM outbox
+                         WHERE delivered_at IS NULL AND next_attempt_at <= ? AND attempts < ?
+                         ORDER BY event_ID LIMIT ?''', (now, self.max_attempts, self.batch_size))
+            return c.fetchall()
+
+    def dispatch(self):
+        """Deliver one batch of due events; returns how many were attempted"""
+        rows = self._due(time.time())
+        if not rows:
+            return 0
+        by_sink = {}
+        for event_id, topic, sink, payload, attempts in rows:
+            by_sink.setdefault(sink, []).append({'event_ID': event_id, 'topic': topic,
+                                                 'payload': json.loads(payload), 'attempts': attempts})
+        errors = {}
+        for sink_name, events in by_sink.items():
+            sink = self.sinks.get(sink_name)
+            if sink is None:
+                errors.update((event['event_ID'], f'sink {sink_name!r} is not configured') for event in events)
+                continue
+            try:
+                errors.update(sink.deliver(events) or {})
+            except Exception as e:
+                print(f"Outbox sink {sink_name} error: {e}")
+                errors.update((event['event_ID'], str(e)) for event in events)
+
+        now = time.time()
+        delivered = [(row[0],) for row in rows if row[0] not in errors]
+        failed = [(errors[row[0]][:500], now + self.retry_delay(row[4] + 1), row[0]) for row in rows if row[0] in errors]
+        with self.transaction(write=True) as conn:
+            c = conn.cursor()
+            c.executemany('UPDATE outbox SET attempts = attempts + 1, delivered_at = CURRENT_TIMESTAMP, last_error = NULL '
+                          'WHERE event_ID = ?', delivered)
+            c.executemany('UPDATE outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? '
+                          'WHERE event_ID = ?', failed)
+        with self._lock:
+            self._counts['batches'] += 1
+            self._counts['delivered'] += len(delivered)
+            self._counts['failed_attempts'] += len(failed)
+            self._counts['dead'] += sum(1 for row in rows if row[0] in errors and row[4] + 1 >= self.max_attempts)
+        return len(rows)
+
+    def metrics(self):
+        """Dispatcher counters plus per-sink pending and dead-letter counts from the table"""
+        with self.transaction() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT sink, SUM(attempts < ?), SUM(attempts >= ?), MIN(created_at) FROM outbox
+                         WHERE delivered_at IS NULL GROUP BY sink''', (self.max_attempts, self.max_attempts))
+            backlog = {sink: {'pending': pending, 'dead': dead, 'oldest': oldest}
+                       for sink, pending, dead, oldest in c.fetchall()}
+        with self._lock:
+            return dict(self._counts, sinks=sorted(self.sinks), backlog=backlog)
@@ -0,0 +1,179 @@
+"""
+Password hashing.
+
+Passwords are stored as salted scrypt hashes in one self-describing string,
+
+    scrypt$<n>$<r>$<p>$<salt, base64>$<hash, base64>
+
+so every user has their own salt and the cost parameters the hash was made
+with. Raising the cost later does not lock anyone out: check() reports a
+replacement hash whenever a password verifies against weaker parameters, and
+the app stores it at that login. Hashes from before this module (unsalted
+SHA-256 hex digests) still verify and are replaced the same way.
+
+A KDF call takes tens of milliseconds of CPU on purpose. Hasher runs them in
+a bounded pool of worker processes, so a burst of logins neither holds the
+GIL against request threads nor stalls the gevent/eventlet hub; the caller
+just waits on a future. The pool is created on first use in each process,
+so prefork workers each get their own.
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+ALGORITHM = 'scrypt'
+SALT_BYTES = 16
+HASH_BYTES = 32
+LEGACY_HEX_LENGTH = 64
+
+
+class Params:
+    """scrypt cost: n (CPU/memory, a power of two), r (block size), p (parallelism)"""
+
+    def __init__(self, n=2 ** 14, r=8, p=1):
+        if n < 2 or n & (n - 1):
+            raise ValueError(f"scrypt n must be a power of two, not {n}")
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def as_tuple(self):
+        return (self.n, self.r, self.p)
+
+    def memory(self):
+        """Bytes scrypt allocates at these parameters"""
+        return 128 * self.r * (self.n + self.p + 2)
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, dklen=HASH_BYTES,
+                          maxmem=Params(n, r, p).memory() + 1024 * 1024)
+
+
+def _encode(params, salt, derived):
+    return f'{ALGORITHM}${params.n}${params.r}${params.p}${_b64(salt)}${_b64(derived)}'
+
+
+def hash_password(password, params):
+    """New encoded hash with a fresh random salt"""
+    salt = os.urandom(SALT_BYTES)
+    return _encode(params, salt, _scrypt(password, salt, params.n, params.r, params.p))
+
+
+def is_legacy(stored):
+    return len(stored) == LEGACY_HEX_LENGTH and '$' not in stored
+
+
+def verify_password(password, stored):
+    """True if password matches the encoded (or legacy SHA-256) hash"""
+    if is_legacy(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), stored.lower())
+    try:
+        algorithm, n, r, p, salt, expected = stored.split('$')
+        if algorithm != ALGORITHM:
+            return False
+        derived = _scrypt(password, _unb64(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(derived, _unb64(expected))
+
+
+def needs_rehash(stored, params):
+    """True for legacy hashes and hashes made with other cost parameters"""
+    if is_legacy(stored):
+        return True
+    parts = stored.split('$')
+    return len(parts) != 6 or parts[0] != ALGORITHM or tuple(parts[1:4]) != tuple(map(str, params.as_tuple()))
+
+
+def check(password, stored, params):
+    """(matches, replacement hash or None); runs in a pool process"""
+    if is_legacy(stored):
+        # A SHA-256 check alone takes microseconds, so response times would tell
+        # legacy accounts apart from unknown emails. Derive the replacement hash
+        # first, matching or not, so every check costs one scrypt run.
+        salt = os.urandom(SALT_BYTES)
+        replacement = _encode(params, salt, _scrypt(password, salt, params.n, params.r, params.p))
+        return (True, replacement) if verify_password(password, stored) else (False, None)
+    if not verify_password(password, stored):
+        return False, None
+    if needs_rehash(stored, params):
+        return True, hash_password(password, params)
+    return True, None
+
+
+def _hash(password, n, r, p):
+    return hash_password(password, Params(n, r, p))
+
+
+def _check(password, stored, n, r, p):
+    return check(password, stored, Params(n, r, p))
+
+
+class Hasher:
+    """
+    Runs KDF calls in `workers` processes (inline when workers is 0). Callers
+    should bound how many wait at once; the pool itself queues without limit.
+    """
+
+    def __init__(self, params, workers):
+        self.params = params
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._dummy = None
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # fork: spawn would re-run the app module in every pool process
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        pool = self._executor()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A pool process died; start a fresh pool for the next call
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+
+    def hash(self, password):
+        return self._run(_hash, password, *self.params.as_tuple())
+
+    def check(self, password, stored):
+        """(matches, replacement hash or None) for a stored hash"""
+        return self._run(_check, password, stored, *self.params.as_tuple())
+
+    def check_unknown_user(self, password):
+        """Spend the same time as a real check, so response times don't reveal which emails exist"""
+        if self._dummy is None:
+            self._dummy = self.hash(os.urandom(SALT_BYTES).hex())
+        self.check(password, self._dummy)
+        return False, None
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
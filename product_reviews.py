@@ -0,0 +1,138 @@
+"""
+Product review aggregates and paging.
+
+review_aggregate keeps a per-product review count, rating sum and 1-5 star
+histogram that add_reviews() updates in the same transaction as the reviews,
+so product and collection pages never have to scan reviews to show ratings.
+Reviewer display names are computed once when the review is written.
+"""
+import hashlib
+
+# Reviews shown per page on product pages
+REVIEWS_PAGE_SIZE = 10
+
+
+def display_name(full_name, user_id, anonymous):
+    """Name shown next to a review"""
+    if anonymous:
+        # First letter of first name and a short hash of user_id
+        first_letter = full_name[0].upper() if full_name else 'A'
+        user_hash = hashlib.sha256(str(user_id).encode()).hexdigest()[:6]
+        return f"{first_letter}-{user_hash}"
+    if not full_name:
+        return 'Customer'
+    return f"{full_name} {full_name[0]}."
+
+
+def backfill_display_names(c):
+    """Store display names for reviews written before the column existed"""
+    c.execute('''SELECT r.review_id, r.user_id, r.anonymous, c.full_name
+                 FROM reviews r LEFT JOIN clients c ON r.user_id = c.client_ID
+                 WHERE r.display_name IS NULL''')
+    rows = [(display_name(full_name, user_id, anonymous), review_id)
+            for review_id, user_id, anonymous, full_name in c.fetchall()]
+    c.executemany('UPDATE reviews SET display_name = ? WHERE review_id = ?', rows)
+    return len(rows)
+
+
+def add_reviews(c, reviews):
+    """
+    Insert a batch of reviews (dicts with user_id, inventory_ID, product_name,
+    rating, comment, anonymous, display_name and created_at) and count them in
+    their products' aggregates. A review of a product the user has already
+    reviewed, in the table or earlier in the batch, is skipped. Returns the
+    number inserted.
+    """
+    fresh = []
+    seen = set()
+    for review in reviews:
+        key = (review['user_id'], review['inventory_ID'])
+        if key in seen:
+            continue
+        seen.add(key)
+        c.execute('SELECT 1 FROM reviews WHERE user_id = ? AND inventory_ID = ? AND comment IS NOT NULL', key)
+        if c.fetchone() is None:
+            fresh.append(review)
+    c.executemany('''INSERT INTO reviews
+                     (user_id, inventory_ID, product_name, rating, comment, created_at, anonymous, display_name)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                  [(review['user_id'], review['inventory_ID'], review['product_name'], int(review['rating']),
+                    review['comment'], review['created_at'], int(review['anonymous']), review['display_name'])
+                   for review in fresh])
+    c.executemany('''INSERT INTO review_aggregate
+                     (inventory_ID, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+                     VALUES (?, 1, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT(inventory_ID) DO UPDATE SET
+                         review_count = review_count + 1,
+                         rating_sum = rating_sum + excluded.rating_sum,
+                         rating_1 = rating_1 + excluded.rating_1,
+                         rating_2 = rating_2 + excluded.rating_2,
+                         rating_3 = rating_3 + excluded.rating_3,
+                         rating_4 = rating_4 + excluded.rating_4,
+                         rating_5 = rating_5 + excluded.rating_5''',
+                  [(review['inventory_ID'], int(review['rating'])) +
+                   tuple(int(int(review['rating']) == star) for star in range(1, 6)) for review in fresh])
+    return len(fresh)
+
+
+def rebuild_aggregates(c):
+    """Recompute every product's aggregate from the reviews table"""
+    c.execute('DELETE FROM review_aggregate')
+    c.execute('''INSERT INTO review_aggregate
+                 (inventory_ID, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5)
+                 SELECT inventory_ID, COUNT(*), SUM(rating),
+                        SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+                 FROM reviews WHERE inventory_ID IS NOT NULL AND comment IS NOT NULL
+                 GROUP BY inventory_ID''')
+
+
+def _summary(row):
+    count = row[1] or 0
+    return {
+        'count': count,
+        'average': (row[2] / count) if count else 0,
+        'histogram': {star: row[2 + star] or 0 for star in range(1, 6)}
+    }
+
+
+def get_summary(c, inventory_id):
+    """Rating summary (count, average, histogram) for one product"""
+    c.execute('''SELECT inventory_ID, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5
+                 FROM review_aggregate WHERE inventory_ID = ?''', (inventory_id,))
+    row = c.fetchone()
+    return _summary(row) if row else _summary((inventory_id, 0, 0, 0, 0, 0, 0, 0))
+
+
+def get_summaries(c):
+    """Rating summaries for every reviewed product, keyed by inventory_ID"""
+    c.execute('''SELECT inventory_ID, review_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5
+                 FROM review_aggregate''')
+    return {row[0]: _summary(row) for row in c.fetchall()}
+
+
+def get_page(c, inventory_id, before=None, limit=REVIEWS_PAGE_SIZE):
+    """
+    One page of a product's reviews, newest first. `before` is the review_id
+    cursor returned with the previous page. Returns (reviews, next_cursor).
+    """
+    params = [inventory_id]
+    query = '''SELECT review_id, rating, comment, created_at, anonymous, display_name
+               FROM reviews WHERE inventory_ID = ? AND comment IS NOT NULL'''
+    if before:
+        query += ' AND review_id < ?'
+        params.append(int(before))
+    query += ' ORDER BY review_id DESC LIMIT ?'
+    params.append(limit + 1)
+    c.execute(query, params)
+    rows = c.fetchall()
+
+    reviews = [{
+        'review_id': row[0],
+        'rating': row[1],
+        'comment': row[2],
+        'created_at': row[3],
+        'anonymous': row[4],
+        'user_name': row[5]
+    } for row in rows[:limit]]
+    next_cursor = reviews[-1]['review_id'] if len(rows) > limit else None
+    return reviews, next_cursor
@@ -0,0 +1,199 @@
+"""
+Product search backed by SQLite FTS5.
+
+inventory_fts indexes product name, category, material and code; reviews_fts
+indexes review text. Both are external-content tables kept in sync with their
+source tables by triggers, so search never scans inventory or reviews in Python.
+Results are ranked with BM25; a product matched only through its reviews ranks
+below one matched on its own fields.
+"""
+import re
+import sqlite3
+
+# BM25 column weights for inventory_fts: name, category, material, product_code
+PRODUCT_WEIGHTS = (10.0, 2.0, 2.0, 5.0)
+# Review matches count for this fraction of a product-field match
+REVIEW_WEIGHT = 0.5
+
+# Price facet buckets: (label, low inclusive, high exclusive)
+PRICE_BUCKETS = [
+    ('Under ₱7,000', None, 7000),
+    ('₱7,000 - ₱7,999', 7000, 8000),
+    ('₱8,000 - ₱8,999', 8000, 9000),
+    ('₱9,000 and above', 9000, None),
+]
+
+SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+           name, category, material, product_code,
+           content='inventory', content_rowid='inventory_ID', prefix='2 3')''',
+    '''CREATE TRIGGER IF NOT EXISTS inventory_fts_ai AFTER INSERT ON inventory BEGIN
+           INSERT INTO inventory_fts (rowid, name, category, material, product_code)
+           VALUES (new.inventory_ID, new.name, new.category, new.material, new.product_code);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS inventory_fts_ad AFTER DELETE ON inventory BEGIN
+           INSERT INTO inventory_fts (inventory_fts, rowid, name, category, material, product_code)
+           VALUES ('delete', old.inventory_ID, old.name, old.category, old.material, old.product_code);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS inventory_fts_au
+       AFTER UPDATE OF name, category, material, product_code ON inventory BEGIN
+           INSERT INTO inventory_fts (inventory_fts, rowid, name, category, material, product_code)
+           VALUES ('delete', old.inventory_ID, old.name, old.category, old.material, old.product_code);
+           INSERT INTO inventory_fts (rowid, name, category, material, product_code)
+           VALUES (new.inventory_ID, new.name, new.category, new.material, new.product_code);
+       END''',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+           comment, content='reviews', content_rowid='review_id')''',
+    '''CREATE TRIGGER IF NOT EXISTS reviews_fts_ai AFTER INSERT ON reviews BEGIN
+           INSERT INTO reviews_fts (rowid, comment) VALUES (new.review_id, new.comment);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS reviews_fts_ad AFTER DELETE ON reviews BEGIN
+           INSERT INTO reviews_fts (reviews_fts, rowid, comment) VALUES ('delete', old.review_id, old.comment);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS reviews_fts_au AFTER UPDATE OF comment ON reviews BEGIN
+           INSERT INTO reviews_fts (reviews_fts, rowid, comment) VALUES ('delete', old.review_id, old.comment);
+           INSERT INTO reviews_fts (rowid, comment) VALUES (new.review_id, new.comment);
+       END''',
+]
+
+
+def ensure_schema(c):
+    """
+    Create the search index and its sync triggers, building the index from
+    existing rows the first time. Returns False if SQLite lacks FTS5.
+    """
+    c.execute("SELECT COUNT(*) FROM sqlite_master WHERE name IN ('inventory_fts', 'reviews_fts')")
+    existed = c.fetchone()[0] == 2
+    try:
+        for statement in SCHEMA:
+            c.execute(statement)
+    except sqlite3.OperationalError as e:
+        print(f"Search index unavailable: {e}")
+        return False
+    if not existed:
+        c.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+        c.execute("INSERT INTO reviews_fts (reviews_fts) VALUES ('rebuild')")
+    return True
+
+
+def build_match(text, prefix_last=True):
+    """
+    Turn free text into an FTS5 query: every word must match, and the last
+    word also matches as a prefix so partially typed queries find results.
+    Returns None if the text has no searchable words.
+    """
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        return None
+    terms = ['"%s"' % word for word in words]
+    if prefix_last:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _filter_sql(filters):
+    clauses, params = [], []
+    if filters.get('material'):
+        clauses.append('i.material = ?')
+        params.append(filters['material'])
+    if filters.get('category'):
+        clauses.append('i.category = ?')
+        params.append(filters['category'])
+    if filters.get('min_price') is not None:
+        clauses.append('i.price >= ?')
+        params.append(filters['min_price'])
+    if filters.get('max_price') is not None:
+        clauses.append('i.price <= ?')
+        params.append(filters['max_price'])
+    if filters.get('in_stock'):
+        clauses.append('i.current_stock > 0')
+    return (' AND ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _price_bucket_sql():
+    cases = []
+    for label, low, high in PRICE_BUCKETS:
+        conditions = []
+        if low is not None:
+            conditions.append(f'i.price >= {low}')
+        if high is not None:
+            conditions.append(f'i.price < {high}')
+        cases.append("WHEN %s THEN '%s'" % (' AND '.join(conditions), label))
+    return 'CASE %s END' % ' '.join(cases)
+
+
+def search(c, text, filters=None, limit=20, offset=0):
+    """
+    Ranked product search with facet counts. Facets are counted over every
+    match for the text, before filters, so the front end can offer them all.
+    """
+    match = build_match(text)
+    if not match:
+        return {'results': [], 'total': 0, 'facets': {'material': {}, 'category': {}, 'price': {}}}
+
+    hits = f'''
+        WITH hits AS (
+            SELECT inventory_ID, MIN(score) AS score FROM (
+                SELECT rowid AS inventory_ID, bm25(inventory_fts, {', '.join(map(str, PRODUCT_WEIGHTS))}) AS score
+                FROM inventory_fts WHERE inventory_fts MATCH ?
+                UNION ALL
+                SELECT r.inventory_ID, bm25(reviews_fts) * {REVIEW_WEIGHT} AS score
+                FROM reviews_fts JOIN reviews r ON r.review_id = reviews_fts.rowid
+                WHERE reviews_fts MATCH ? AND r.inventory_ID IS NOT NULL
+            ) GROUP BY inventory_ID
+        )
+    '''
+    where, params = _filter_sql(filters or {})
+
+    c.execute(hits + f'''
+        SELECT i.inventory_ID, i.product_code, i.name, i.category, i.material, i.price, i.image,
+               i.current_stock, hits.score, COUNT(*) OVER () AS total
+        FROM hits JOIN inventory i ON i.inventory_ID = hits.inventory_ID
+        WHERE 1 = 1{where}
+        ORDER BY hits.score LIMIT ? OFFSET ?''', [match, match] + params + [limit, offset])
+    rows = c.fetchall()
+    if rows:
+        total = rows[0][9]
+    elif offset:
+        # Past the last page the window count has no row to ride on
+        c.execute(hits + f'''
+            SELECT COUNT(*) FROM hits JOIN inventory i ON i.inventory_ID = hits.inventory_ID
+            WHERE 1 = 1{where}''', [match, match] + params)
+        total = c.fetchone()[0]
+    else:
+        total = 0
+    results = [{
+        'inventory_ID': row[0],
+        'product_code': row[1],
+        'name': row[2],
+        'category': row[3],
+        'material': row[4],
+        'price': row[5],
+        'image': row[6],
+        'current_stock': row[7],
+        'score': row[8]
+    } for row in rows]
+
+    c.execute(hits + f'''
+        SELECT i.material, i.category, {_price_bucket_sql()} AS price_bucket, COUNT(*)
+        FROM hits JOIN inventory i ON i.inventory_ID = hits.inventory_ID
+        GROUP BY i.material, i.category, price_bucket''', [match, match])
+    facets = {'material': {}, 'category': {}, 'price': {}}
+    for material, category, price_bucket, count in c.fetchall():
+        for facet, value in (('material', material), ('category', category), ('price', price_bucket)):
+            if value is not None:
+                facets[facet][value] = facets[facet].get(value, 0) + count
+
+    return {'results': results, 'total': total, 'facets': facets}
+
+
+def autocomplete(c, text, limit=8):
+    """Product names whose name or code starts with the typed words"""
+    match = build_match(text)
+    if not match:
+        return []
+    c.execute('''SELECT i.product_code, i.name, i.category FROM inventory_fts
+                 JOIN inventory i ON i.inventory_ID = inventory_fts.rowid
+                 WHERE inventory_fts MATCH ? ORDER BY bm25(inventory_fts, 10.0, 1.0, 1.0, 5.0) LIMIT ?''',
+              ('{name product_code} : (%s)' % match, limit))
+    return [{'product_code': row[0], 'name': row[1], 'category': row[2]} for row in c.fetchall()]
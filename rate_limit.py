@@ -0,0 +1,175 @@
+"""
+Token-bucket rate limiting.
+
+Each client key (e.g. 'login:ip:203.0.113.7') has a bucket of `count`
+tokens that refills at count/period tokens per second. A request takes one
+token, and a request that finds the bucket empty is refused, with the
+seconds until the next token as its Retry-After. Buckets are created full
+on first use.
+
+MemoryLimiter keeps buckets in a dict of (tokens, timestamp) tuples,
+private to the process. SQLiteLimiter keeps them in a small SQLite file of
+their own (never the shop database), so prefork workers share one budget
+per client. Both evict buckets left idle for longer than the longest
+period, since such a bucket has refilled completely and is the same as a
+missing one. A limiter that fails (e.g. the bucket file is locked past its
+timeout) lets the request through rather than turning everyone away.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# How often idle buckets are evicted, in seconds
+SWEEP_INTERVAL = 60
+
+
+class Rate:
+    """count requests per period seconds, with bursts of up to count"""
+
+    def __init__(self, count, period):
+        if count < 1 or period <= 0:
+            raise ValueError(f"rate must allow at least 1 request per positive period, not {count}/{period}")
+        self.count = count
+        self.period = period
+        self.refill = count / period
+
+    def __repr__(self):
+        return f'{self.count}/{self.period:g}'
+
+
+def parse(spec):
+    """Rate from 'count/seconds' (e.g. '10/60'); None for an empty spec, which disables the rule"""
+    if not spec or not spec.strip():
+        return None
+    count, _, period = spec.partition('/')
+    return Rate(int(count), float(period or 1))
+
+
+class MemoryLimiter:
+    def __init__(self, sweep_interval=SWEEP_INTERVAL):
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._max_period = 0
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._counts = {'allowed': 0, 'limited': 0, 'evicted': 0, 'errors': 0}
+
+    def hit(self, key, rate):
+        """Take a token from key's bucket: 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            if rate.period > self._max_period:
+                self._max_period = rate.period
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = rate.count
+            else:
+                tokens = min(rate.count, bucket[0] + (now - bucket[1]) * rate.refill)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                self._counts['allowed'] += 1
+                return 0
+            self._buckets[key] = (tokens, now)
+            self._counts['limited'] += 1
+            return (1 - tokens) / rate.refill
+
+    def _sweep(self, now):
+        idle_since = now - self._max_period
+        idle = [key for key, bucket in self._buckets.items() if bucket[1] < idle_since]
+        for key in idle:
+            del self._buckets[key]
+        self._counts['evicted'] += len(idle)
+        self._next_sweep = now + self.sweep_interval
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._counts, backend='memory', keys=len(self._buckets))
+
+
+class SQLiteLimiter:
+    """
+    Buckets in a SQLite file shared by every process. One UPSERT per hit
+    refills, takes a token and reports the outcome. Timestamps are wall-clock
+    so they compare across processes.
+    """
+
+    # SET expressions see the row's old values, so the refilled level is spelled out in each.
+    # MAX(..., updated) ignores clock steps backwards between processes.
+    _HIT = '''
+        INSERT INTO rate_buckets (key, tokens, updated, allowed) VALUES (:key, :count - 1, :now, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = MIN(:count, tokens + (MAX(:now, updated) - updated) * :refill)
+                     - (MIN(:count, tokens + (MAX(:now, updated) - updated) * :refill) >= 1),
+            allowed = MIN(:count, tokens + (MAX(:now, updated) - updated) * :refill) >= 1,
+            updated = MAX(:now, updated)
+        RETURNING tokens, allowed'''
+
+    def __init__(self, path, timeout=0.05, sweep_interval=SWEEP_INTERVAL):
+        self.path = path
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._max_period = 0
+        self._next_sweep = 0
+        self._counts = {'allowed': 0, 'limited': 0, 'evicted': 0, 'errors': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Buckets are disposable; losing the last writes in a crash only refills them
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('''CREATE TABLE IF NOT EXISTS rate_buckets (
+                            key TEXT PRIMARY KEY,
+                            tokens REAL NOT NULL,
+                            updated REAL NOT NULL,
+                            allowed INTEGER NOT NULL
+                        ) WITHOUT ROWID''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rate_buckets_updated ON rate_buckets (updated)')
+        return conn
+
+    def hit(self, key, rate):
+        """Take a token from key's bucket: 0 if allowed, else seconds until one is available"""
+        now = time.time()
+        with self._lock:
+            if rate.period > self._max_period:
+                self._max_period = rate.period
+            try:
+                if self._conn is None or self._conn_pid != os.getpid():
+                    # Prefork workers each open their own connection
+                    self._conn = self._connect()
+                    self._conn_pid = os.getpid()
+                if now >= self._next_sweep:
+                    self._sweep(now)
+                tokens, allowed = self._conn.execute(
+                    self._HIT, {'key': key, 'count': rate.count, 'refill': rate.refill, 'now': now}).fetchone()
+            except sqlite3.Error as e:
+                print(f"Rate limiter error: {e}")
+                self._counts['errors'] += 1
+                return 0
+            if allowed:
+                self._counts['allowed'] += 1
+                return 0
+            self._counts['limited'] += 1
+            return (1 - tokens) / rate.refill
+
+    def _sweep(self, now):
+        self._next_sweep = now + self.sweep_interval
+        self._counts['evicted'] += self._conn.execute(
+            'DELETE FROM rate_buckets WHERE updated < ?', (now - self._max_period,)).rowcount
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._counts, backend='sqlite', path=self.path)
+
+
+def create(backend, path=None):
+    if backend == 'memory':
+        return MemoryLimiter()
+    if backend == 'sqlite':
+        return SQLiteLimiter(path)
+    raise ValueError(f"RATE_LIMIT_BACKEND must be 'memory' or 'sqlite', not {backend!r}")
@@ -0,0 +1,29 @@
+"""
+Production server entry point.
+
+    ASYNC_MODE=gevent python serve.py
+
+Runs the app on a green-thread server (gevent by default, or eventlet) instead
+of the development server. The standard library is monkey-patched before the
+app is imported so sockets, locks and sleeps cooperate with the event loop,
+and app.py offloads SQLite calls to a pool of DB_THREADPOOL_SIZE native
+threads. HOST and PORT choose the listen address.
+"""
+import os
+
+ASYNC_MODE = os.environ.setdefault('ASYNC_MODE', 'gevent')
+
+if ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+elif ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+else:
+    raise SystemExit(f"serve.py needs ASYNC_MODE=gevent or eventlet, not {ASYNC_MODE!r}")
+
+from app import app, socketio  # noqa: E402  (must follow monkey-patching)
+
+if __name__ == '__main__':
+    socketio.run(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', '5051')),
+                 log_output=os.environ.get('ACCESS_LOG') == '1')
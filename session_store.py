@@ -0,0 +1,219 @@
+"""
+Server-side sessions.
+
+The session cookie only carries a random session id; session data lives in the
+sessions table and is cached in process memory, so a request from a known
+session normally needs no database read. Each session also holds a cached
+projection of the logged-in user's profile in its own column, which
+save_session() writes together with the rest of the row. Profile writes call
+invalidate_profile(), which clears the projection in every session of that
+user and bumps its profile_version, so a projection read before the change
+is never stored over it.
+
+The cache only sees this process's writes, so it must be off (cache_ttl=0)
+when several processes serve the same sessions: otherwise a session logged
+out or rotated elsewhere stays valid here until it expires from the cache.
+Without the cache every request reads its session row, one primary-key
+lookup; the profile projection still spares it the clients query.
+"""
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS sessions (
+           session_id TEXT PRIMARY KEY,
+           client_ID INTEGER,
+           data TEXT NOT NULL,
+           profile TEXT,
+           profile_version INTEGER NOT NULL DEFAULT 0,
+           expires_at INTEGER NOT NULL
+       )''',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_client ON sessions (client_ID)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_expiry ON sessions (expires_at)',
+]
+
+
+def ensure_schema(c):
+    for statement in SCHEMA:
+        c.execute(statement)
+
+
+def purge_expired(c):
+    """Delete expired sessions, returns the number removed"""
+    c.execute('DELETE FROM sessions WHERE expires_at <= ?', (int(time.time()),))
+    return c.rowcount
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict identified by a server-side session id"""
+
+    def __init__(self, initial=None, sid=None, profile=None, profile_version=0, expires_at=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.profile = profile
+        self.profile_version = profile_version
+        self.profile_modified = False
+        self.expires_at = expires_at
+        self.new = new
+        self.previous_sid = None
+        self.modified = False
+
+
+class SessionStore(SessionInterface):
+    """Flask session interface backed by SQLite with an in-process cache"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, transaction, cache_ttl=5, cache_size=10000):
+        self._transaction = transaction
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # session_id -> (cached_at, data, profile, profile_version, expires_at)
+
+    def _cache_put(self, sid, data, profile, profile_version, expires_at):
+        if self.cache_ttl <= 0:
+            return
+        with self._lock:
+            self._cache[sid] = (time.monotonic(), data, profile, profile_version, expires_at)
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cache_get(self, sid):
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.cache_ttl:
+                del self._cache[sid]
+                return None
+            self._cache.move_to_end(sid)
+            return entry[1:]
+
+    def _cache_drop(self, sids):
+        with self._lock:
+            for sid in sids:
+                self._cache.pop(sid, None)
+
+    def _expires_at(self, app):
+        return int(time.time() + app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+        entry = self._cache_get(sid)
+        if entry is None:
+            try:
+                with self._transaction() as conn:
+                    c = conn.cursor()
+                    c.execute('SELECT data, profile, profile_version, expires_at FROM sessions WHERE session_id = ?',
+                              (sid,))
+                    row = c.fetchone()
+            except Exception as e:
+                print(f"Session load error: {e}")
+                row = None
+            if row is None:
+                return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+            entry = (row[0], json.loads(row[1]) if row[1] else None, row[2], row[3])
+            self._cache_put(sid, *entry)
+
+        data, profile, profile_version, expires_at = entry
+        if expires_at <= time.time():
+            return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+        return ServerSession(self.serializer.loads(data), sid=sid, profile=dict(profile) if profile else None,
+                             profile_version=profile_version, expires_at=expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                with self._transaction(write=True) as conn:
+                    conn.execute('DELETE FROM sessions WHERE session_id IN (?, ?)',
+                                 (session.sid, session.previous_sid))
+                self._cache_drop([session.sid, session.previous_sid])
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not session.modified and not session.profile_modified:
+            return
+
+        data = self.serializer.dumps(dict(session))
+        profile = json.dumps(session.profile) if session.profile else None
+        if not session.modified:
+            # Only the profile projection is new; it is dropped if the profile
+            # was invalidated after it was read
+            with self._transaction(write=True) as conn:
+                stored = conn.execute('UPDATE sessions SET profile = ? WHERE session_id = ? AND profile_version = ?',
+                                      (profile, session.sid, session.profile_version)).rowcount
+            if stored:
+                self._cache_put(session.sid, data, session.profile, session.profile_version, session.expires_at)
+            else:
+                self._cache_drop([session.sid])
+            return
+
+        expires_at = self._expires_at(app)
+        with self._transaction(write=True) as conn:
+            if session.previous_sid:
+                conn.execute('DELETE FROM sessions WHERE session_id = ?', (session.previous_sid,))
+            conn.execute('''INSERT INTO sessions (session_id, client_ID, data, profile, expires_at)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(session_id) DO UPDATE SET
+                                client_ID = excluded.client_ID,
+                                data = excluded.data,
+                                profile = CASE WHEN ? AND profile_version = ? THEN excluded.profile ELSE profile END,
+                                expires_at = excluded.expires_at''',
+                         (session.sid, session.get('user_id'), data, profile, expires_at,
+                          session.profile_modified, session.profile_version))
+            # An existing row keeps its profile unless this request set one, and
+            # it may have been invalidated meanwhile, so cache what is stored
+            row = conn.execute('SELECT profile, profile_version FROM sessions WHERE session_id = ?',
+                               (session.sid,)).fetchone()
+        if session.previous_sid:
+            self._cache_drop([session.previous_sid])
+        self._cache_put(session.sid, data, json.loads(row[0]) if row[0] else None, row[1], expires_at)
+
+        response.set_cookie(name, session.sid,
+                            expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain, path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+    def regenerate(self, session):
+        """Move the session to a fresh id, e.g. on login"""
+        if not session.new:
+            session.previous_sid = session.sid
+        session.sid = secrets.token_urlsafe(32)
+        session.profile = None
+        session.profile_version = 0
+        session.modified = True
+
+    def set_profile(self, session, profile):
+        """Cache a profile projection in the session; save_session stores it with the session row"""
+        session.profile = profile
+        session.profile_modified = True
+
+    def invalidate_profile(self, c, client_id):
+        """Clear the cached profile in every session of a client"""
+        c.execute('SELECT session_id FROM sessions WHERE client_ID = ?', (client_id,))
+        sids = [row[0] for row in c.fetchall()]
+        c.execute('UPDATE sessions SET profile = NULL, profile_version = profile_version + 1 WHERE client_ID = ?',
+                  (client_id,))
+        self._cache_drop(sids)
+        return len(sids)
@@ -0,0 +1,134 @@
+"""
+Server-side shopping carts.
+
+Each logged-in client has one cart row per product in cart_items. The browser
+keeps a copy in localStorage for rendering; it is merged into the server cart
+after login and every change is written back. validate() reprices and
+stock-checks a whole cart against the in-memory catalog in one pass, so
+checkout can report every problem at once and place_order never trusts
+client-sent prices.
+"""
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS cart_items (
+           client_ID INTEGER NOT NULL,
+           inventory_ID INTEGER NOT NULL,
+           quantity INTEGER NOT NULL CHECK (quantity > 0),
+           added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+           updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+           PRIMARY KEY (client_ID, inventory_ID),
+           FOREIGN KEY (client_ID) REFERENCES clients(client_ID),
+           FOREIGN KEY (inventory_ID) REFERENCES inventory(inventory_ID)
+       )''',
+]
+
+# Largest quantity of one product a cart line may hold
+MAX_LINE_QUANTITY = 99
+
+
+def ensure_schema(c):
+    for statement in SCHEMA:
+        c.execute(statement)
+
+
+def parse_lines(items):
+    """
+    Normalise client cart lines ({id, quantity, ...}) to (inventory_ID, quantity)
+    pairs, summing duplicates and dropping lines that cannot be parsed.
+    """
+    quantities = {}
+    for item in items or []:
+        try:
+            inventory_id = int(item.get('inventory_ID', item.get('id')))
+            quantity = int(item.get('quantity', 1))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[inventory_id] = min(quantities.get(inventory_id, 0) + quantity, MAX_LINE_QUANTITY)
+    return list(quantities.items())
+
+
+def get_lines(c, client_id):
+    """(inventory_ID, quantity) pairs in the client's cart, oldest first"""
+    c.execute('''SELECT inventory_ID, quantity FROM cart_items
+                 WHERE client_ID = ? ORDER BY added_at, inventory_ID''', (client_id,))
+    return c.fetchall()
+
+
+def set_quantity(c, client_id, inventory_id, quantity):
+    """
+    Set one line's quantity; zero or less removes it.
+    Returns False if the product does not exist.
+    """
+    if quantity <= 0:
+        c.execute('DELETE FROM cart_items WHERE client_ID = ? AND inventory_ID = ?', (client_id, inventory_id))
+        return True
+    c.execute('''INSERT INTO cart_items (client_ID, inventory_ID, quantity)
+                 SELECT ?, inventory_ID, ? FROM inventory WHERE inventory_ID = ?
+                 ON CONFLICT(client_ID, inventory_ID) DO UPDATE SET
+                     quantity = excluded.quantity, updated_at = CURRENT_TIMESTAMP''',
+              (client_id, min(quantity, MAX_LINE_QUANTITY), inventory_id))
+    return c.rowcount > 0
+
+
+def merge(c, client_id, lines):
+    """
+    Merge a browser cart into the server cart. Only products the server cart
+    lacks are added: a line it already has keeps its quantity, which may have
+    been lowered since from another session or device. Merging the same
+    browser cart twice changes nothing.
+    """
+    c.executemany('''INSERT INTO cart_items (client_ID, inventory_ID, quantity)
+                     SELECT ?, inventory_ID, ? FROM inventory WHERE inventory_ID = ?
+                     ON CONFLICT(client_ID, inventory_ID) DO NOTHING''',
+                  [(client_id, quantity, inventory_id) for inventory_id, quantity in lines])
+    return get_lines(c, client_id)
+
+
+def remove(c, client_id, inventory_ids):
+    """Drop lines from a cart, e.g. once they have been ordered"""
+    c.executemany('DELETE FROM cart_items WHERE client_ID = ? AND inventory_ID = ?',
+                  [(client_id, inventory_id) for inventory_id in inventory_ids])
+
+
+def validate(products_by_id, lines, available=None):
+    """
+    Reprice and stock-check cart lines against catalog rows keyed by
+    inventory_ID. `available` overrides stock for items whose sellable
+    quantity is not the inventory row's (flash-sale counters).
+    Returns {'ok', 'items', 'errors', 'subtotal'}; every line carries a
+    status of 'ok', 'unavailable', 'out_of_stock' or 'insufficient_stock'.
+    """
+    available = available or {}
+    items, errors = [], []
+    subtotal = 0
+    for inventory_id, quantity in lines:
+        product = products_by_id.get(inventory_id)
+        if product is None:
+            items.append({'id': inventory_id, 'quantity': quantity, 'status': 'unavailable'})
+            errors.append(f"Product {inventory_id} is no longer available.")
+            continue
+
+        stock = available.get(inventory_id, product['current_stock'] or 0)
+        price = product['price'] or 0
+        if stock <= 0:
+            status = 'out_of_stock'
+            errors.append(f"{product['name']} is out of stock.")
+        elif quantity > stock:
+            status = 'insufficient_stock'
+            errors.append(f"Not enough stock for {product['name']}. Only {stock} left.")
+        else:
+            status = 'ok'
+            subtotal += price * quantity
+        items.append({
+            'id': inventory_id,
+            'product_code': product['product_code'],
+            'name': product['name'],
+            'image': product['image'],
+            'price': price,
+            'quantity': quantity,
+            'current_stock': stock,
+            'line_total': price * quantity,
+            'status': status
+        })
+    return {'ok': not errors, 'items': items, 'errors': errors, 'subtotal': subtotal}
@@ -0,0 +1,124 @@
+"""
+Fingerprinted, precompressed CSS and JS.
+
+    python static_assets.py
+
+copies every stylesheet and script under static/ into the build directory
+(ASSET_BUILD_DIR, default .asset_build) under a name that carries a digest
+of its contents, e.g. css/base.css -> css/base.3f9c2a1b7d.css. Each copy
+gets .gz and, when the brotli package is installed, .br variants next to it.
+manifest.json maps each source name to its fingerprinted name.
+
+The app serves fingerprinted files from /assets/ with Cache-Control:
+immutable, picking the precompressed variant the client accepts, so no
+response is compressed at request time. Relative url() references in
+stylesheets are rewritten to absolute /static/ paths because the copies
+live under a different URL. Files missing from the manifest (e.g. no build
+has been run) are linked from /static/ as before.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+import http_encoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EXTENSIONS = ('.css', '.js')
+DIGEST_LENGTH = 10
+MANIFEST = 'manifest.json'
+# Smaller files are not worth a compressed variant
+MIN_COMPRESS_SIZE = 256
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+ABSOLUTE_URL = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|/|#)')
+
+
+def rewrite_css_urls(text, filename, static_url_path):
+    """Make relative url() references in a stylesheet absolute /static/ URLs"""
+    directory = posixpath.dirname(filename)
+
+    def replace(match):
+        quote, target = match.groups()
+        if ABSOLUTE_URL.match(target):
+            return match.group(0)
+        return f'url({quote}{static_url_path}/{posixpath.normpath(posixpath.join(directory, target))}{quote})'
+    return CSS_URL.sub(replace, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def build(static_dir, build_dir, static_url_path='/static'):
+    """Fingerprint and precompress every asset; returns the manifest"""
+    manifest = {}
+    for directory, _, files in os.walk(static_dir):
+        for file in sorted(files):
+            stem, extension = os.path.splitext(file)
+            if extension not in EXTENSIONS:
+                continue
+            path = os.path.join(directory, file)
+            filename = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            if extension == '.css':
+                data = rewrite_css_urls(data.decode('utf-8'), filename, static_url_path).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+            hashed = f'{posixpath.splitext(filename)[0]}.{digest}{extension}'
+            target = os.path.join(build_dir, hashed)
+            if not os.path.exists(target):
+                if len(data) >= MIN_COMPRESS_SIZE:
+                    _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                    if brotli is not None:
+                        _write(target + '.br', brotli.compress(data, quality=11))
+                _write(target, data)
+            manifest[filename] = hashed
+    _write(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def load_manifest(build_dir):
+    """Source name -> fingerprinted name; empty if no build has been run"""
+    try:
+        with open(os.path.join(build_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def select(build_dir, name, accept_encoding):
+    """(path, content coding or None) of the best variant of a fingerprinted file"""
+    path = os.path.join(build_dir, name)
+    encodings = http_encoding.accepted_encodings(accept_encoding)
+    for coding, suffix in ENCODINGS:
+        if http_encoding.accepts(encodings, coding) and os.path.exists(path + suffix):
+            return path + suffix, coding
+    return path, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress static CSS/JS')
+    parser.add_argument('--static-dir', default='static')
+    parser.add_argument('--build-dir', default=os.environ.get('ASSET_BUILD_DIR', '.asset_build'))
+    args = parser.parse_args()
+    manifest = build(args.static_dir, args.build_dir)
+    print(f"Built {len(manifest)} assets into {args.build_dir}"
+          f"{'' if brotli else ' (gzip only: pip install brotli for .br variants)'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Stock reservations for unpaid orders.
+
+Orders that are not paid at checkout ("Cash on Delivery" in "Pending Payment")
+hold their stock through a reservation with an expiry time. Paying for the
+order confirms the reservation; otherwise the background sweeper releases it,
+returns the stock through the inventory ledger and marks the order expired.
+
+Active reservations are found through a partial index on expires_at, so each
+sweep only touches the rows that are due.
+"""
+import inventory_ledger
+
+# Max expired reservations released per sweep transaction
+RELEASE_BATCH_SIZE = 500
+
+
+def reserve(c, order_id, lines, ttl_seconds):
+    """Create active reservations for an order's (inventory_ID, quantity) lines"""
+    c.executemany('''INSERT INTO stock_reservations (order_ID, inventory_ID, quantity, status, expires_at)
+                     VALUES (?, ?, ?, 'Active', datetime('now', ?))''',
+                  [(order_id, inventory_id, quantity, f'+{int(ttl_seconds)} seconds')
+                   for inventory_id, quantity in lines])
+
+
+def confirm(c, order_id):
+    """Keep the stock of an order that has been paid for"""
+    c.execute("UPDATE stock_reservations SET status = 'Confirmed' WHERE order_ID = ? AND status = 'Active'",
+              (order_id,))
+    return c.rowcount
+
+
+def release_expired(c, batch_size=RELEASE_BATCH_SIZE):
+    """
+    Release up to batch_size expired reservations: return their stock through
+    the inventory ledger and mark their unpaid orders as expired.
+    Returns ({inventory_ID: (previous, new)}, [expired order IDs]).
+    """
+    c.execute('''SELECT reservation_ID, order_ID, inventory_ID, quantity FROM stock_reservations
+                 WHERE status = 'Active' AND expires_at <= datetime('now')
+                 ORDER BY expires_at LIMIT ?''', (batch_size,))
+    rows = c.fetchall()
+    if not rows:
+        return {}, []
+
+    c.executemany("UPDATE stock_reservations SET status = 'Expired' WHERE reservation_ID = ?",
+                  [(row[0],) for row in rows])
+
+    changes = {}
+    for reservation_id, order_id, inventory_id, quantity in rows:
+        result = inventory_ledger.record_change(c, inventory_id, quantity, 'Reservation Expired', order_id)
+        if result:
+            changes[inventory_id] = (changes.get(inventory_id, result)[0], result[1])
+
+    order_ids = sorted({row[1] for row in rows})
+    c.executemany("UPDATE orders SET status = 'Expired' WHERE order_ID = ? AND status = 'Pending Payment'",
+                  [(order_id,) for order_id in order_ids])
+    return changes, order_ids
@@ -0,0 +1,56 @@
+"""
+Shared fixtures.
+
+Importing app runs init_db() on aureliana.db in the working directory, so the
+module is imported once from a scratch directory, which stays the working
+directory for the session: requests made through the test client use the
+database there, never the working copy's. The tests drive the app from plain
+threads, so SocketIO runs in threading mode rather than picking up an
+installed eventlet or gevent.
+"""
+import contextlib
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ASYNC_MODE', 'threading')
+
+
+@pytest.fixture(scope='session')
+def aureliana(tmp_path_factory):
+    """The app module"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    import app
+    yield app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def db(aureliana, tmp_path, monkeypatch):
+    """Connection to a freshly migrated and seeded database of the test's own"""
+    monkeypatch.chdir(tmp_path)
+    aureliana.init_db()
+    conn = sqlite3.connect('aureliana.db')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def transaction(tmp_path):
+    """A db_transaction stand-in on an empty database of the test's own"""
+    path = str(tmp_path / 'test.db')
+
+    @contextlib.contextmanager
+    def transaction(write=False):
+        conn = sqlite3.connect(path)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    return transaction
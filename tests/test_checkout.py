@@ -0,0 +1,71 @@
+import json
+import sqlite3
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def client(aureliana):
+    client = aureliana.app.test_client()
+    response = client.post('/login', data={'email': 'client@aureliana.com', 'password': 'client123'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def item(aureliana):
+    conn = sqlite3.connect('aureliana.db')
+    row = conn.execute('SELECT inventory_ID, name, price FROM inventory WHERE current_stock > 5 '
+                       'ORDER BY inventory_ID LIMIT 1').fetchone()
+    conn.close()
+    return {'id': str(row[0]), 'name': row[1], 'price': row[2], 'quantity': 1}
+
+
+def checkout(client, item, **form):
+    return client.post('/place_order', data=dict({
+        'payment_method': 'GCash', 'gcash_phone': '09170000000', 'gcash_pin': '1234',
+        'itemsToCheckout': json.dumps([item])}, **form))
+
+
+def query(sql, params=()):
+    conn = sqlite3.connect('aureliana.db')
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def stock(item):
+    return query('SELECT current_stock FROM inventory WHERE inventory_ID = ?', (item['id'],))[0][0]
+
+
+def test_same_idempotency_key_gives_one_order(client, item):
+    key = uuid.uuid4().hex
+    before = stock(item)
+
+    first = checkout(client, item, idempotency_key=key)
+    second = checkout(client, item, idempotency_key=key)
+
+    assert '/receipt/' in first.location
+    assert second.location == first.location
+    assert len(query('SELECT order_ID FROM orders WHERE idempotency_key = ?', (key,))) == 1
+    assert stock(item) == before - 1
+
+
+def test_idempotency_key_header(client, item):
+    key = uuid.uuid4().hex
+    first = checkout(client, item, idempotency_key=key)
+    second = client.post('/place_order', data={'payment_method': 'GCash', 'gcash_phone': '09170000000',
+                                               'gcash_pin': '1234', 'itemsToCheckout': json.dumps([item])},
+                         headers={'Idempotency-Key': key})
+    assert second.location == first.location
+    assert len(query('SELECT order_ID FROM orders WHERE idempotency_key = ?', (key,))) == 1
+
+
+def test_different_keys_give_separate_orders(client, item):
+    keys = [uuid.uuid4().hex, uuid.uuid4().hex]
+    locations = {checkout(client, item, idempotency_key=key).location for key in keys}
+    assert len(locations) == 2
+    rows = query('SELECT order_number FROM orders WHERE idempotency_key IN (?, ?)', keys)
+    assert len(rows) == 2 and rows[0][0] != rows[1][0]
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+
+import pytest
+
+import db_retry
+
+
+class Busy:
+    """fn that fails with 'database is locked' a number of times, then returns 'done'"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise sqlite3.OperationalError('database is locked')
+        return 'done'
+
+
+def test_retries_until_success():
+    counters = db_retry.RetryCounters()
+    delays = []
+    fn = Busy(3)
+    assert db_retry.run(fn, db_retry.RetryPolicy(max_attempts=8), counters, sleep=delays.append) == 'done'
+    assert fn.calls == 4
+    assert len(delays) == 3
+    assert counters.snapshot() == {'transactions': 1, 'retried_transactions': 1, 'retries': 3, 'give_ups': 0}
+
+
+def test_backoff_is_capped():
+    policy = db_retry.RetryPolicy(base_delay=0.01, max_delay=0.05)
+    assert all(0 <= policy.delay(attempt) <= 0.05 for attempt in range(20))
+    assert all(policy.delay(0) <= 0.01 for _ in range(100))
+
+
+def test_gives_up_after_max_attempts():
+    counters = db_retry.RetryCounters()
+    fn = Busy(100)
+    with pytest.raises(db_retry.DatabaseBusy):
+        db_retry.run(fn, db_retry.RetryPolicy(max_attempts=4), counters, sleep=lambda delay: None)
+    assert fn.calls == 4
+    assert counters.snapshot() == {'transactions': 1, 'retried_transactions': 1, 'retries': 3, 'give_ups': 1}
+
+
+def test_gives_up_at_deadline():
+    counters = db_retry.RetryCounters()
+    fn = Busy(100)
+    policy = db_retry.RetryPolicy(max_attempts=1000, base_delay=0.01, max_delay=0.01)
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        time.sleep(delay)
+
+    deadline = time.monotonic() + 0.1
+    with pytest.raises(db_retry.DatabaseBusy):
+        db_retry.run(fn, policy, counters, deadline=deadline, sleep=sleep)
+    # No backoff is started that would end past the deadline
+    assert sum(delays) < 0.1
+    assert fn.calls == len(delays) + 1 < 1000
+    assert counters.snapshot()['give_ups'] == 1
+
+
+def test_other_errors_are_not_retried():
+    counters = db_retry.RetryCounters()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise sqlite3.OperationalError('no such table: orders')
+
+    with pytest.raises(sqlite3.OperationalError) as raised:
+        db_retry.run(fn, db_retry.RetryPolicy(), counters, sleep=lambda delay: None)
+    assert not isinstance(raised.value, db_retry.DatabaseBusy)
+    assert len(calls) == 1
+
+
+def test_begin_immediate_waits_for_writer(tmp_path):
+    path = str(tmp_path / 'busy.db')
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute('CREATE TABLE t (x)')
+    writer.execute('BEGIN IMMEDIATE')
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    counters = db_retry.RetryCounters()
+
+    def sleep(delay):
+        # The writer commits while the second connection backs off
+        writer.execute('COMMIT')
+
+    db_retry.begin_immediate(conn, db_retry.RetryPolicy(), counters, sleep=sleep)
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.execute('COMMIT')
+    assert counters.snapshot()['retries'] == 1
+    writer.close()
+    conn.close()
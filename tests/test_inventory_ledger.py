@@ -0,0 +1,91 @@
+import inventory_ledger
+
+
+def first_item(c):
+    c.execute('SELECT inventory_ID, current_stock FROM inventory ORDER BY inventory_ID LIMIT 1')
+    return c.fetchone()
+
+
+def snapshot_count(c, inventory_id):
+    c.execute('SELECT COUNT(*) FROM inventory_snapshot WHERE inventory_ID = ?', (inventory_id,))
+    return c.fetchone()[0]
+
+
+def test_record_change_logs_and_applies_delta(db):
+    c = db.cursor()
+    inventory_id, stock = first_item(c)
+    c.execute('SELECT COALESCE(MAX(log_ID), 0) FROM inventory_log')
+    last_log_id = c.fetchone()[0]
+
+    assert inventory_ledger.record_change(c, inventory_id, 3, 'Restock') == (stock, stock + 3)
+    assert inventory_ledger.record_change(c, inventory_id, -(stock + 10), 'Order Placed') == (stock + 3, 0)
+
+    c.execute('SELECT current_stock FROM inventory WHERE inventory_ID = ?', (inventory_id,))
+    assert c.fetchone()[0] == 0
+    c.execute('SELECT action, quantity, previous_stock, new_stock FROM inventory_log '
+              'WHERE inventory_ID = ? AND log_ID > ? ORDER BY log_ID', (inventory_id, last_log_id))
+    assert c.fetchall() == [('Restock', 3, stock, stock + 3), ('Order Placed', stock + 10, stock + 3, 0)]
+    assert inventory_ledger.derive_stock(c, inventory_id) == 0
+
+
+def test_record_change_unknown_item(db):
+    assert inventory_ledger.record_change(db.cursor(), 999999, 1, 'Restock') is None
+
+
+def test_snapshot_taken_every_interval(db):
+    c = db.cursor()
+    inventory_id, stock = first_item(c)
+    snapshots = snapshot_count(c, inventory_id)
+
+    for _ in range(inventory_ledger.SNAPSHOT_INTERVAL - 1):
+        inventory_ledger.record_change(c, inventory_id, 1, 'Restock')
+    assert snapshot_count(c, inventory_id) == snapshots
+    inventory_ledger.record_change(c, inventory_id, 1, 'Restock')
+    assert snapshot_count(c, inventory_id) == snapshots + 1
+
+    for _ in range(5):
+        inventory_ledger.record_change(c, inventory_id, -1, 'Order Placed')
+    expected = stock + inventory_ledger.SNAPSHOT_INTERVAL - 5
+    assert inventory_ledger.derive_stock(c, inventory_id) == expected
+
+    # Only the rows after the latest snapshot are replayed
+    c.execute(inventory_ledger._LEDGER_STOCK_SQL + ' WHERE i.inventory_ID = ? GROUP BY i.inventory_ID',
+              (inventory_id,))
+    assert c.fetchone()[4:] == (expected, 5)
+
+
+def test_set_stock_records_the_difference(db):
+    c = db.cursor()
+    inventory_id, stock = first_item(c)
+    assert inventory_ledger.set_stock(c, inventory_id, stock, 'Count') == (stock, stock)
+    assert inventory_ledger.set_stock(c, inventory_id, stock + 7, 'Count') == (stock, stock + 7)
+    assert inventory_ledger.derive_stock(c, inventory_id) == stock + 7
+
+
+def test_reconcile_and_repair_drift_past_a_snapshot(db):
+    c = db.cursor()
+    inventory_id, stock = first_item(c)
+    for _ in range(inventory_ledger.SNAPSHOT_INTERVAL + 3):
+        inventory_ledger.record_change(c, inventory_id, 2, 'Restock')
+    expected = stock + 2 * (inventory_ledger.SNAPSHOT_INTERVAL + 3)
+    assert inventory_ledger.reconcile(c) == []
+
+    # A write that bypassed the ledger
+    c.execute('UPDATE inventory SET current_stock = current_stock + 4 WHERE inventory_ID = ?', (inventory_id,))
+    drift = inventory_ledger.reconcile(c)
+    assert [(item['inventory_ID'], item['current_stock'], item['ledger_stock'], item['drift'], item['pending_logs'])
+            for item in drift] == [(inventory_id, expected + 4, expected, 4, 3)]
+
+    assert inventory_ledger.repair(c, drift) == 1
+    assert inventory_ledger.reconcile(c) == []
+    c.execute('SELECT current_stock FROM inventory WHERE inventory_ID = ?', (inventory_id,))
+    assert c.fetchone()[0] == expected == inventory_ledger.derive_stock(c, inventory_id)
+
+
+def test_take_snapshot_checkpoints_every_item(db):
+    c = db.cursor()
+    c.execute('SELECT COUNT(*) FROM inventory')
+    items = c.fetchone()[0]
+    assert inventory_ledger.take_snapshot(c) == items
+    assert inventory_ledger.take_snapshot(c, []) == 0
+    assert inventory_ledger.reconcile(c) == []
@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+import outbox
+from notification_sinks import MailSpoolSink
+
+LOW_STOCK = {'inventory_ID': 1, 'name': 'Ring', 'product_code': 'R1', 'current_stock': 2,
+             'low_stock_threshold': 5, 'order_id': 7}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return MailSpoolSink(str(tmp_path / 'spool'), 'shop@example.com', 'alerts@example.com')
+
+
+@pytest.fixture
+def dispatcher(transaction, spool):
+    with transaction() as conn:
+        outbox.ensure_schema(conn.cursor())
+        outbox.publish(conn.cursor(), 'low_stock', LOW_STOCK, ['email'])
+    return outbox.Dispatcher(transaction, {'email': spool}, max_attempts=3, base_delay=60, max_delay=600)
+
+
+def event(dispatcher):
+    with dispatcher.transaction() as conn:
+        return conn.execute('SELECT event_ID, attempts, next_attempt_at, last_error, delivered_at '
+                            'FROM outbox').fetchone()
+
+
+def make_due(dispatcher):
+    with dispatcher.transaction(write=True) as conn:
+        conn.execute('UPDATE outbox SET next_attempt_at = 0')
+
+
+def break_spool(spool):
+    # A file where the spool directory should be makes every delivery fail
+    with open(spool.directory, 'w'):
+        pass
+
+
+def test_delivers_to_spool(dispatcher, spool):
+    assert dispatcher.dispatch() == 1
+    event_id, attempts, _, last_error, delivered_at = event(dispatcher)
+    assert (attempts, last_error) == (1, None) and delivered_at
+    with open(os.path.join(spool.directory, f'{event_id}.eml')) as f:
+        message = f.read()
+    assert 'To: alerts@example.com' in message and 'Low stock: Ring (R1)' in message
+    assert dispatcher.dispatch() == 0
+
+
+def test_failure_backs_off_then_retries(dispatcher, spool):
+    break_spool(spool)
+    before = time.time()
+    assert dispatcher.dispatch() == 1
+    _, attempts, next_attempt_at, last_error, delivered_at = event(dispatcher)
+    assert attempts == 1 and last_error and delivered_at is None
+    # First retry waits base_delay, jittered into its upper half
+    assert before + 30 <= next_attempt_at <= time.time() + 60
+    assert dispatcher.dispatch() == 0
+
+    make_due(dispatcher)
+    assert dispatcher.dispatch() == 1
+    _, attempts, next_attempt_at, _, _ = event(dispatcher)
+    assert attempts == 2 and next_attempt_at >= before + 60
+
+    os.remove(spool.directory)
+    make_due(dispatcher)
+    assert dispatcher.dispatch() == 1
+    event_id, attempts, _, last_error, delivered_at = event(dispatcher)
+    assert (attempts, last_error) == (3, None) and delivered_at
+    assert os.path.exists(os.path.join(spool.directory, f'{event_id}.eml'))
+    assert dispatcher.metrics()['delivered'] == 1
+
+
+def test_dead_after_max_attempts(dispatcher, spool):
+    break_spool(spool)
+    for _ in range(3):
+        make_due(dispatcher)
+        assert dispatcher.dispatch() == 1
+    make_due(dispatcher)
+    assert dispatcher.dispatch() == 0
+    _, attempts, _, last_error, delivered_at = event(dispatcher)
+    assert attempts == 3 and last_error and delivered_at is None
+    metrics = dispatcher.metrics()
+    assert metrics['dead'] == 1 and metrics['backlog']['email']['dead'] == 1
@@ -0,0 +1,86 @@
+import inventory_ledger
+import stock_reservations
+
+
+def place(c, inventory_id, quantity, ttl_seconds=3600, status='Pending Payment'):
+    """An unpaid order holding quantity of an item, the way checkout creates one"""
+    c.execute("INSERT INTO orders (client_ID, status, payment_method) VALUES (1, ?, 'Cash on Delivery')", (status,))
+    order_id = c.lastrowid
+    inventory_ledger.record_change(c, inventory_id, -quantity, 'Order Placed', order_id)
+    stock_reservations.reserve(c, order_id, [(inventory_id, quantity)], ttl_seconds)
+    return order_id
+
+
+def expire(c, order_id):
+    c.execute("UPDATE stock_reservations SET expires_at = datetime('now', '-1 minute') WHERE order_ID = ?",
+              (order_id,))
+
+
+def stock(c, inventory_id):
+    c.execute('SELECT current_stock FROM inventory WHERE inventory_ID = ?', (inventory_id,))
+    return c.fetchone()[0]
+
+
+def reservation_statuses(c, order_id):
+    c.execute('SELECT status FROM stock_reservations WHERE order_ID = ?', (order_id,))
+    return [row[0] for row in c.fetchall()]
+
+
+def order_status(c, order_id):
+    c.execute('SELECT status FROM orders WHERE order_ID = ?', (order_id,))
+    return c.fetchone()[0]
+
+
+def test_release_expired_returns_stock_and_expires_order(db):
+    c = db.cursor()
+    c.execute('SELECT inventory_ID, current_stock FROM inventory ORDER BY inventory_ID LIMIT 1')
+    inventory_id, initial = c.fetchone()
+    expired = place(c, inventory_id, 2)
+    active = place(c, inventory_id, 1)
+    expire(c, expired)
+    assert stock(c, inventory_id) == initial - 3
+
+    changes, order_ids = stock_reservations.release_expired(c)
+
+    assert order_ids == [expired]
+    assert changes == {inventory_id: (initial - 3, initial - 1)}
+    assert stock(c, inventory_id) == initial - 1
+    assert reservation_statuses(c, expired) == ['Expired']
+    assert order_status(c, expired) == 'Expired'
+    assert reservation_statuses(c, active) == ['Active']
+    assert order_status(c, active) == 'Pending Payment'
+    c.execute("SELECT inventory_ID, quantity FROM inventory_log WHERE order_ID = ? AND action = 'Reservation Expired'",
+              (expired,))
+    assert c.fetchall() == [(inventory_id, 2)]
+
+    # Nothing is released twice
+    assert stock_reservations.release_expired(c) == ({}, [])
+
+
+def test_confirmed_reservations_are_kept(db):
+    c = db.cursor()
+    c.execute('SELECT inventory_ID, current_stock FROM inventory ORDER BY inventory_ID LIMIT 1')
+    inventory_id, initial = c.fetchone()
+    paid = place(c, inventory_id, 2)
+    assert stock_reservations.confirm(c, paid) == 1
+    expire(c, paid)
+
+    assert stock_reservations.release_expired(c) == ({}, [])
+    assert reservation_statuses(c, paid) == ['Confirmed']
+    assert stock(c, inventory_id) == initial - 2
+
+
+def test_release_expired_in_batches(db):
+    c = db.cursor()
+    c.execute('SELECT inventory_ID, current_stock FROM inventory ORDER BY inventory_ID LIMIT 2')
+    (first, first_stock), (second, second_stock) = c.fetchall()
+    orders = [place(c, first, 1), place(c, second, 1), place(c, first, 1)]
+    for order_id in orders:
+        expire(c, order_id)
+
+    changes, order_ids = stock_reservations.release_expired(c, batch_size=2)
+    assert len(order_ids) == 2
+    changes, rest = stock_reservations.release_expired(c, batch_size=2)
+    assert sorted(order_ids + rest) == orders
+    assert stock(c, first) == first_stock and stock(c, second) == second_stock
+    assert all(order_status(c, order_id) == 'Expired' for order_id in orders)
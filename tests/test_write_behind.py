@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+import write_behind
+
+
+@pytest.fixture
+def queue(tmp_path, transaction):
+    def add_notes(c, batch):
+        c.executemany('INSERT INTO notes (text) VALUES (?)', [(data['text'],) for data in batch])
+
+    with transaction() as conn:
+        conn.execute('CREATE TABLE notes (text TEXT NOT NULL)')
+        write_behind.ensure_schema(conn.cursor())
+    directory = str(tmp_path / 'journal')
+    os.makedirs(directory)
+    return write_behind.WriteBehindQueue(directory, transaction, {'note': add_notes}, fsync=False)
+
+
+def notes(queue):
+    with queue.transaction() as conn:
+        return [row[0] for row in conn.execute('SELECT text FROM notes ORDER BY rowid')]
+
+
+def write_journal(queue, name, records, tail=b''):
+    with open(os.path.join(queue.directory, f'{name}.jsonl'), 'wb') as f:
+        for seq, kind, data in records:
+            f.write(json.dumps({'seq': seq, 'kind': kind, 'at': 0, 'data': data}).encode('utf-8') + b'\n')
+        f.write(tail)
+
+
+def test_append_and_drain(queue):
+    queue.open('main')
+    queue.append('note', {'text': 'a'})
+    queue.append('note', {'text': 'b'})
+    assert notes(queue) == []
+    assert queue.drain() == 2
+    assert notes(queue) == ['a', 'b']
+    assert os.path.getsize(os.path.join(queue.directory, 'main.jsonl')) == 0
+
+
+def test_replay_ignores_torn_last_line(queue):
+    write_journal(queue, 'main', [(1, 'note', {'text': 'a'}), (2, 'note', {'text': 'b'})],
+                  tail=b'{"seq": 3, "kind": "note", "da')
+    assert queue.replay_all() == 2
+    assert notes(queue) == ['a', 'b']
+    # Replaying again applies nothing twice
+    write_journal(queue, 'main', [(1, 'note', {'text': 'a'}), (2, 'note', {'text': 'b'})])
+    assert queue.replay_all() == 0
+    assert notes(queue) == ['a', 'b']
+
+
+def test_open_continues_after_torn_line(queue):
+    write_journal(queue, 'main', [(1, 'note', {'text': 'a'})], tail=b'{"seq": 2, "ki')
+    queue.open('main')
+    queue.append('note', {'text': 'b'})
+    queue.drain()
+    assert notes(queue) == ['a', 'b']
+    assert queue.metrics()['depth'] == 0
+
+
+def test_bad_records_are_dead_lettered(queue):
+    write_journal(queue, 'main', [(1, 'note', {'text': 'a'}), (2, 'unknown', {}), (3, 'note', {}),
+                                  (4, 'note', {'text': 'b'})])
+    assert queue.replay_all() == 4
+    assert notes(queue) == ['a', 'b']
+    with open(os.path.join(queue.directory, 'main.dead'), 'rb') as f:
+        dead = [json.loads(line) for line in f]
+    assert [record['seq'] for record in dead] == [2, 3]
+    assert all(record['error'] for record in dead)
+    assert queue.metrics()['dead_letters'] == 2
@@ -0,0 +1,252 @@
+"""
+Write-behind queue for low-priority inserts (feedback, reviews).
+
+append() writes a record to an append-only journal file, fsyncs it and
+returns, so the request never waits on SQLite's write lock. A background
+task later drains the queue into SQLite in batches: each kind of record is
+inserted with executemany in a single write transaction. That transaction
+also stores the sequence number of the last record it applied, in
+write_behind_applied, so a crash anywhere between append and drain loses
+nothing and applies nothing twice. On startup replay() applies any journal
+records past that sequence number. Once everything is applied the journal
+is truncated.
+
+A batch that fails is retried one record at a time, and a record that still
+fails (an unknown kind, a bad payload) is moved to `<name>.dead`, so it can
+neither hold up the records behind it nor stop the app from starting. A
+busy database is not a record's fault: the batch stays queued and is
+retried on the next drain.
+
+Each process appends to its own journal (`<directory>/<name>.jsonl`), so
+prefork workers never share a file. Records are JSON lines:
+{"seq": 12, "kind": "review", "at": 1718000000.0, "data": {...}}.
+"""
+import collections
+import itertools
+import json
+import os
+import threading
+import time
+
+import db_offload
+import db_retry
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS write_behind_applied (
+           journal TEXT PRIMARY KEY,
+           seq INTEGER NOT NULL
+       )''',
+]
+
+# Records per drain transaction
+BATCH_SIZE = 500
+
+
+def ensure_schema(c):
+    for statement in SCHEMA:
+        c.execute(statement)
+
+
+def applied_seq(c, journal):
+    c.execute('SELECT seq FROM write_behind_applied WHERE journal = ?', (journal,))
+    row = c.fetchone()
+    return row[0] if row else 0
+
+
+def read_journal(path):
+    """Records in a journal file; a torn last line from a crash mid-append is ignored"""
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class WriteBehindQueue:
+    """
+    appliers maps a record kind to fn(c, [data, ...]), which writes a batch
+    using the cursor c. transaction is the app's db_transaction.
+    """
+
+    def __init__(self, directory, transaction, appliers, fsync=True, batch_size=BATCH_SIZE):
+        self.directory = directory
+        self.transaction = transaction
+        self.appliers = appliers
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.name = None
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._pending = collections.deque()
+        self._counts = {'appended': 0, 'applied': 0, 'batches': 0, 'replayed': 0, 'errors': 0, 'dead_letters': 0}
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.jsonl')
+
+    def _mark_applied(self, c, journal, seq):
+        c.execute('''INSERT INTO write_behind_applied (journal, seq) VALUES (?, ?)
+                     ON CONFLICT(journal) DO UPDATE SET seq = MAX(seq, excluded.seq)''', (journal, seq))
+
+    def _apply(self, journal, records):
+        """Write records not yet applied and mark them applied, in one write transaction"""
+        with self.transaction(write=True) as conn:
+            c = conn.cursor()
+            done = applied_seq(c, journal)
+            records = [record for record in records if record['seq'] > done]
+            if not records:
+                return
+            by_kind = collections.defaultdict(list)
+            for record in records:
+                by_kind[record['kind']].append(record['data'])
+            for kind, batch in by_kind.items():
+                self.appliers[kind](c, batch)
+            self._mark_applied(c, journal, records[-1]['seq'])
+
+    def _dead_letter(self, journal, record, error):
+        """Set a record that cannot be applied aside in <journal>.dead and mark it applied"""
+        print(f"Write-behind record {journal}:{record.get('seq')} moved to dead letters: {error}")
+        with open(os.path.join(self.directory, f'{journal}.dead'), 'ab') as f:
+            f.write(json.dumps(dict(record, error=str(error)), separators=(',', ':'), default=str).encode('utf-8') + b'\n')
+            f.flush()
+            if self.fsync:
+                db_offload.run(os.fsync, f.fileno())
+        with self.transaction(write=True) as conn:
+            self._mark_applied(conn.cursor(), journal, record['seq'])
+        self._counts['dead_letters'] += 1
+
+    def _apply_batch(self, journal, records):
+        """
+        Apply a batch, falling back to one record at a time if it fails and
+        dead-lettering records that still fail. Busy-database errors propagate
+        with nothing lost: applied records are skipped when the batch is retried.
+        """
+        try:
+            self._apply(journal, records)
+            return
+        except Exception as e:
+            if db_retry.is_busy(e):
+                raise
+            print(f"Write-behind batch error, applying {len(records)} records one by one: {e}")
+        for record in records:
+            try:
+                self._apply(journal, [record])
+            except Exception as e:
+                if db_retry.is_busy(e):
+                    raise
+                self._dead_letter(journal, record, e)
+
+    def replay(self, name):
+        """Apply a journal's records that never reached the database, then empty it; returns how many"""
+        path = self._path(name)
+        records = read_journal(path)
+        if records:
+            with self.transaction() as conn:
+                done = applied_seq(conn.cursor(), name)
+            records = [record for record in records if record['seq'] > done]
+            for start in range(0, len(records), self.batch_size):
+                self._apply_batch(name, records[start:start + self.batch_size])
+        if os.path.exists(path):
+            os.truncate(path, 0)
+        self._counts['replayed'] += len(records)
+        return len(records)
+
+    def replay_all(self):
+        """
+        Replay every journal in the directory; run at startup before any process
+        appends. A journal that cannot be replayed now is logged and left for open().
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        total = 0
+        for file in sorted(os.listdir(self.directory)):
+            if file.endswith('.jsonl'):
+                try:
+                    total += self.replay(file[:-len('.jsonl')])
+                except Exception as e:
+                    self._counts['errors'] += 1
+                    print(f"Error replaying write-behind journal {file}: {e}")
+        return total
+
+    def open(self, name):
+        """
+        Start appending to this process's journal, replaying whatever it still
+        holds. Records that cannot be replayed yet are queued for drain().
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(name)
+        try:
+            self.replay(name)
+        except Exception as e:
+            self._counts['errors'] += 1
+            print(f"Error replaying write-behind journal {name}: {e}")
+        with self.transaction() as conn:
+            seq = applied_seq(conn.cursor(), name)
+        leftover = [record for record in read_journal(path) if record['seq'] > seq]
+        if leftover:
+            # Rewrite without a torn last line, so appends start on a fresh line
+            with open(path + '.tmp', 'wb') as f:
+                f.writelines(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n' for record in leftover)
+            os.replace(path + '.tmp', path)
+        elif os.path.exists(path):
+            os.truncate(path, 0)
+        with self._lock:
+            # Sequence numbers keep rising across truncations, or replay would skip new records
+            self.name = name
+            self._seq = max([seq] + [record['seq'] for record in leftover])
+            self._pending.extend(leftover)
+            self._file = open(path, 'ab')
+
+    def append(self, kind, data):
+        """Journal a record; once this returns it will reach the database"""
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError('write-behind journal is not open')
+            self._seq += 1
+            record = {'seq': self._seq, 'kind': kind, 'at': time.time(), 'data': data}
+            self._file.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            self._file.flush()
+            if self.fsync:
+                db_offload.run(os.fsync, self._file.fileno())
+            self._pending.append(record)
+            self._counts['appended'] += 1
+
+    def drain(self):
+        """Apply pending records batch by batch, releasing the write lock in between; returns how many"""
+        applied = 0
+        with self._drain_lock:
+            while True:
+                with self._lock:
+                    batch = list(itertools.islice(self._pending, self.batch_size))
+                if not batch:
+                    return applied
+                try:
+                    self._apply_batch(self.name, batch)
+                except Exception:
+                    self._counts['errors'] += 1
+                    raise
+                with self._lock:
+                    for _ in batch:
+                        self._pending.popleft()
+                    self._counts['applied'] += len(batch)
+                    self._counts['batches'] += 1
+                    if not self._pending:
+                        # Everything in the file is applied; start it over
+                        self._file.truncate(0)
+                applied += len(batch)
+
+    def oldest_age(self):
+        """Seconds the oldest pending record has waited, 0 if none"""
+        with self._lock:
+            return time.time() - self._pending[0]['at'] if self._pending else 0
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._counts, journal=self.name, depth=len(self._pending),
+                        oldest_age=round(time.time() - self._pending[0]['at'], 3) if self._pending else 0)